@@ -0,0 +1,365 @@
+import os
+import json
+import time
+import queue
+import base64
+import argparse
+import threading
+import socketserver
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+
+class AuthRequest:
+    """One image waiting for the batch worker"""
+
+    def __init__(self, image):
+        self.image = image
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.cancelled = False  # Set when the client gave up waiting
+
+
+class FaceAuthenticator:
+    """Keeps the dlib models and the gallery resident and answers authenticate requests.
+
+    Request threads only decode images and queue them. A single batch worker collects
+    whatever arrived within `max_wait` seconds (up to `max_batch` images), detects faces
+    per image, then encodes every face of the batch in one dlib call and matches all of
+    them against the gallery in one pass.
+
+    A `threshold` given here overrides the model's (calibrated) threshold, also after reloads.
+    """
+
+    def __init__(self, face_system, max_batch=16, max_wait=0.005, max_side=640, detection_model="hog",
+                 threshold=None):
+        from face_pipeline import FrameProcessor
+
+        self.face_system = face_system
+        self.threshold = threshold
+        if threshold is not None:
+            face_system.recognition_threshold = threshold
+        self.processor = FrameProcessor(face_system, scale=1.0, detection_model=detection_model)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_side = max_side
+        self.requests = queue.Queue()
+        self.latencies = deque(maxlen=1000)
+        self.batches = 0
+        self.images = 0
+        self.errors = 0
+        self.expired = 0
+        self._reload = threading.Event()
+        self._running = False
+        self._worker = None
+
+    def start(self):
+        self.warm_up()
+        self._running = True
+        self._worker = threading.Thread(target=self._batch_loop, name="auth-batcher", daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._running = False
+        if self._worker is not None:
+            self._worker.join(timeout=2.0)
+
+    def warm_up(self):
+        """Run the detector, landmarker and encoder once so the first real request doesn't pay for it"""
+        start = time.perf_counter()
+        blank = np.zeros((self.max_side, self.max_side, 3), dtype=np.uint8)
+        self.processor.detect(blank)
+        # There is no face to find in a blank image, so landmark and encode a fixed box instead
+        side = self.max_side // 2
+        shapes = self.processor.landmarks(blank, [(side // 2, side + side // 2, side + side // 2, side // 2)])
+        self.processor.encode(blank, shapes)
+        self.face_system.get_matcher()
+        print(f"Warm-up done in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def reload(self):
+        """Reload the model from disk before the next batch"""
+        self._reload.set()
+
+    def authenticate(self, images, timeout=10.0):
+        """Queue decoded RGB images and wait for their results; images not done in time are dropped"""
+        pending = [AuthRequest(image) for image in images]
+        for request in pending:
+            self.requests.put(request)
+        deadline = time.perf_counter() + timeout
+        results = []
+        for request in pending:
+            if not request.done.wait(max(0.0, deadline - time.perf_counter())):
+                request.cancelled = True
+                results.append({'error': "timed out"})
+            else:
+                results.append(request.result)
+        return results
+
+    def _collect(self):
+        try:
+            batch = [self.requests.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self):
+        while self._running:
+            if self._reload.is_set():
+                self._reload.clear()
+                self.face_system.load_model()
+                if self.threshold is not None:
+                    self.face_system.recognition_threshold = self.threshold
+            batch = self._collect()
+            # Nobody is waiting for requests that already timed out
+            live = [request for request in batch if not request.cancelled]
+            self.expired += len(batch) - len(live)
+            batch = live
+            if not batch:
+                continue
+            try:
+                self._process(batch)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error processing batch: {e}")
+                for request in batch:
+                    request.result = {'error': str(e)}
+            for request in batch:
+                request.done.set()
+
+    def _process(self, batch):
+        import cv2
+
+        started = time.perf_counter()
+        rgb_images, scales = [], []
+        for request in batch:
+            image = request.image
+            scale = min(1.0, self.max_side / max(image.shape[:2]))
+            if scale < 1.0:
+                image = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+            rgb_images.append(image)
+            scales.append(scale)
+
+        start = time.perf_counter()
+        locations = [self.processor.detect(rgb) for rgb in rgb_images]
+        # Authentication is about the person in front of the camera: keep the largest face
+        locations = [[max(locs, key=lambda l: (l[2] - l[0]) * (l[1] - l[3]))] if locs else []
+                     for locs in locations]
+        shapes = [self.processor.landmarks(rgb, locs) for rgb, locs in zip(rgb_images, locations)]
+        detect_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        encodings = self.processor.encode_many(rgb_images, shapes)
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        flat = [encoding for per_image in encodings for encoding in per_image]
+        names, distances = self._match(flat)
+        match_time = time.perf_counter() - start
+
+        finished = time.perf_counter()
+        timing = {
+            'batch_size': len(batch),
+            'detect_ms': detect_time * 1000,
+            'encode_ms': encode_time * 1000,
+            'match_ms': match_time * 1000,
+        }
+        matches = iter(zip(names, distances))
+        for request, locs, per_image, scale in zip(batch, locations, encodings, scales):
+            result = {'name': "Unknown", 'distance': None, 'confidence': 0.0, 'authenticated': False,
+                      'face_found': bool(per_image), 'box': None}
+            if per_image:
+                name, distance = next(matches)
+                result.update(name=name, distance=float(distance), confidence=float(1 - distance),
+                              authenticated=name != "Unknown",
+                              box=[int(round(v / scale)) for v in locs[0]])
+            result['timing'] = dict(timing, queue_ms=(started - request.enqueued) * 1000,
+                                    total_ms=(finished - request.enqueued) * 1000)
+            request.result = result
+            self.latencies.append(finished - request.enqueued)
+
+        self.batches += 1
+        self.images += len(batch)
+
+    def _match(self, encodings):
+        if not encodings:
+            return [], []
+        if len(self.face_system.known_face_encodings) == 0:
+            return ["Unknown"] * len(encodings), [1.0] * len(encodings)
+        return self.face_system.get_matcher().match(encodings, self.face_system.recognition_threshold)
+
+    def stats(self):
+        lat = np.asarray(self.latencies) * 1000.0
+        return {
+            'faces_enrolled': len(self.face_system.known_face_names),
+            'threshold': self.face_system.recognition_threshold,
+            'images': self.images,
+            'batches': self.batches,
+            'mean_batch_size': self.images / self.batches if self.batches else 0.0,
+            'errors': self.errors,
+            'expired': self.expired,
+            'latency_p50_ms': float(np.percentile(lat, 50)) if len(lat) else 0.0,
+            'latency_p95_ms': float(np.percentile(lat, 95)) if len(lat) else 0.0,
+        }
+
+
+def decode_image(data):
+    """Decode JPEG/PNG bytes into an RGB array, None if they aren't an image"""
+    import cv2
+
+    if not data:
+        return None
+    try:
+        # imdecode returns None for most bad data, but raises on some (an empty buffer, for one)
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error:
+        return None
+    if image is None:
+        return None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+class AuthRequestHandler(BaseHTTPRequestHandler):
+    """POST /authenticate with raw image bytes, or JSON {"image": b64} / {"images": [b64, ...]}.
+
+    GET /health returns server statistics, POST /reload reloads the face model.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, self.server.authenticator.stats())
+        else:
+            self._send(404, {'error': "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        data = self.rfile.read(length)
+
+        if self.path == "/reload":
+            self.server.authenticator.reload()
+            self._send(200, {'status': "reloading"})
+            return
+        if self.path != "/authenticate":
+            self._send(404, {'error': "not found"})
+            return
+
+        start = time.perf_counter()
+        batch = False
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                request = json.loads(data)
+                batch = "images" in request
+                encoded = request["images"] if batch else [request["image"]]
+                raw_images = [base64.b64decode(item) for item in encoded]
+            else:
+                raw_images = [data]
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {'error': f"Invalid request: {e}"})
+            return
+
+        images = [decode_image(raw) for raw in raw_images]
+        if any(image is None for image in images):
+            self._send(400, {'error': "Could not decode image"})
+            return
+        decode_ms = (time.perf_counter() - start) * 1000
+
+        results = self.server.authenticator.authenticate(images)
+        for result in results:
+            if 'timing' in result:
+                result['timing']['decode_ms'] = decode_ms
+        self._send(200, {'results': results} if batch else results[0])
+
+
+class AuthHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, authenticator, verbose=False):
+        self.authenticator = authenticator
+        self.verbose = verbose
+        super().__init__(address, AuthRequestHandler)
+
+
+class AuthUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, authenticator, verbose=False):
+        self.authenticator = authenticator
+        self.verbose = verbose
+        if os.path.exists(path):
+            os.remove(path)
+        super().__init__(path, AuthRequestHandler)
+
+
+def main():
+    from face_detectors import DETECTOR_NAMES
+
+    parser = argparse.ArgumentParser(description="Local face authentication server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", default=None, help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--threshold", type=float, default=None, help="override the recognition threshold")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="how long to wait for more requests to join a batch")
+    parser.add_argument("--max-side", type=int, default=640, help="downscale larger images before detection")
+    parser.add_argument("--model", choices=DETECTOR_NAMES, default="hog", help="face detector backend")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    from face_reco import FaceRecognitionSystem
+
+    face_system = FaceRecognitionSystem()
+    if not face_system.load_model():
+        print("Warning: no trained faces yet, every request will be Unknown")
+
+    authenticator = FaceAuthenticator(face_system, args.max_batch, args.max_wait_ms / 1000.0,
+                                      args.max_side, args.model, args.threshold)
+    authenticator.start()
+
+    if args.unix_socket:
+        server = AuthUnixServer(args.unix_socket, authenticator, args.verbose)
+        where = args.unix_socket
+    else:
+        server = AuthHTTPServer((args.host, args.port), authenticator, args.verbose)
+        where = f"http://{args.host}:{args.port}"
+    print(f"Face authentication server listening on {where}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        server.server_close()
+        authenticator.stop()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+import os
+import sys
+import json
+import math
+import time
+import resource
+import platform
+import argparse
+import itertools
+import numpy as np
+
+STAGES = ["resize", "color", "detect", "landmarks", "encode", "match", "draw", "total"]
+
+
+class BenchmarkSystem:
+    """Minimal in-memory stand-in for FaceRecognitionSystem, so benchmarks never touch the stored model"""
+
+    def __init__(self, encodings, names, recognition_threshold=0.6):
+        from face_gallery import FaceGallery
+
+        self.recognition_threshold = recognition_threshold
+        self.known_face_encodings = list(encodings)
+        self.known_face_names = list(names)
+        self.gallery = FaceGallery(self.known_face_encodings, self.known_face_names)
+
+    def match_faces(self, face_encodings):
+        if len(face_encodings) == 0:
+            return [], []
+        if len(self.gallery) == 0:
+            return ["Unknown"] * len(face_encodings), [0] * len(face_encodings)
+        names, distances = self.gallery.match(face_encodings, self.recognition_threshold)
+        return names, [1 - distance for distance in distances]
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux), falling back to the peak"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def load_faces(training_dir, limit=50):
+    """Face crops (BGR) and their encodings from training_images/<name>/"""
+    import cv2
+    import face_recognition
+
+    crops, encodings, names = [], [], []
+    for name in sorted(os.listdir(training_dir)):
+        person_dir = os.path.join(training_dir, name)
+        if not os.path.isdir(person_dir):
+            continue
+        for filename in sorted(os.listdir(person_dir)):
+            if len(crops) >= limit:
+                break
+            image = cv2.imread(os.path.join(person_dir, filename))
+            if image is None:
+                continue
+            rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            locations = face_recognition.face_locations(rgb)
+            if len(locations) != 1:
+                continue
+            top, right, bottom, left = locations[0]
+            # Keep some context around the box, the detector needs it
+            margin = (bottom - top) // 2
+            crop = image[max(0, top - margin):bottom + margin, max(0, left - margin):right + margin]
+            crops.append(crop)
+            encodings.append(face_recognition.face_encodings(rgb, locations)[0])
+            names.append(name)
+    return crops, encodings, names
+
+
+def synthetic_frames(crops, faces_per_frame, count, frame_size=(640, 480), seed=0):
+    """Frames with `faces_per_frame` training faces pasted on a noisy background in a grid"""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    width, height = frame_size
+    cols = max(1, math.ceil(math.sqrt(faces_per_frame)))
+    rows = max(1, math.ceil(faces_per_frame / cols))
+    cell_w, cell_h = width // cols, height // rows
+    side = min(240, cell_w, cell_h)
+
+    frames = []
+    for i in range(count):
+        frame = rng.integers(90, 140, size=(height, width, 3), dtype=np.uint8)
+        for j in range(faces_per_frame):
+            crop = cv2.resize(crops[(i + j) % len(crops)], (side, side))
+            row, col = divmod(j, cols)
+            # Jitter the position a little so consecutive frames aren't identical
+            y = row * cell_h + (cell_h - side) // 2 + int(rng.integers(-4, 5))
+            x = col * cell_w + (cell_w - side) // 2 + int(rng.integers(-4, 5))
+            y, x = min(max(y, 0), height - side), min(max(x, 0), width - side)
+            frame[y:y + side, x:x + side] = crop
+        frames.append(frame)
+    return frames
+
+
+def video_frames(path, count):
+    """Up to `count` decoded frames of a video fixture, preloaded so decoding isn't measured"""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def build_gallery(encodings, names, size, seed=0):
+    """Real training encodings padded with random impostor identities up to `size` entries"""
+    rng = np.random.default_rng(seed)
+    encodings = list(encodings[:size])
+    names = list(names[:size])
+    extra = size - len(encodings)
+    if extra > 0:
+        # dlib descriptors have unit-ish norm; random ones land far from every real face
+        synthetic = rng.normal(0.0, 1.0 / math.sqrt(128), size=(extra, 128)).astype(np.float32)
+        encodings.extend(synthetic)
+        names.extend(f"synthetic_{i // 5}" for i in range(extra))
+    return encodings, names
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000.0
+    if len(ms) == 0:
+        return None
+    return {
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+    }
+
+
+def run_config(frames, system, scale, every_n_frames, use_tracker=False, use_roi=False, warmup=5,
+               detector="hog"):
+    """Drive the recognition loop over preloaded frames the way start_recognition does"""
+    from face_pipeline import FrameProcessor, draw_results
+    from face_tracker import FaceTracker
+    from face_roi import ROIDetector
+
+    processor = FrameProcessor(system, scale=scale, detection_model=detector,
+                               tracker=FaceTracker() if use_tracker else None,
+                               roi=ROIDetector() if use_roi else None)
+    for frame in frames[:warmup]:
+        processor.process(frame)
+
+    samples = {stage: [] for stage in STAGES}
+    faces = 0
+    processed = 0
+    started = time.perf_counter()
+    for i, frame in enumerate(frames):
+        if i % every_n_frames != 0:
+            continue
+        frame = frame.copy()
+        start = time.perf_counter()
+        result = processor.process(frame)
+        draw_start = time.perf_counter()
+        draw_results(frame, result)
+        end = time.perf_counter()
+
+        for stage, seconds in result.timings.items():
+            samples[stage].append(seconds)
+        samples['draw'].append(end - draw_start)
+        samples['total'].append(end - start)
+        faces += len(result.face_locations)
+        processed += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        'frames': len(frames),
+        'frames_processed': processed,
+        'faces_per_processed_frame': faces / processed if processed else 0.0,
+        # Skipped frames cost nothing here, so this is the rate the loop could keep up with
+        'fps': len(frames) / elapsed if elapsed > 0 else 0.0,
+        'inference_fps': processed / elapsed if elapsed > 0 else 0.0,
+        'rss_mb': rss_mb(),
+        'stages': {stage: percentiles(values) for stage, values in samples.items() if values},
+    }
+
+
+def environment():
+    import cv2
+    import dlib
+    import face_recognition
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'dlib': dlib.__version__,
+        'face_recognition': face_recognition.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """Print configurations whose median end-to-end latency regressed against a baseline run"""
+    with open(baseline_path) as f:
+        baseline = {json.dumps(r['config'], sort_keys=True): r for r in json.load(f)['results']}
+
+    regressions = 0
+    for result in results:
+        key = json.dumps(result['config'], sort_keys=True)
+        if key not in baseline:
+            continue
+        old = baseline[key]['stages']['total']['p50_ms']
+        new = result['stages']['total']['p50_ms']
+        if new > old * (1 + tolerance):
+            regressions += 1
+            print(f"REGRESSION {result['config']}: total p50 {old:.1f} ms -> {new:.1f} ms")
+    print(f"{regressions} regression(s) against {baseline_path}")
+    return regressions
+
+
+def precision_report(encodings, names, gallery_size, threshold, precisions, queries=400, repeats=5, seed=0):
+    """Memory, match throughput and decision changes of compact galleries against the exact float32 path"""
+    from face_gallery import FaceGallery
+
+    rng = np.random.default_rng(seed)
+    gallery_encodings, gallery_names = build_gallery(encodings, names, gallery_size)
+    # Probes are noisy copies of real encodings (new frames of enrolled people) plus random strangers
+    base = np.asarray(encodings, dtype=np.float32)[rng.integers(0, len(encodings), queries // 2)]
+    probes = np.concatenate([
+        base + rng.normal(0.0, 0.02, size=base.shape).astype(np.float32),
+        rng.normal(0.0, 1.0 / math.sqrt(128), size=(queries - len(base), 128)).astype(np.float32),
+    ])
+
+    def timed_match(gallery):
+        gallery.match(probes[:8], threshold)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            result = gallery.match(probes, threshold)
+        return result, repeats * len(probes) / (time.perf_counter() - start)
+
+    exact = FaceGallery(gallery_encodings, gallery_names)
+    (exact_names, exact_distances), exact_qps = timed_match(exact)
+    rows = [{'gallery_size': gallery_size, 'precision': 'float32',
+             'gallery_mb': exact.memory_usage()['float32_bytes'] / 2**20, 'matches_per_sec': exact_qps,
+             'decision_changes': 0, 'recheck_rate': 0.0, 'max_distance_error': 0.0}]
+    for precision in precisions:
+        gallery = FaceGallery(gallery_encodings, gallery_names)
+        gallery.enable_quantization(precision)
+        (q_names, q_distances), qps = timed_match(gallery)
+        rows.append({
+            'gallery_size': gallery_size,
+            'precision': precision,
+            'gallery_mb': gallery.memory_usage()['compact_bytes'] / 2**20,
+            'matches_per_sec': qps,
+            'decision_changes': sum(1 for a, b in zip(exact_names, q_names) if a != b),
+            'recheck_rate': gallery.rechecks / gallery.quantized_queries if gallery.quantized_queries else 0.0,
+            'max_distance_error': float(np.max(np.abs(np.asarray(exact_distances) - q_distances))),
+        })
+    return rows
+
+
+def parse_list(text, cast):
+    return [cast(v) for v in text.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless benchmark of the face recognition hot path")
+    parser.add_argument("--training-dir", default="training_images")
+    parser.add_argument("--video", action="append", default=[], help="recorded video fixture (repeatable)")
+    parser.add_argument("--frames", type=int, default=60, help="frames per configuration")
+    parser.add_argument("--gallery-sizes", default="10,1000,10000")
+    parser.add_argument("--faces", default="1,2,4", help="faces per synthetic frame")
+    parser.add_argument("--scales", default="0.25,0.5")
+    parser.add_argument("--skips", default="1,2", help="process every n-th frame")
+    parser.add_argument("--tracker", action="store_true", help="benchmark with the face tracker attached")
+    parser.add_argument("--roi", action="store_true", help="benchmark region-of-interest detection")
+    parser.add_argument("--detector", default="hog", help="face detector backend (see face_detectors.py)")
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--precision", default=None,
+                        help="also compare compact galleries, e.g. float16,int8 (match stage only)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="previous results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    crops, encodings, names = load_faces(args.training_dir)
+    if not crops:
+        print(f"No usable faces found in {args.training_dir}/")
+        return 1
+    print(f"Loaded {len(crops)} training faces")
+
+    sources = [(f"synthetic-{n}", n) for n in parse_list(args.faces, int)]
+    sources += [(os.path.basename(path), path) for path in args.video]
+
+    precision_rows = []
+    if args.precision:
+        print(f"{'Gallery':>8} {'Precision':<10}{'MB':>9}{'Matches/s':>12}{'Changed':>9}{'Rechecked':>11}{'Max err':>9}")
+        for gallery_size in parse_list(args.gallery_sizes, int):
+            for row in precision_report(encodings, names, gallery_size, args.threshold, args.precision.split(",")):
+                precision_rows.append(row)
+                print(f"{row['gallery_size']:>8} {row['precision']:<10}{row['gallery_mb']:>9.2f}"
+                      f"{row['matches_per_sec']:>12.0f}{row['decision_changes']:>9}{row['recheck_rate']:>11.1%}"
+                      f"{row['max_distance_error']:>9.4f}")
+
+    results = []
+    for gallery_size in parse_list(args.gallery_sizes, int):
+        gallery_encodings, gallery_names = build_gallery(encodings, names, gallery_size)
+        system = BenchmarkSystem(gallery_encodings, gallery_names, args.threshold)
+        for source, spec in sources:
+            if isinstance(spec, int):
+                frames = synthetic_frames(crops, spec, args.frames)
+            else:
+                frames = video_frames(spec, args.frames)
+            if not frames:
+                print(f"Skipping {source}: no frames")
+                continue
+            for scale, skip in itertools.product(parse_list(args.scales, float), parse_list(args.skips, int)):
+                config = {'source': source, 'gallery_size': gallery_size, 'scale': scale,
+                          'every_n_frames': skip, 'tracker': args.tracker, 'roi': args.roi,
+                          'detector': args.detector}
+                result = run_config(frames, system, scale, max(1, skip), args.tracker, args.roi,
+                                    detector=args.detector)
+                result['config'] = config
+                results.append(result)
+                total = result['stages']['total']
+                print(f"{source:<16} gallery={gallery_size:<6} scale={scale:<5} skip={skip}  "
+                      f"p50={total['p50_ms']:7.1f} ms  p95={total['p95_ms']:7.1f} ms  "
+                      f"fps={result['fps']:6.1f}  faces={result['faces_per_processed_frame']:.1f}  "
+                      f"rss={result['rss_mb']:.0f} MB")
+
+    with open(args.output, "w") as f:
+        json.dump({'environment': environment(), 'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   'results': results, 'precision': precision_rows}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        return 1 if compare(results, args.baseline, args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+import os
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import numpy as np
+
+# Bump when the way encodings are produced changes, so cached encodings are recomputed
+ENCODER_REVISION = 1
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+_detectors = {}  # per worker process, so each detector is loaded once
+
+
+def encoder_version(detection_model, num_jitters):
+    """Identifies everything that affects the encoding of an image"""
+    import dlib
+    import face_recognition
+    return f"r{ENCODER_REVISION}/fr{face_recognition.__version__}/dlib{dlib.__version__}/{detection_model}/j{num_jitters}"
+
+
+def find_images(training_dir):
+    """(path, name) for every image under training_dir/<name>/"""
+    images = []
+    for name in sorted(os.listdir(training_dir)):
+        person_dir = os.path.join(training_dir, name)
+        if not os.path.isdir(person_dir):
+            continue
+        for filename in sorted(os.listdir(person_dir)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((os.path.join(person_dir, filename), name))
+    return images
+
+
+def content_key(path, version):
+    """Cache key: hash of the encoder version and the image bytes"""
+    digest = hashlib.sha256(version.encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class EncodingCache:
+    """Content-addressed cache of encodings stored as one .npz file.
+
+    Images without a usable face are cached too (as NaN rows) so they aren't retried.
+    """
+
+    def __init__(self, path, dim=128):
+        self.path = path
+        self.dim = dim
+        self.entries = {}
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self.entries = dict(zip(data["keys"].tolist(), data["encodings"]))
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        encoding = self.entries[key]
+        return None if np.isnan(encoding[0]) else encoding
+
+    def put(self, key, encoding):
+        self.entries[key] = np.full(self.dim, np.nan, dtype=np.float32) if encoding is None else encoding
+
+    def save(self, keep=None):
+        """Write the cache atomically, optionally keeping only the given keys"""
+        keys = [k for k in self.entries if keep is None or k in keep]
+        encodings = np.array([self.entries[k] for k in keys], dtype=np.float32).reshape(-1, self.dim)
+        tmp = self.path + ".tmp.npz"
+        np.savez(tmp, keys=np.array(keys), encodings=encodings)
+        os.replace(tmp, self.path)
+
+
+def encode_image(path, detection_model="hog", num_jitters=1):
+    """Worker: encode the largest face in an image, returns (encoding or None, message)"""
+    import face_recognition
+    from face_detectors import create_detector
+
+    if detection_model not in _detectors:
+        _detectors[detection_model] = create_detector(detection_model)
+    image = face_recognition.load_image_file(path)
+    locations = _detectors[detection_model].detect(image)
+    if not locations:
+        return None, "no face found"
+
+    message = ""
+    if len(locations) > 1:
+        message = f"{len(locations)} faces found, using the largest"
+        locations = [max(locations, key=lambda l: (l[2] - l[0]) * (l[1] - l[3]))]
+    encodings = face_recognition.face_encodings(image, locations, num_jitters=num_jitters)
+    if not encodings:
+        return None, "face could not be encoded"
+    return np.asarray(encodings[0], dtype=np.float32), message
+
+
+def enroll(training_dir, model_dir, cache_file, workers=None, detection_model="hog", num_jitters=1,
+           flush_interval=60.0):
+    """Encode every training image (reusing cached encodings) and write the model in one go.
+
+    The cache is saved every `flush_interval` seconds while encoding, so an interrupted run
+    only loses the encodings of its last interval.
+    """
+    from face_store import FaceModelStore
+
+    started = time.perf_counter()
+    images = find_images(training_dir)
+    if not images:
+        print(f"No images found under {training_dir}/")
+        return False
+
+    version = encoder_version(detection_model, num_jitters)
+    cache = EncodingCache(cache_file)
+
+    # Hashing is I/O bound, so threads are enough
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        keys = list(pool.map(lambda item: content_key(item[0], version), images))
+
+    missing = [i for i, key in enumerate(keys) if key not in cache]
+    print(f"{len(images)} images, {len(images) - len(missing)} cached, {len(missing)} to encode")
+
+    if missing:
+        last_flush = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(encode_image, images[i][0], detection_model, num_jitters): i for i in missing}
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                try:
+                    encoding, message = future.result()
+                except Exception as e:
+                    encoding, message = None, f"error: {e}"
+                if message:
+                    print(f"{images[i][0]}: {message}")
+                cache.put(keys[i], encoding)
+                if time.perf_counter() - last_flush >= flush_interval:
+                    cache.save()
+                    last_flush = time.perf_counter()
+                if done % 100 == 0 or done == len(missing):
+                    rate = done / (time.perf_counter() - started)
+                    print(f"Encoded {done}/{len(missing)} ({rate:.1f} images/s)")
+
+    encodings = []
+    names = []
+    for (path, name), key in zip(images, keys):
+        encoding = cache.get(key)
+        if encoding is not None:
+            encodings.append(encoding)
+            names.append(name)
+
+    # Only keep cache entries for images that still exist
+    cache.save(keep=set(keys))
+    FaceModelStore(model_dir).write_all(encodings, names)
+
+    elapsed = time.perf_counter() - started
+    print(f"Model written to {model_dir}/ with {len(names)} faces of {len(set(names))} people "
+          f"in {elapsed:.1f}s ({len(images) - len(names)} images skipped)")
+    return True
+
+
+def main():
+    from face_detectors import DETECTOR_NAMES
+
+    parser = argparse.ArgumentParser(description="Rebuild the face model from the images in training_images/")
+    parser.add_argument("--training-dir", default="training_images")
+    parser.add_argument("--model-dir", default="face_model")
+    parser.add_argument("--cache-file", default="enroll_cache.npz")
+    parser.add_argument("--workers", type=int, default=None, help="encoder processes (default: CPU count)")
+    parser.add_argument("--model", choices=DETECTOR_NAMES, default="hog", help="face detector backend")
+    parser.add_argument("--jitters", type=int, default=1, help="re-samples per encoding (slower, slightly better)")
+    parser.add_argument("--flush-interval", type=float, default=60.0,
+                        help="seconds between cache saves while encoding")
+    args = parser.parse_args()
+
+    enroll(args.training_dir, args.model_dir, args.cache_file, args.workers, args.model, args.jitters,
+           args.flush_interval)
+
+
+if __name__ == "__main__":
+    main()
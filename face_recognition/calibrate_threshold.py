@@ -0,0 +1,362 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+CALIBRATION_FILE = "calibration.json"
+MAX_DISTANCE = 2.0  # dlib encodings have unit-ish norm, so pair distances stay below this
+
+
+def _block_statistics(encodings, labels, row_starts, bins, max_distance, block_size, stride=1):
+    """Accumulate the statistics of the upper-triangle tiles whose row block starts at one of row_starts.
+
+    Rows and columns are augmented with their scaled squared norms, so a single matrix product
+    yields squared distances already scaled to histogram bins. Genuine pairs are counted
+    exactly; impostor pairs are counted on every `stride`-th pair of a tile only, which bounds
+    the histogram cost on large galleries.
+    """
+    n = len(encodings)
+    labels = np.asarray(labels)
+    per_bin = np.float32(bins / max_distance ** 2)
+    excluded = np.float32(bins)  # marks self, lower-triangle and genuine pairs in a tile
+    starts = range(0, n, block_size)
+    block_labels = {start: np.unique(labels[start:start + block_size]) for start in starts}
+
+    def augmented(start, end, as_rows):
+        block = np.asarray(encodings[start:end], dtype=np.float32)
+        out = np.empty((len(block), block.shape[1] + 2), dtype=np.float32)
+        sq_norms = np.einsum('ij,ij->i', block, block) * per_bin
+        if as_rows:
+            np.multiply(block, -2.0 * per_bin, out=out[:, :-2])
+            out[:, -2], out[:, -1] = sq_norms, 1.0
+        else:
+            out[:, :-2] = block
+            out[:, -2], out[:, -1] = 1.0, sq_norms
+        return out
+
+    genuine_hist = np.zeros(bins, dtype=np.int64)
+    impostor_hist = np.zeros(bins, dtype=np.int64)
+    genuine_sum = np.zeros(n, dtype=np.float64)
+    genuine_count = np.zeros(n, dtype=np.int64)
+    impostor_min = np.full(n, excluded, dtype=np.float32)   # in scaled squared units until the end
+    impostor_arg = np.full(n, -1, dtype=np.int64)
+    idx = np.empty(block_size * block_size // stride + 1, dtype=np.intp)
+
+    for a in row_starts:
+        b = min(a + block_size, n)
+        rows = augmented(a, b, True)
+        row_labels = labels[a:b]
+        for c in range(a, n, block_size):
+            e = min(c + block_size, n)
+            d = rows @ augmented(c, e, False).T
+            # Rounding can leave tiny negative values; casting to bin indices truncates them to 0
+            np.minimum(d, bins - 1, out=d)
+
+            diagonal = c == a
+            if diagonal:
+                # Keep each unordered pair once and drop self-pairs
+                for i in range(len(d)):
+                    d[i, :i + 1] = excluded
+
+            # Genuine pairs only exist where both blocks share an identity
+            if diagonal or np.intersect1d(block_labels[a], block_labels[c], assume_unique=True).size:
+                same = row_labels[:, np.newaxis] == labels[np.newaxis, c:e]
+                same &= d < excluded
+                gi, gj = np.nonzero(same)
+                if len(gi):
+                    scaled = np.maximum(d[gi, gj], 0.0)
+                    genuine_hist += np.bincount(scaled.astype(np.intp), minlength=bins)
+                    genuine = np.sqrt(scaled / per_bin)
+                    genuine_sum[a:b] += np.bincount(gi, weights=genuine, minlength=b - a)
+                    genuine_sum[c:e] += np.bincount(gj, weights=genuine, minlength=e - c)
+                    genuine_count[a:b] += np.bincount(gi, minlength=b - a)
+                    genuine_count[c:e] += np.bincount(gj, minlength=e - c)
+                    d[gi, gj] = excluded
+
+            # A prime stride over the flattened tile walks diagonally, so every row and column is sampled
+            sample = d.ravel()[::stride]
+            tile_idx = idx[:len(sample)]
+            np.copyto(tile_idx, sample, casting='unsafe')
+            impostor_hist += np.bincount(tile_idx, minlength=bins + 1)[:bins]
+
+            # Nearest other identity for the tile's rows, and by symmetry for its columns
+            arg = np.argmin(d, axis=1)
+            best = d[np.arange(len(arg)), arg]
+            better = best < impostor_min[a:b]
+            impostor_min[a:b][better] = best[better]
+            impostor_arg[a:b][better] = arg[better] + c
+            # A column-wise argmin is slow on a row-major tile; only resolve the columns that improved
+            column_best = d.min(axis=0)
+            better = np.flatnonzero(column_best < impostor_min[c:e])
+            if len(better):
+                impostor_min[c + better] = column_best[better]
+                impostor_arg[c + better] = np.argmin(d[:, better], axis=0) + a
+
+    return {'genuine_hist': genuine_hist, 'impostor_hist': impostor_hist, 'genuine_sum': genuine_sum,
+            'genuine_count': genuine_count, 'impostor_min': impostor_min, 'impostor_arg': impostor_arg}
+
+
+def pair_statistics(encodings, labels, bins=4000, max_distance=MAX_DISTANCE, block_size=2048, workers=1,
+                    max_sampled_pairs=100_000_000):
+    """Genuine/impostor distance histograms and per-encoding statistics over all pairs.
+
+    The distance matrix is computed one (block_size x block_size) tile at a time over the
+    upper triangle only, so memory stays bounded by a few tiles per worker whatever the
+    gallery size. Histogram bins are uniform in squared distance, which saves a sqrt over
+    every pair; `edges` holds the bin edges converted back to distances. Per row, it also
+    returns the mean distance to the same identity and the nearest other identity.
+
+    Every pair is compared for the per-row statistics and the genuine histogram. Above
+    `max_sampled_pairs` pairs, the impostor histogram is built from every `impostor_stride`-th
+    pair of each tile; the FAR curve only depends on its shape, not on its total.
+    """
+    labels = np.asarray(labels)
+    n = len(encodings)
+    stride = int(np.ceil(n * (n - 1) / 2 / max_sampled_pairs))
+    if stride > 1:
+        while any(stride % p == 0 for p in range(2, int(stride ** 0.5) + 1)):
+            stride += 1
+    stride = max(1, stride)
+    starts = list(range(0, n, block_size))
+    if workers <= 1 or len(starts) < 2:
+        parts = [_block_statistics(encodings, labels, starts, bins, max_distance, block_size, stride)]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Earlier row blocks have more tiles, so deal them out round-robin
+        encodings = np.asarray(encodings, dtype=np.float32)
+        chunks = [starts[i::workers] for i in range(min(workers, len(starts)))]
+        with ProcessPoolExecutor(len(chunks)) as pool:
+            parts = list(pool.map(_block_statistics, [encodings] * len(chunks), [labels] * len(chunks), chunks,
+                                  [bins] * len(chunks), [max_distance] * len(chunks), [block_size] * len(chunks),
+                                  [stride] * len(chunks)))
+
+    merged = parts[0]
+    for part in parts[1:]:
+        for key in ('genuine_hist', 'impostor_hist', 'genuine_sum', 'genuine_count'):
+            merged[key] += part[key]
+        better = part['impostor_min'] < merged['impostor_min']
+        merged['impostor_min'][better] = part['impostor_min'][better]
+        merged['impostor_arg'][better] = part['impostor_arg'][better]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        genuine_mean = np.where(merged['genuine_count'] > 0, merged['genuine_sum'] / merged['genuine_count'], np.nan)
+    no_impostor = merged['impostor_arg'] < 0
+    impostor_min = np.sqrt(np.maximum(merged['impostor_min'], 0.0) * (max_distance ** 2 / bins))
+    impostor_min[no_impostor] = np.inf
+    genuine_pairs = int(merged['genuine_hist'].sum())
+    return {
+        'edges': np.sqrt(np.arange(bins + 1) * max_distance ** 2 / bins),
+        'genuine_hist': merged['genuine_hist'],
+        'impostor_hist': merged['impostor_hist'],
+        'genuine_pairs': genuine_pairs,
+        'impostor_pairs': n * (n - 1) // 2 - genuine_pairs,
+        'impostor_stride': stride,
+        'genuine_mean': genuine_mean,
+        'genuine_count': merged['genuine_count'],
+        'impostor_min': impostor_min,
+        'impostor_arg': merged['impostor_arg'],
+    }
+
+
+def error_curves(stats):
+    """FAR and FRR when accepting distances below each bin edge"""
+    genuine, impostor = stats['genuine_hist'], stats['impostor_hist']
+    accepted_genuine = np.concatenate([[0], np.cumsum(genuine)])
+    accepted_impostor = np.concatenate([[0], np.cumsum(impostor)])
+    far = accepted_impostor / max(impostor.sum(), 1)
+    frr = 1.0 - accepted_genuine / max(genuine.sum(), 1)
+    return stats['edges'], far, frr
+
+
+def equal_error_rate(thresholds, far, frr):
+    i = int(np.argmin(np.abs(far - frr)))
+    return float(thresholds[i]), float((far[i] + frr[i]) / 2)
+
+
+def recommend_threshold(thresholds, far, frr, target_far=None):
+    """EER threshold, or the most permissive threshold whose FAR stays within target_far"""
+    if target_far is None:
+        return equal_error_rate(thresholds, far, frr)[0]
+    within = np.flatnonzero(far <= target_far)
+    return float(thresholds[within[-1]]) if len(within) else float(thresholds[0])
+
+
+def flag_encodings(stats, names, threshold):
+    """Encodings far from their own identity (outliers) or closer to another identity (possible mislabels)"""
+    flags = []
+    for i in np.flatnonzero(stats['genuine_count'] > 0):
+        mean = stats['genuine_mean'][i]
+        nearest = stats['impostor_min'][i]
+        other = stats['impostor_arg'][i]
+        if other >= 0 and nearest < threshold and nearest < mean:
+            flags.append({'row': int(i), 'name': names[i], 'issue': "possible mislabel",
+                          'mean_same_distance': float(mean), 'closest_other': names[other],
+                          'closest_other_distance': float(nearest)})
+        elif mean >= threshold:
+            flags.append({'row': int(i), 'name': names[i], 'issue': "outlier",
+                          'mean_same_distance': float(mean)})
+    return flags
+
+
+def calibrate(encodings, names, target_far=None, block_size=2048, workers=1, compare=(0.6, 0.3)):
+    """Full calibration report for a gallery"""
+    start = time.perf_counter()
+    _, labels = np.unique(np.asarray(names, dtype=object), return_inverse=True)
+    stats = pair_statistics(encodings, labels, block_size=block_size, workers=workers)
+    thresholds, far, frr = error_curves(stats)
+    eer_threshold, eer = equal_error_rate(thresholds, far, frr)
+    recommended = recommend_threshold(thresholds, far, frr, target_far)
+
+    def rates_at(threshold):
+        i = min(int(np.searchsorted(thresholds, threshold)), len(thresholds) - 1)
+        return {'threshold': threshold, 'far': float(far[i]), 'frr': float(frr[i])}
+
+    flags = flag_encodings(stats, list(names), recommended)
+    identities = {}
+    for name, mean, count in zip(names, stats['genuine_mean'], stats['genuine_count']):
+        entry = identities.setdefault(name, {'encodings': 0, 'mean_same_distance': 0.0, 'flagged': 0})
+        entry['encodings'] += 1
+        if count:
+            entry['mean_same_distance'] += float(mean)
+    for entry in identities.values():
+        entry['mean_same_distance'] /= entry['encodings']
+    for flag in flags:
+        identities[flag['name']]['flagged'] += 1
+
+    step = max(1, len(thresholds) // 200)
+    return {
+        'encodings': len(names),
+        'identities': len(identities),
+        'genuine_pairs': stats['genuine_pairs'],
+        'impostor_pairs': stats['impostor_pairs'],
+        'impostor_stride': stats['impostor_stride'],
+        'eer': eer,
+        'eer_threshold': eer_threshold,
+        'target_far': target_far,
+        'recommended_threshold': recommended,
+        'at_recommended': rates_at(recommended),
+        'compared': [rates_at(t) for t in compare],
+        'curve': {'threshold': thresholds[::step].tolist(), 'far': far[::step].tolist(), 'frr': frr[::step].tolist()},
+        'genuine_hist': stats['genuine_hist'].tolist(),
+        'impostor_hist': stats['impostor_hist'].tolist(),
+        'per_identity': identities,
+        'flags': flags,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def load_calibration(model_dir):
+    """Recommended threshold saved next to the model, or None.
+
+    A calibration made on another generation of the model (before a bulk enrollment, clear
+    or migration rewrote it) is ignored.
+    """
+    from face_store import FaceModelStore
+
+    path = os.path.join(model_dir, CALIBRATION_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            calibration = json.load(f)
+        generation = FaceModelStore(model_dir).current_generation()
+        if calibration.get('model_generation') != generation:
+            print(f"Ignoring {path}: it was made for another version of the model, re-run calibrate_threshold.py")
+            return None
+        return float(calibration['recommended_threshold'])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error reading {path}: {e}")
+        return None
+
+
+def save_calibration(model_dir, report, generation):
+    """Save the recommended threshold for the model generation the report was computed on"""
+    path = os.path.join(model_dir, CALIBRATION_FILE)
+    summary = {key: report[key] for key in ('recommended_threshold', 'eer', 'eer_threshold', 'target_far',
+                                            'encodings', 'identities')}
+    summary['model_generation'] = generation
+    summary['created'] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def text_histogram(genuine, impostor, edges, width=50, rows=20):
+    """Side-by-side genuine/impostor histogram, coarsened to `rows` lines"""
+    last = np.flatnonzero((genuine + impostor) > 0)
+    if len(last) == 0:
+        return []
+    group = int(np.ceil((last[-1] + 1) / rows))
+    lines = []
+    for start in range(0, last[-1] + 1, group):
+        g = genuine[start:start + group].sum() / max(genuine.sum(), 1)
+        i = impostor[start:start + group].sum() / max(impostor.sum(), 1)
+        lines.append(f"{edges[start]:5.2f} {'#' * int(round(g * width)):<{width}} | {'.' * int(round(i * width))}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the recognition threshold from the enrolled gallery")
+    parser.add_argument("--model-dir", default="face_model")
+    parser.add_argument("--target-far", type=float, default=None,
+                        help="recommend the threshold with at most this false accept rate (default: EER)")
+    parser.add_argument("--block-size", type=int, default=2048, help="rows per distance tile")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes sharing the tiles")
+    parser.add_argument("--output", default="calibration_report.json")
+    parser.add_argument("--apply", action="store_true",
+                        help="save the recommended threshold in the model directory for both front ends")
+    args = parser.parse_args()
+
+    from face_store import FaceModelStore
+    store = FaceModelStore(args.model_dir)
+    if not store.exists():
+        print(f"No face model found in {args.model_dir}/")
+        return
+    encodings, names = store.load()
+    if len(set(names)) < 2:
+        print("Calibration needs at least two enrolled people")
+        return
+
+    report = calibrate(encodings, names, args.target_far, args.block_size, args.workers)
+    print(f"{report['encodings']} encodings of {report['identities']} people, "
+          f"{report['genuine_pairs']} genuine / {report['impostor_pairs']} impostor pairs "
+          f"in {report['seconds']:.1f} s")
+    if report['impostor_stride'] > 1:
+        print(f"Impostor distribution sampled from 1 in {report['impostor_stride']} pairs")
+    print()
+    print("distance  genuine (#) | impostor (.)")
+    genuine, impostor = np.asarray(report['genuine_hist']), np.asarray(report['impostor_hist'])
+    for line in text_histogram(genuine, impostor, np.sqrt(np.linspace(0.0, MAX_DISTANCE ** 2, len(genuine) + 1))):
+        print(line)
+
+    print(f"\nEER {report['eer']:.2%} at threshold {report['eer_threshold']:.3f}")
+    for rates in report['compared']:
+        print(f"At {rates['threshold']:.2f}: FAR {rates['far']:.3%}  FRR {rates['frr']:.3%}")
+    rates = report['at_recommended']
+    print(f"Recommended threshold: {report['recommended_threshold']:.3f} "
+          f"(FAR {rates['far']:.3%}, FRR {rates['frr']:.3%})")
+
+    if report['flags']:
+        print(f"\n{len(report['flags'])} encoding(s) to review:")
+        for flag in report['flags'][:50]:
+            if flag['issue'] == "outlier":
+                print(f"  row {flag['row']:>6} {flag['name']:<20} outlier, mean distance to own faces "
+                      f"{flag['mean_same_distance']:.3f}")
+            else:
+                print(f"  row {flag['row']:>6} {flag['name']:<20} possible mislabel, closer to "
+                      f"{flag['closest_other']} ({flag['closest_other_distance']:.3f}) than to own faces "
+                      f"({flag['mean_same_distance']:.3f})")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+    if args.apply:
+        print(f"Recommended threshold saved to {save_calibration(args.model_dir, report, store.generation)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+from collections import deque
+from datetime import datetime
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class RecentRecognitionsModel(QAbstractTableModel):
+    """Fixed-size table of the newest recognition events, newest first.
+
+    Rows are added in batches with one insert (and at most one remove) notification per
+    batch, so the view only repaints what changed and never grows past `capacity` rows.
+    """
+
+    HEADERS = ["Person", "Confidence", "Time"]
+
+    def __init__(self, capacity=500, parent=None):
+        super().__init__(parent)
+        self.capacity = capacity
+        self._rows = deque()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        timestamp, name, confidence = self._rows[index.row()]
+        if index.column() == 0:
+            return name
+        if index.column() == 1:
+            return f"{confidence:.2f}"
+        return datetime.fromtimestamp(timestamp).strftime("%H:%M:%S")
+
+    def add_events(self, events):
+        """Prepend a batch of events (oldest first), dropping the oldest rows beyond capacity"""
+        events = events[-self.capacity:]
+        if not events:
+            return
+        overflow = len(self._rows) + len(events) - self.capacity
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), len(self._rows) - overflow, len(self._rows) - 1)
+            for _ in range(overflow):
+                self._rows.pop()
+            self.endRemoveRows()
+        self.beginInsertRows(QModelIndex(), 0, len(events) - 1)
+        self._rows.extendleft(events)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self._rows.clear()
+        self.endResetModel()
+
+
+class IdentityStatsModel(QAbstractTableModel):
+    """One row per identity with its running count, average confidence and last sighting"""
+
+    HEADERS = ["Person", "Seen", "Avg confidence", "Last seen"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._names = []
+        self._stats = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        name = self._names[index.row()]
+        count, avg_confidence, last_seen = self._stats[name]
+        return [name, str(count), f"{avg_confidence:.2f}",
+                datetime.fromtimestamp(last_seen).strftime("%H:%M:%S")][index.column()]
+
+    def update_stats(self, changed):
+        """Apply {name: (count, avg confidence, last seen)}; only new identities change the row layout"""
+        new_names = [name for name in changed if name not in self._stats]
+        self._stats.update(changed)
+        if new_names:
+            self.beginResetModel()
+            self._names = sorted(self._stats)
+            self.endResetModel()
+            return
+        for name in changed:
+            row = self._names.index(name)
+            self.dataChanged.emit(self.index(row, 1), self.index(row, len(self.HEADERS) - 1))
+
+    def clear(self):
+        self.beginResetModel()
+        self._names = []
+        self._stats = {}
+        self.endResetModel()
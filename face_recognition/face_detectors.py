@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+
+class HOGDetector:
+    """dlib HOG + linear SVM, the face_recognition default"""
+
+    name = "hog"
+
+    def __init__(self, upsample=1):
+        import face_recognition
+        self._face_locations = face_recognition.face_locations
+        self.upsample = upsample
+
+    def detect(self, rgb_image):
+        return self._face_locations(rgb_image, self.upsample, model="hog")
+
+
+class CNNDetector(HOGDetector):
+    """dlib MMOD CNN: more accurate on angled faces, slow without a GPU"""
+
+    name = "cnn"
+
+    def detect(self, rgb_image):
+        return self._face_locations(rgb_image, self.upsample, model="cnn")
+
+
+class CascadeClassifierDetector:
+    """OpenCV Haar or LBP cascade; very fast, more false positives and looser boxes"""
+
+    def __init__(self, cascade_file, scale_factor=1.1, min_neighbors=5, min_size=20, name="haar"):
+        self.name = name
+        self.classifier = cv2.CascadeClassifier(cascade_file)
+        if self.classifier.empty():
+            raise FileNotFoundError(f"Could not load cascade {cascade_file}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = (min_size, min_size)
+
+    def detect(self, rgb_image):
+        gray = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY)
+        boxes = self.classifier.detectMultiScale(gray, scaleFactor=self.scale_factor,
+                                                 minNeighbors=self.min_neighbors, minSize=self.min_size)
+        return [(int(y), int(x + w), int(y + h), int(x)) for x, y, w, h in boxes]
+
+
+class DNNDetector:
+    """OpenCV DNN ResNet-10 SSD face detector (Caffe model files are downloaded separately)"""
+
+    name = "dnn"
+
+    def __init__(self, prototxt=None, weights=None, confidence=0.6, input_size=300):
+        prototxt = prototxt or os.path.join(MODELS_DIR, "deploy.prototxt")
+        weights = weights or os.path.join(MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+        for path in (prototxt, weights):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{path} not found; download the OpenCV face detector model into {MODELS_DIR}/")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, weights)
+        self.confidence = confidence
+        self.input_size = input_size
+
+    def detect(self, rgb_image):
+        height, width = rgb_image.shape[:2]
+        size = (self.input_size, self.input_size)
+        # The model was trained on BGR input with these channel means
+        blob = cv2.dnn.blobFromImage(cv2.resize(rgb_image, size), 1.0, size, (104.0, 177.0, 123.0), swapRB=True)
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        locations = []
+        for detection in detections[detections[:, 2] >= self.confidence]:
+            left, top, right, bottom = (detection[3:7] * [width, height, width, height]).astype(int)
+            left, top = max(0, left), max(0, top)
+            right, bottom = min(width, right), min(height, bottom)
+            if right > left and bottom > top:
+                locations.append((int(top), int(right), int(bottom), int(left)))
+        return locations
+
+
+class CascadeDetector:
+    """A cheap detector proposes boxes and an expensive one confirms them on small crops.
+
+    Each proposal is expanded by `margin` and the confirming detector runs only on that
+    crop, so its box (which the landmark model is trained on) replaces the proposal's.
+    When the proposer finds nothing, the confirming detector sweeps the whole frame every
+    `fallback_every` frames, so faces the proposer misses are still picked up.
+    """
+
+    def __init__(self, proposer, confirmer, margin=0.4, fallback_every=5):
+        self.name = f"{proposer.name}>{confirmer.name}"
+        self.proposer = proposer
+        self.confirmer = confirmer
+        self.margin = margin
+        self.fallback_every = fallback_every
+        self.proposals = 0
+        self.confirmed = 0
+        self.fallbacks = 0
+        self._empty_frames = 0
+
+    def detect(self, rgb_image):
+        height, width = rgb_image.shape[:2]
+        proposals = self.proposer.detect(rgb_image)
+        self.proposals += len(proposals)
+
+        if not proposals:
+            self._empty_frames += 1
+            if self.fallback_every and self._empty_frames % self.fallback_every == 0:
+                self.fallbacks += 1
+                return self.confirmer.detect(rgb_image)
+            return []
+        self._empty_frames = 0
+
+        locations = []
+        for top, right, bottom, left in proposals:
+            margin = int(self.margin * max(right - left, bottom - top))
+            y0, x0 = max(0, top - margin), max(0, left - margin)
+            y1, x1 = min(height, bottom + margin), min(width, right + margin)
+            crop = np.ascontiguousarray(rgb_image[y0:y1, x0:x1])
+            for t, r, b, l in self.confirmer.detect(crop):
+                location = (t + y0, r + x0, b + y0, l + x0)
+                if location not in locations:
+                    locations.append(location)
+        self.confirmed += len(locations)
+        return locations
+
+
+def create_detector(name="hog", **options):
+    """Build a detector by name: hog, cnn, haar, lbp, dnn, or a cascade written as proposer>confirmer"""
+    if ">" in name:
+        proposer, confirmer = name.split(">", 1)
+        return CascadeDetector(create_detector(proposer), create_detector(confirmer), **options)
+    if name == "cascade":
+        return CascadeDetector(create_detector("haar"), create_detector("hog"), **options)
+    if name == "hog":
+        return HOGDetector(**options)
+    if name == "cnn":
+        return CNNDetector(**options)
+    if name == "haar":
+        cascade = options.pop("cascade_file", os.path.join(cv2.data.haarcascades, "haarcascade_frontalface_default.xml"))
+        return CascadeClassifierDetector(cascade, name="haar", **options)
+    if name == "lbp":
+        # opencv-python only bundles the Haar cascades; the LBP one comes from the OpenCV sources
+        cascade = options.pop("cascade_file", os.path.join(MODELS_DIR, "lbpcascade_frontalface_improved.xml"))
+        return CascadeClassifierDetector(cascade, name="lbp", **options)
+    if name == "dnn":
+        return DNNDetector(**options)
+    raise ValueError(f"Unknown face detector: {name}")
+
+
+DETECTOR_NAMES = ["hog", "cnn", "haar", "lbp", "dnn", "cascade"]
+
+
+def compare(training_dir, names, scale=0.25, iou_threshold=0.3):
+    """Speed and accuracy of each detector on training_images/, where every image holds exactly one face.
+
+    The reference box is dlib HOG at full resolution (the training captures were only
+    accepted when it found exactly one face).
+    """
+    from face_tracker import iou_matrix
+
+    images = []
+    for person in sorted(os.listdir(training_dir)):
+        person_dir = os.path.join(training_dir, person)
+        if not os.path.isdir(person_dir):
+            continue
+        for filename in sorted(os.listdir(person_dir)):
+            image = cv2.imread(os.path.join(person_dir, filename))
+            if image is not None:
+                images.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+
+    reference = HOGDetector()
+    truths = [reference.detect(image) for image in images]
+    results = []
+    for name in names:
+        try:
+            detector = create_detector(name)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Skipping {name}: {e}")
+            continue
+
+        times, found, extra, ious = [], 0, 0, []
+        for image, truth in zip(images, truths):
+            small = cv2.resize(image, (0, 0), fx=scale, fy=scale) if scale != 1.0 else image
+            start = time.perf_counter()
+            boxes = detector.detect(small)
+            times.append(time.perf_counter() - start)
+            boxes = [tuple(v / scale for v in box) for box in boxes]
+            if truth and boxes:
+                best = iou_matrix(truth[:1], boxes)[0]
+                if best.max() >= iou_threshold:
+                    found += 1
+                    ious.append(float(best.max()))
+                    extra += len(boxes) - 1
+                    continue
+            extra += len(boxes)
+
+        ms = np.asarray(times) * 1000.0
+        labelled = sum(1 for truth in truths if truth)
+        results.append({
+            'detector': detector.name,
+            'images': len(images),
+            'recall': found / labelled if labelled else 0.0,
+            'false_positives': extra,
+            'mean_iou': float(np.mean(ious)) if ious else 0.0,
+            'mean_ms': float(ms.mean()) if len(ms) else 0.0,
+            'p95_ms': float(np.percentile(ms, 95)) if len(ms) else 0.0,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare face detector backends on training_images/")
+    parser.add_argument("--training-dir", default="training_images")
+    parser.add_argument("--detectors", default="hog,haar,cascade", help=f"comma separated, from {DETECTOR_NAMES}")
+    parser.add_argument("--scale", type=float, default=0.25, help="downscale like the live pipeline does")
+    parser.add_argument("--output", default=None, help="also write the results as JSON")
+    args = parser.parse_args()
+
+    results = compare(args.training_dir, args.detectors.split(","), args.scale)
+    print(f"\n{'Detector':<14}{'Recall':>8}{'False +':>9}{'IoU':>7}{'Mean ms':>9}{'p95 ms':>9}")
+    for r in results:
+        print(f"{r['detector']:<14}{r['recall']:>8.2f}{r['false_positives']:>9}{r['mean_iou']:>7.2f}"
+              f"{r['mean_ms']:>9.2f}{r['p95_ms']:>9.2f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({'scale': args.scale, 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+import numpy as np
+
+
+def squared_distances(queries, matrix, sq_norms):
+    """Squared euclidean distances between every query and every gallery row"""
+    queries = np.asarray(queries, dtype=np.float32)
+    if queries.ndim == 1:
+        queries = queries[np.newaxis, :]
+    q_norms = np.einsum('ij,ij->i', queries, queries)
+    # ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q.g, computed as a single matrix product
+    dists = q_norms[:, np.newaxis] + sq_norms[np.newaxis, :] - 2.0 * (queries @ matrix.T)
+    np.maximum(dists, 0.0, out=dists)
+    return dists
+
+
+def top_k(dists, k):
+    """Return (values, indices) of the k smallest entries of every row, sorted ascending"""
+    k = min(k, dists.shape[1])
+    if k == dists.shape[1]:
+        idx = np.argsort(dists, axis=1)
+    else:
+        idx = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(dists, idx, axis=1), axis=1)
+        idx = np.take_along_axis(idx, order, axis=1)
+    return np.take_along_axis(dists, idx, axis=1), idx
+
+
+def kmeans(data, k, iterations=20, seed=0, block_size=16384):
+    """Plain Lloyd's k-means in NumPy, returns float32 centroids of shape (k, dim)"""
+    data = np.asarray(data, dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    labels = np.zeros(len(data), dtype=np.int64)
+
+    for _ in range(iterations):
+        c_norms = np.einsum('ij,ij->i', centroids, centroids)
+        # Assign in blocks so the (rows x k) distance matrix stays small
+        for start in range(0, len(data), block_size):
+            block = data[start:start + block_size]
+            labels[start:start + block_size] = np.argmin(
+                squared_distances(block, centroids, c_norms), axis=1)
+
+        counts = np.bincount(labels, minlength=k)
+        # Per-dimension bincount is much faster than np.add.at for the centroid sums
+        sums = np.stack([np.bincount(labels, weights=data[:, d], minlength=k)
+                         for d in range(data.shape[1])], axis=1).astype(np.float32)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, np.newaxis]
+        # Re-seed empty clusters with random points so k stays meaningful
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+
+    return centroids
+
+
+class IVFPQIndex:
+    """Approximate nearest-neighbour index: inverted file over k-means cells plus product quantization.
+
+    Queries probe the `nprobe` closest cells, rank their members with PQ lookup
+    tables, then re-rank the best `rerank` candidates exactly against the gallery.
+    """
+
+    def __init__(self, nlist=256, m=16, ksub=256, nprobe=8, rerank=64, seed=0):
+        self.nlist = nlist
+        self.m = m
+        self.ksub = ksub
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.seed = seed
+        self.centroids = None
+        self.codebooks = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.codes = np.empty((0, m), dtype=np.uint8)
+        self._order = None
+        self._offsets = None
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def train(self, vectors, sample_size=32768):
+        """Learn the coarse cells and the PQ codebooks from a sample of the gallery"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dim = vectors.shape[1]
+        if dim % self.m != 0:
+            raise ValueError(f"Encoding size {dim} is not divisible by m={self.m}")
+
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > sample_size:
+            vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+        self.centroids = kmeans(vectors, self.nlist, seed=self.seed)
+        self.nlist = len(self.centroids)
+
+        sub_dim = dim // self.m
+        ksub = min(self.ksub, len(vectors))
+        self.codebooks = np.stack([
+            kmeans(vectors[:, j * sub_dim:(j + 1) * sub_dim], ksub, iterations=15, seed=self.seed + j)
+            for j in range(self.m)
+        ])
+
+    def _assign(self, vectors):
+        c_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        return np.argmin(squared_distances(vectors, self.centroids, c_norms), axis=1).astype(np.int32)
+
+    def _encode(self, vectors):
+        sub_dim = vectors.shape[1] // self.m
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            book = self.codebooks[j]
+            sub = vectors[:, j * sub_dim:(j + 1) * sub_dim]
+            codes[:, j] = np.argmin(squared_distances(sub, book, np.einsum('ij,ij->i', book, book)), axis=1)
+        return codes
+
+    def add(self, vectors):
+        """Append vectors (in gallery row order) to the inverted lists"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[np.newaxis, :]
+        self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+        self.codes = np.concatenate([self.codes, self._encode(vectors)])
+        self._order = None
+
+    def _lists(self):
+        # Inverted lists are kept in CSR form and rebuilt lazily after adds
+        if self._order is None:
+            self._order = np.argsort(self.assignments, kind='stable')
+            self._offsets = np.concatenate([[0], np.cumsum(np.bincount(self.assignments, minlength=self.nlist))])
+        return self._order, self._offsets
+
+    def search(self, queries, k, matrix, sq_norms):
+        """Return (distances, indices) of the approximate k nearest gallery rows per query"""
+        queries = np.asarray(queries, dtype=np.float32)
+        order, offsets = self._lists()
+        c_norms = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        nprobe = min(self.nprobe, self.nlist)
+        _, probes = top_k(squared_distances(queries, self.centroids, c_norms), nprobe)
+
+        sub_dim = queries.shape[1] // self.m
+        out_d = np.full((len(queries), k), np.inf, dtype=np.float32)
+        out_i = np.full((len(queries), k), -1, dtype=np.int64)
+
+        for qi, query in enumerate(queries):
+            candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probes[qi]])
+            if len(candidates) == 0:
+                continue
+
+            # Asymmetric distance: per-subspace lookup table of query-to-codeword distances
+            tables = ((self.codebooks - query.reshape(self.m, 1, sub_dim)) ** 2).sum(axis=2)
+            approx = tables[np.arange(self.m), self.codes[candidates]].sum(axis=1)
+
+            shortlist = candidates[top_k(approx[np.newaxis, :], max(k, self.rerank))[1][0]]
+            exact = squared_distances(query, matrix[shortlist], sq_norms[shortlist])
+            d, i = top_k(exact, k)
+            out_d[qi, :d.shape[1]] = d[0]
+            out_i[qi, :i.shape[1]] = shortlist[i[0]]
+
+        return out_d, out_i
+
+
+class ScalarQuantizer:
+    """Per-dimension compact storage of encodings as float16 or uint8 codes.
+
+    int8 maps every dimension onto 256 levels between its minimum and maximum over the
+    enrolled set (x ~= offset + scale * code); float16 just halves the precision. The
+    largest reconstruction error seen so far is tracked, so distances computed on the
+    codes are known to be within `max_error` of the exact ones.
+    """
+
+    def __init__(self, precision="int8"):
+        if precision not in ("int8", "float16"):
+            raise ValueError(f"Unsupported gallery precision: {precision}")
+        self.precision = precision
+        self.offset = None
+        self.scale = None
+        self.max_error = 0.0
+
+    @property
+    def is_trained(self):
+        return self.offset is not None
+
+    def train(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.precision == "float16":
+            self.offset = np.zeros(vectors.shape[1], dtype=np.float32)
+            self.scale = np.ones(vectors.shape[1], dtype=np.float32)
+            return
+        low, high = vectors.min(axis=0), vectors.max(axis=0)
+        self.offset = low
+        self.scale = np.maximum(high - low, 1e-6).astype(np.float32) / 255.0
+
+    def covers(self, vectors):
+        """Whether the vectors fit the trained range, so encoding them doesn't clip"""
+        if self.precision == "float16":
+            return True
+        return bool(np.all(vectors >= self.offset) and np.all(vectors <= self.offset + 255.0 * self.scale))
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.precision == "float16":
+            codes = vectors.astype(np.float16)
+        else:
+            # Enrollments outside the trained range are clipped; the error bound below covers that
+            codes = np.clip(np.rint((vectors - self.offset) / self.scale), 0, 255).astype(np.uint8)
+        if len(vectors):
+            errors = np.linalg.norm(vectors - self.decode(codes), axis=1)
+            self.max_error = max(self.max_error, float(errors.max()))
+        return codes
+
+    def decode(self, codes):
+        return self.offset + self.scale * codes.astype(np.float32)
+
+    def code_norms(self, codes):
+        """Squared norms of scale * code, the gallery-side term of the distance"""
+        scaled = self.scale * codes.astype(np.float32)
+        return np.einsum('ij,ij->i', scaled, scaled)
+
+    def squared_distances(self, queries, codes, code_norms, block_size=8192):
+        """Squared distances between queries and the decoded codes, without decoding the gallery.
+
+        ||q - (o + s*c)||^2 = ||q - o||^2 - 2 ((q - o) * s) . c + ||s*c||^2, with the codes
+        widened to float32 one cache-sized block at a time.
+        """
+        shifted = np.asarray(queries, dtype=np.float32).reshape(-1, len(self.offset)) - self.offset
+        weighted = shifted * self.scale
+        q_norms = np.einsum('ij,ij->i', shifted, shifted)
+        dists = np.empty((len(shifted), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), block_size):
+            block = codes[start:start + block_size].astype(np.float32)
+            dists[:, start:start + block_size] = code_norms[start:start + block_size] - 2.0 * (weighted @ block.T)
+        dists += q_norms[:, np.newaxis]
+        np.maximum(dists, 0.0, out=dists)
+        return dists
+
+
+class FaceGallery:
+    """Contiguous float32 gallery of face encodings with batched top-k matching"""
+
+    def __init__(self, encodings=None, names=None, ids=None, dim=128):
+        self.dim = dim
+        self._size = 0
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._names = np.empty(0, dtype=object)
+        self._ids = np.empty(0, dtype=np.int64)
+        self.ann_index = None
+        self.ann_min_size = 0
+        self._ann_options = None
+        self._ann_trained_size = 0
+        self.quantizer = None
+        self._codes = None
+        self._code_norms = None
+        self.quantized_queries = 0
+        self.rechecks = 0
+
+        if encodings is not None and len(encodings) > 0:
+            self.add_many(encodings, names, ids)
+
+    def __len__(self):
+        return self._size
+
+    @classmethod
+    def from_matrix(cls, matrix, names, ids=None):
+        """Wrap an existing float32 matrix (e.g. a read-only memmap) without copying it.
+
+        The first add() copies the rows into a private growable buffer.
+        """
+        gallery = cls(dim=matrix.shape[1])
+        gallery._size = len(matrix)
+        gallery._matrix = matrix
+        gallery._sq_norms = np.einsum('ij,ij->i', matrix, matrix).astype(np.float32)
+        gallery._names = np.asarray(list(names), dtype=object)
+        gallery._ids = np.arange(len(matrix)) if ids is None else np.asarray(ids, dtype=np.int64)
+        return gallery
+
+    @property
+    def encodings(self):
+        return self._matrix[:self._size]
+
+    @property
+    def sq_norms(self):
+        return self._sq_norms[:self._size]
+
+    @property
+    def names(self):
+        return self._names[:self._size]
+
+    @property
+    def ids(self):
+        return self._ids[:self._size]
+
+    def _reserve(self, capacity):
+        if capacity <= len(self._matrix):
+            return
+        # Grow geometrically so single enrollments stay amortized O(1)
+        capacity = max(capacity, 2 * len(self._matrix), 64)
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self.encodings
+        sq_norms = np.empty(capacity, dtype=np.float32)
+        sq_norms[:self._size] = self.sq_norms
+        names = np.empty(capacity, dtype=object)
+        names[:self._size] = self.names
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[:self._size] = self.ids
+        self._matrix, self._sq_norms, self._names, self._ids = matrix, sq_norms, names, ids
+
+    def add_many(self, encodings, names, ids=None):
+        """Append a batch of encodings with their names (and optional integer IDs)"""
+        block = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if len(block) != len(names):
+            raise ValueError("encodings and names must have the same length")
+        if ids is None:
+            ids = np.arange(self._size, self._size + len(block))
+
+        start, end = self._size, self._size + len(block)
+        self._reserve(end)
+        self._matrix[start:end] = block
+        self._sq_norms[start:end] = np.einsum('ij,ij->i', block, block)
+        self._names[start:end] = list(names)
+        self._ids[start:end] = ids
+        self._size = end
+
+        if self._ann_options is not None:
+            self._update_ann(block)
+        if self.quantizer is not None:
+            self._add_codes(block)
+
+    def add(self, encoding, name, face_id=None):
+        """Append a single encoding"""
+        self.add_many([encoding], [name], None if face_id is None else [face_id])
+
+    def enable_ann(self, min_size=20000, **index_options):
+        """Switch to approximate IVF/PQ search once the gallery holds at least `min_size` rows.
+
+        The index is trained when the gallery first reaches `min_size`, and retrained from
+        scratch whenever the gallery has doubled since, so the cells keep up with enrollments.
+        """
+        self.ann_min_size = min_size
+        self._ann_options = index_options
+        self.ann_index = None
+        self._ann_trained_size = 0
+        if self._size >= max(1, min_size):
+            self._train_ann()
+
+    def disable_ann(self):
+        self.ann_index = None
+        self._ann_options = None
+        self._ann_trained_size = 0
+
+    def _train_ann(self):
+        self.ann_index = IVFPQIndex(**self._ann_options)
+        self.ann_index.train(self.encodings)
+        self.ann_index.add(self.encodings)
+        self._ann_trained_size = self._size
+
+    def _update_ann(self, block):
+        if self._size < max(1, self.ann_min_size):
+            return
+        if self.ann_index is None or self._size >= 2 * self._ann_trained_size:
+            self._train_ann()
+        else:
+            self.ann_index.add(block)
+
+    def _ann_active(self):
+        return self.ann_index is not None and self.ann_index.is_trained and self._size >= self.ann_min_size
+
+    def enable_quantization(self, precision="int8"):
+        """Match on float16 or int8 codes of the gallery, re-checking exactly only near the threshold.
+
+        The codes are 2x (float16) or 4x (int8) smaller than the float32 rows, so the scan
+        that every query does stays in cache for much larger galleries; the float rows are
+        only read for the few candidates that need a re-check (with from_matrix they can stay
+        in the memory-mapped file).
+        """
+        self.quantizer = ScalarQuantizer(precision)
+        self._codes = None
+        self._code_norms = None
+        if self._size > 0:
+            self._add_codes(self.encodings)
+
+    def disable_quantization(self):
+        self.quantizer = None
+        self._codes = None
+        self._code_norms = None
+
+    def _add_codes(self, block):
+        if self._codes is not None and not self.quantizer.covers(block):
+            # Clipping would loosen the error bound for every query; re-learn the range instead
+            self.quantizer = ScalarQuantizer(self.quantizer.precision)
+            self._codes = None
+            block = self.encodings
+        if not self.quantizer.is_trained:
+            self.quantizer.train(block)
+        codes = self.quantizer.encode(block)
+        norms = self.quantizer.code_norms(codes)
+        if self._codes is None:
+            self._codes, self._code_norms = codes, norms
+        else:
+            self._codes = np.concatenate([self._codes, codes])
+            self._code_norms = np.concatenate([self._code_norms, norms])
+
+    def memory_usage(self):
+        """Bytes held by the float32 rows and by the compact codes (0 when quantization is off)"""
+        usage = {'float32_bytes': self._size * self.dim * 4 + self._size * 4, 'compact_bytes': 0}
+        if self._codes is not None:
+            usage['compact_bytes'] = self._codes.nbytes + self._code_norms.nbytes
+        return usage
+
+    def search(self, queries, k=1):
+        """Return (distances, indices) of the k nearest gallery rows for every query encoding"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        k = min(k, self._size)
+        if k == 0 or len(queries) == 0:
+            return np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+
+        if self._ann_active():
+            sq_d, idx = self.ann_index.search(queries, k, self.encodings, self.sq_norms)
+        else:
+            sq_d, idx = top_k(squared_distances(queries, self.encodings, self.sq_norms), k)
+        return np.sqrt(sq_d), idx
+
+    def _use_quantized(self):
+        return self.quantizer is not None and self._size > 0 and not self._ann_active()
+
+    def _match_quantized(self, queries, threshold):
+        # Every approximate distance is within `err` of the exact one, so a query only needs
+        # the float rows when its best match is within err of the threshold, or when rows of
+        # other identities are within 2 * err of the best (either could be the exact nearest).
+        approx = np.sqrt(self.quantizer.squared_distances(queries, self._codes, self._code_norms))
+        err = self.quantizer.max_error + 1e-4
+        names = []
+        best = []
+        for query, row in zip(queries, approx):
+            i = int(np.argmin(row))
+            distance = float(row[i])
+            if distance - err >= threshold:
+                names.append("Unknown")
+                best.append(distance)
+                continue
+            near = np.flatnonzero(row <= distance + 2.0 * err)
+            if distance + err < threshold and len(set(self._names[near])) == 1:
+                names.append(self._names[i])
+                best.append(distance)
+                continue
+            self.rechecks += 1
+            exact = np.sqrt(squared_distances(query, self.encodings[near], self.sq_norms[near]))[0]
+            j = int(np.argmin(exact))
+            names.append(self._names[near[j]] if exact[j] < threshold else "Unknown")
+            best.append(float(exact[j]))
+        self.quantized_queries += len(queries)
+        return names, best
+
+    def match(self, queries, threshold):
+        """Best match per query as (names, distances); names are "Unknown" above the threshold"""
+        if self._use_quantized():
+            return self._match_quantized(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim), threshold)
+        distances, idx = self.search(queries, k=1)
+        names = []
+        best = []
+        for row_d, row_i in zip(distances, idx):
+            if len(row_i) == 0 or row_i[0] < 0:
+                names.append("Unknown")
+                best.append(1.0)
+                continue
+            best.append(float(row_d[0]))
+            names.append(self._names[row_i[0]] if row_d[0] < threshold else "Unknown")
+        return names, best
@@ -0,0 +1,248 @@
+import time
+import cv2
+import dlib
+import numpy as np
+import face_recognition
+from face_recognition import api as face_api
+from metrics import metrics
+from face_detectors import create_detector
+
+
+class FrameResult:
+    """Per-stage outputs of processing one frame"""
+
+    def __init__(self, frame, scale):
+        self.frame = frame
+        self.scale = scale
+        self.small_frame = None
+        self.rgb_small_frame = None
+        self.face_locations = []   # (top, right, bottom, left) on the small frame
+        self.face_landmarks = []   # raw dlib shapes, one per location
+        self.face_encodings = []
+        self.face_names = []
+        self.face_confidence = []
+        self.track_ids = []        # filled when a tracker is attached
+        self.timings = {}          # stage name -> seconds
+
+    def scaled_locations(self):
+        """Face locations mapped back to the coordinates of the full frame"""
+        factor = 1.0 / self.scale
+        return [tuple(int(round(v * factor)) for v in location) for location in self.face_locations]
+
+    def landmark_points(self):
+        """Landmarks as lists of (x, y) points on the small frame, converted on demand"""
+        return [[(p.x, p.y) for p in shape.parts()] for shape in self.face_landmarks]
+
+
+class FrameProcessor:
+    """Detect -> landmark -> encode -> match engine shared by the OpenCV and PyQt front ends.
+
+    Detection and landmarking run once per frame and all faces are encoded in a single
+    batched dlib call that reuses those landmarks, instead of separate per-face calls.
+    With a FaceTracker attached, only faces on new or stale tracks are encoded at all;
+    the others reuse their track's cached identity, and their encoding/landmark slots
+    in the FrameResult are None.
+
+    With an ROIDetector attached, detection only searches windows around known faces and
+    motion; the frame is then processed at full resolution (FrameResult.scale is 1.0) and
+    `scale` only applies to the ROI detector's periodic full sweeps.
+
+    `detection_model` is a detector name understood by face_detectors.create_detector
+    (hog, cnn, haar, lbp, dnn, cascade) or an already built detector object.
+    """
+
+    def __init__(self, face_system, scale=0.25, detection_model="hog", landmark_model="small", num_jitters=1,
+                 tracker=None, roi=None):
+        self.face_system = face_system
+        self.scale = scale
+        self.detector = create_detector(detection_model) if isinstance(detection_model, str) else detection_model
+        self.detection_model = self.detector.name
+        self.landmark_model = landmark_model
+        self.num_jitters = num_jitters
+        self.tracker = tracker
+        self.roi = roi
+        self._match_state = None
+        self._tracker_scale = None
+
+    def detect(self, rgb_image):
+        """Face locations as (top, right, bottom, left) tuples"""
+        return self.detector.detect(rgb_image)
+
+    def landmarks(self, rgb_image, face_locations):
+        """Raw dlib landmark shapes for all locations, computed in one pass"""
+        if not face_locations:
+            return []
+        return face_api._raw_face_landmarks(rgb_image, face_locations, model=self.landmark_model)
+
+    def encode(self, rgb_image, shapes):
+        """Encode all faces in one batched call, reusing the landmarks already computed"""
+        if not shapes:
+            return []
+        detections = dlib.full_object_detections()
+        for shape in shapes:
+            detections.append(shape)
+        descriptors = face_api.face_encoder.compute_face_descriptor(rgb_image, detections, self.num_jitters)
+        return [np.array(d) for d in descriptors]
+
+    def encode_many(self, rgb_images, shapes_per_image):
+        """Encode the faces of several images in one dlib call, returns one list of encodings per image"""
+        batch_images, batch_faces = [], []
+        for rgb_image, shapes in zip(rgb_images, shapes_per_image):
+            if not shapes:
+                continue
+            detections = dlib.full_object_detections()
+            for shape in shapes:
+                detections.append(shape)
+            batch_images.append(rgb_image)
+            batch_faces.append(detections)
+        if not batch_images:
+            return [[] for _ in rgb_images]
+
+        descriptors = iter(face_api.face_encoder.compute_face_descriptor(batch_images, batch_faces, self.num_jitters))
+        return [[np.array(d) for d in next(descriptors)] if shapes else [] for shapes in shapes_per_image]
+
+    def encode_indexed(self, rgb_image, shapes):
+        """Encode the given landmark shapes, returns (indices, encodings) of the shapes that encoded"""
+        try:
+            return list(range(len(shapes))), self.encode(rgb_image, shapes)
+        except Exception as e:
+            print(f"Error encoding faces in batch: {e}")
+
+        # Fall back to one face at a time so a single bad face doesn't drop the others
+        kept, encodings = [], []
+        for i, shape in enumerate(shapes):
+            try:
+                encodings.extend(self.encode(rgb_image, [shape]))
+                kept.append(i)
+            except Exception as e:
+                metrics.inc('face_encode_errors_total')
+                print(f"Error encoding face {i}: {e}")
+        return kept, encodings
+
+    def encode_faces(self, rgb_image, face_locations, shapes=None):
+        """Landmark and encode the given locations, returns (locations, shapes, encodings) that encoded"""
+        if shapes is None:
+            shapes = self.landmarks(rgb_image, face_locations)
+        kept, encodings = self.encode_indexed(rgb_image, shapes)
+        return [face_locations[i] for i in kept], [shapes[i] for i in kept], encodings
+
+    def prepare(self, frame, result):
+        """Resize and convert the frame to RGB for the detector"""
+        start = time.perf_counter()
+        result.small_frame = cv2.resize(frame, (0, 0), fx=result.scale, fy=result.scale)
+        result.timings['resize'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result.rgb_small_frame = cv2.cvtColor(result.small_frame, cv2.COLOR_BGR2RGB)
+        result.timings['color'] = time.perf_counter() - start
+
+    def process(self, frame, now=None):
+        """Run every stage on a BGR frame and return the FrameResult.
+
+        `now` is the frame's time in seconds for the tracker's refresh intervals; live sources
+        leave it to the wall clock, recorded video passes its own timestamp.
+        """
+        if self.roi is not None:
+            result = FrameResult(frame, 1.0)
+            result.small_frame = frame
+            start = time.perf_counter()
+            result.rgb_small_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            result.timings['color'] = time.perf_counter() - start
+            rgb = result.rgb_small_frame
+
+            start = time.perf_counter()
+            locations = self.roi.locate(rgb, self.detect, self.scale)
+            result.timings['detect'] = time.perf_counter() - start
+        else:
+            result = FrameResult(frame, self.scale)
+            self.prepare(frame, result)
+            rgb = result.rgb_small_frame
+
+            start = time.perf_counter()
+            locations = self.detect(rgb)
+            result.timings['detect'] = time.perf_counter() - start
+
+        if self.tracker is not None:
+            self._process_tracked(result, rgb, locations, now)
+            metrics.observe_result(result)
+            return result
+
+        start = time.perf_counter()
+        shapes = self.landmarks(rgb, locations)
+        result.timings['landmarks'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result.face_locations, result.face_landmarks, result.face_encodings = self.encode_faces(rgb, locations, shapes)
+        result.timings['encode'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result.face_names, result.face_confidence = self.face_system.match_faces(result.face_encodings)
+        result.timings['match'] = time.perf_counter() - start
+
+        metrics.observe_result(result)
+        return result
+
+    def _process_tracked(self, result, rgb, locations, now=None):
+        tracker = self.tracker
+        now = time.perf_counter() if now is None else now
+
+        # Cached identities are only valid for the threshold and gallery they were matched with
+        match_state = (self.face_system.recognition_threshold, len(self.face_system.known_face_names))
+        if match_state != self._match_state:
+            self._match_state = match_state
+            tracker.invalidate()
+
+        # Track boxes live in detection coordinates, which move when the scale is changed
+        if self._tracker_scale is not None and result.scale != self._tracker_scale:
+            tracker.rescale(result.scale / self._tracker_scale)
+        self._tracker_scale = result.scale
+
+        tracks = tracker.update(locations)
+        pending = [i for i, track in enumerate(tracks) if tracker.needs_encoding(track, now)]
+        pending_locations = [locations[i] for i in pending]
+
+        start = time.perf_counter()
+        shapes = self.landmarks(rgb, pending_locations)
+        result.timings['landmarks'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        # Indices into `pending`, so identical boxes still map to their own tracks
+        encoded, encodings = self.encode_indexed(rgb, shapes)
+        result.timings['encode'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        names, confidences = self.face_system.match_faces(encodings)
+        result.timings['match'] = time.perf_counter() - start
+
+        result.face_landmarks = [None] * len(locations)
+        result.face_encodings = [None] * len(locations)
+        with tracker.lock:
+            for j, encoding, name, confidence in zip(encoded, encodings, names, confidences):
+                i = pending[j]
+                tracks[i].vote(name, confidence, now)
+                result.face_landmarks[i] = shapes[j]
+                result.face_encodings[i] = encoding
+            tracker.encodes += len(encodings)
+            tracker.cache_hits += len(tracks) - len(pending)
+
+        result.face_locations = list(locations)
+        result.track_ids = [track.track_id for track in tracks]
+        result.face_names = [track.identity for track in tracks]
+        result.face_confidence = [track.confidence for track in tracks]
+
+
+def draw_results(frame, result):
+    """Draw face boxes and name labels of a FrameResult onto the full-size frame"""
+    for (top, right, bottom, left), name, confidence in zip(result.scaled_locations(),
+                                                           result.face_names, result.face_confidence):
+        # Red for unknown, green for known
+        color = (0, 0, 255) if name == "Unknown" else (0, 255, 0)
+        cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+
+        # Draw name label with confidence
+        conf_text = f"{confidence:.2f}" if name != "Unknown" else ""
+        label = f"{name} {conf_text}"
+        cv2.rectangle(frame, (left, bottom - 35), (right, bottom), color, cv2.FILLED)
+        cv2.putText(frame, label, (left + 6, bottom - 6),
+                    cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
+    return frame
@@ -0,0 +1,170 @@
+import os
+import time
+import argparse
+import numpy as np
+from face_gallery import FaceGallery, kmeans, squared_distances
+
+
+class PrototypeGallery:
+    """Compacted gallery of per-identity prototypes that re-ranks borderline matches on raw encodings.
+
+    Each identity is reduced to its mean (or medoid) encoding, optionally split into
+    `sub_clusters` k-means prototypes. Matching runs against the prototypes only; when
+    the best distance falls within `margin` of the threshold, or a second identity is
+    nearly as close, the candidates are re-checked against their raw encodings.
+    """
+
+    def __init__(self, gallery, method="mean", sub_clusters=1, margin=0.05, candidates=3):
+        if method not in ("mean", "medoid"):
+            raise ValueError(f"Unknown prototype method: {method}")
+        self.gallery = gallery
+        self.method = method
+        self.sub_clusters = sub_clusters
+        self.margin = margin
+        self.candidates = candidates
+        self.members = {}
+        self.prototypes = FaceGallery(dim=gallery.dim)
+        self.reranked = 0
+        self.build()
+
+    def __len__(self):
+        return len(self.prototypes)
+
+    def _prototypes_for(self, encodings):
+        if self.sub_clusters > 1 and len(encodings) > self.sub_clusters:
+            return kmeans(encodings, self.sub_clusters, iterations=10)
+        if self.method == "medoid":
+            sq_norms = np.einsum('ij,ij->i', encodings, encodings)
+            total = np.sqrt(squared_distances(encodings, encodings, sq_norms)).sum(axis=1)
+            return encodings[[np.argmin(total)]]
+        return encodings.mean(axis=0, keepdims=True)
+
+    def build(self):
+        """(Re)build the prototype set from the current contents of the full gallery"""
+        self.members = {}
+        for index, name in enumerate(self.gallery.names):
+            self.members.setdefault(name, []).append(index)
+
+        encodings = []
+        names = []
+        for name, indices in self.members.items():
+            self.members[name] = np.asarray(indices)
+            protos = self._prototypes_for(self.gallery.encodings[self.members[name]])
+            encodings.extend(protos)
+            names.extend([name] * len(protos))
+
+        self.prototypes = FaceGallery(encodings, names, dim=self.gallery.dim)
+        self.gallery_size = len(self.gallery)
+
+    def _rerank(self, query, names):
+        best_name, best_distance = "Unknown", np.inf
+        for name in names:
+            rows = self.members[name]
+            d = np.sqrt(squared_distances(query, self.gallery.encodings[rows], self.gallery.sq_norms[rows]).min())
+            if d < best_distance:
+                best_name, best_distance = name, float(d)
+        return best_name, best_distance
+
+    def match(self, queries, threshold):
+        """Best match per query as (names, distances), same contract as FaceGallery.match"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.gallery.dim)
+        distances, idx = self.prototypes.search(queries, k=self.candidates * max(1, self.sub_clusters))
+
+        names = []
+        best = []
+        for query, row_d, row_i in zip(queries, distances, idx):
+            if len(row_i) == 0:
+                names.append("Unknown")
+                best.append(1.0)
+                continue
+
+            proto_names = self.prototypes.names[row_i]
+            distance = float(row_d[0])
+            name = proto_names[0]
+            # Distinct identities among the closest prototypes, in rank order
+            ranked = list(dict.fromkeys(proto_names))[:self.candidates]
+            runner_up = next((d for d, n in zip(row_d, proto_names) if n != name), np.inf)
+
+            if abs(distance - threshold) < self.margin or runner_up - distance < self.margin:
+                self.reranked += 1
+                name, distance = self._rerank(query, ranked)
+
+            names.append(name if distance < threshold else "Unknown")
+            best.append(distance)
+        return names, best
+
+
+def load_training_encodings(training_dir="training_images"):
+    """Encode the first face of every image under training_dir/<name>/"""
+    import face_recognition
+
+    encodings = []
+    names = []
+    for name in sorted(os.listdir(training_dir)):
+        person_dir = os.path.join(training_dir, name)
+        if not os.path.isdir(person_dir):
+            continue
+        for filename in sorted(os.listdir(person_dir)):
+            image = face_recognition.load_image_file(os.path.join(person_dir, filename))
+            found = face_recognition.face_encodings(image)
+            if found:
+                encodings.append(found[0])
+                names.append(name)
+            else:
+                print(f"No face found in {person_dir}/{filename}, skipping")
+    return np.asarray(encodings, dtype=np.float32), names
+
+
+def evaluate(encodings, names, threshold, repeats=200, **prototype_options):
+    """Leave-one-out accuracy and per-query match time of the full vs. the compacted gallery"""
+    results = {"full": {"correct": 0, "time": 0.0, "size": 0},
+               "compact": {"correct": 0, "time": 0.0, "size": 0, "reranked": 0}}
+    names = np.asarray(names, dtype=object)
+
+    for i in range(len(encodings)):
+        keep = np.arange(len(encodings)) != i
+        full = FaceGallery(encodings[keep], names[keep])
+        compact = PrototypeGallery(full, **prototype_options)
+        query = encodings[i:i + 1]
+
+        for label, matcher in (("full", full), ("compact", compact)):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                predicted, _ = matcher.match(query, threshold)
+            results[label]["time"] += (time.perf_counter() - start) / repeats
+            results[label]["correct"] += predicted[0] == names[i]
+            results[label]["size"] = len(matcher)
+        results["compact"]["reranked"] += compact.reranked / repeats
+
+    for label in results:
+        results[label]["accuracy"] = results[label]["correct"] / max(1, len(encodings))
+        results[label]["time"] /= max(1, len(encodings))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the compacted prototype gallery against the full gallery")
+    parser.add_argument("--training-dir", default="training_images")
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--method", choices=["mean", "medoid"], default="mean")
+    parser.add_argument("--sub-clusters", type=int, default=1)
+    parser.add_argument("--margin", type=float, default=0.05)
+    args = parser.parse_args()
+
+    encodings, names = load_training_encodings(args.training_dir)
+    if len(set(names)) < 2:
+        print("Need at least two people in the training images to evaluate")
+        return
+
+    results = evaluate(encodings, names, args.threshold, method=args.method,
+                       sub_clusters=args.sub_clusters, margin=args.margin)
+    print(f"\nLeave-one-out evaluation on {len(encodings)} images of {len(set(names))} people")
+    print(f"{'Gallery':<10}{'Size':>8}{'Accuracy':>12}{'Match time':>14}")
+    for label in ("full", "compact"):
+        r = results[label]
+        print(f"{label:<10}{r['size']:>8}{r['accuracy']:>12.3f}{r['time'] * 1e6:>11.1f} us")
+    print(f"Borderline re-ranks: {results['compact']['reranked']:.0f} of {len(encodings)} queries")
+
+
+if __name__ == "__main__":
+    main()
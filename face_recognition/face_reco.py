@@ -1,39 +1,170 @@
 import os
 import cv2
-import face_recognition
-import pickle
-import numpy as np
 import time
+import threading
 from datetime import datetime
+from face_gallery import FaceGallery
+from face_tracker import FaceTracker
+from face_scheduler import AdaptiveScheduler
+from metrics import metrics
+from face_store import FaceModelStore
 
 class FaceRecognitionSystem:
     def __init__(self):
-        self.known_face_encodings = []
         self.known_face_names = []
-        self.model_file = "face_recognition_model.pkl"
+        self.model_file = "face_recognition_model.pkl"  # Legacy pickle, migrated on first load
+        self.model_dir = "face_model"
+        self.store = FaceModelStore(self.model_dir)
         self.recognition_threshold = 0.6  # Adjustable threshold (lower = stricter matching)
+        self.gallery = None
+        # Approximate matching for very large galleries
+        self.use_ann = os.environ.get("FACE_ANN", "") not in ("", "0")
+        # Match against per-identity prototypes instead of every encoding
+        self.use_prototypes = os.environ.get("FACE_PROTOTYPES", "") not in ("", "0")
+        # "float16" or "int8": match on a compact copy of the gallery
+        self.gallery_precision = os.environ.get("FACE_GALLERY_PRECISION") or None
+        if self.gallery_precision not in (None, "float16", "int8"):
+            print(f"Error: unsupported FACE_GALLERY_PRECISION {self.gallery_precision}, using float32")
+            self.gallery_precision = None
+        # Detect only around known faces and motion, with periodic full sweeps
+        self.use_roi = os.environ.get("FACE_ROI", "") not in ("", "0")
+        # Face detector backend: hog, cnn, haar, lbp, dnn or cascade (Haar proposals confirmed by HOG)
+        self.detector_name = os.environ.get("FACE_DETECTOR", "hog")
+        self._detector = None
+        self.prototypes = None
+        self.ready = threading.Event()  # Set once the models and the gallery are loaded
+        self.load_time = None
+        self._loader = None
         
     def load_model(self):
         """Load the face recognition model if it exists"""
-        if os.path.exists(self.model_file):
-            with open(self.model_file, 'rb') as f:
-                data = pickle.load(f)
-                self.known_face_encodings = data["encodings"]
-                self.known_face_names = data["names"]
+        if not self.store.exists() and os.path.exists(self.model_file):
+            count = self.store.migrate_pickle(self.model_file)
+            print(f"Migrated {count} faces from {self.model_file} to {self.model_dir}/")
+        if self.store.exists():
+            # Encodings are memory-mapped, so loading doesn't read the whole file
+            encodings, names = self.store.load()
+            # The gallery wraps the memmap itself; rows are only copied on the first enrollment
+            self._configure_gallery(FaceGallery.from_matrix(encodings, names))
+            self.known_face_names = names
             print(f"Model loaded with {len(self.known_face_names)} faces")
+            # A threshold saved by calibrate_threshold.py --apply overrides the default
+            from calibrate_threshold import load_calibration
+            calibrated = load_calibration(self.model_dir)
+            if calibrated is not None:
+                self.recognition_threshold = calibrated
+                print(f"Using calibrated recognition threshold {calibrated:.3f}")
             print(f"Recognized people: {', '.join(set(self.known_face_names))}")
             return True
         return False
+
+    def start_background_load(self):
+        """Load the dlib models and the face model on a background thread"""
+        if self._loader is None:
+            self._loader = threading.Thread(target=self._load_everything, name="model-loader", daemon=True)
+            self._loader.start()
+    
+    def _load_everything(self):
+        start = time.perf_counter()
+        try:
+            # Importing the pipeline imports face_recognition, which loads the dlib models
+            import face_pipeline
+            self.get_detector()
+            self.load_model()
+            if len(self.known_face_names):
+                self.get_matcher()
+        except Exception as e:
+            print(f"Error loading models: {e}")
+        self.load_time = time.perf_counter() - start
+        self.ready.set()
+    
+    def get_detector(self):
+        """The configured face detector, built once and shared by training and recognition"""
+        if self._detector is None:
+            from face_detectors import create_detector
+            try:
+                self._detector = create_detector(self.detector_name)
+            except (FileNotFoundError, ValueError) as e:
+                print(f"Error loading the {self.detector_name} detector, falling back to hog: {e}")
+                self._detector = create_detector("hog")
+        return self._detector
+    
+    def ensure_loaded(self):
+        """Wait for the background load, starting it if nobody has yet; the model is loaded only once"""
+        self.start_background_load()
+        self.ready.wait()
             
     def save_model(self):
-        """Save the face recognition model"""
-        data = {"encodings": self.known_face_encodings, "names": self.known_face_names}
-        with open(self.model_file, 'wb') as f:
-            pickle.dump(data, f)
+        """Save the face recognition model, atomically replacing the stored one"""
+        self.store.write_all(self.known_face_encodings, self.known_face_names)
         print(f"Model saved with {len(self.known_face_names)} faces")
     
+    def add_face(self, encoding, name):
+        """Enroll one face encoding, appended to the model store without rewriting it"""
+        self.get_gallery().add(encoding, name)
+        self.known_face_names.append(name)
+        self.store.append(encoding, name)
+    
+    def clear_model(self):
+        """Remove all trained faces, returns False if there was nothing to clear"""
+        had_model = self.store.exists() or os.path.exists(self.model_file)
+        if self.store.exists():
+            self.store.clear()
+        if os.path.exists(self.model_file):
+            os.remove(self.model_file)
+        self.known_face_names = []
+        self.gallery = None
+        return had_model
+    
+    @property
+    def known_face_encodings(self):
+        """Enrolled encodings, the rows of the gallery"""
+        return self.get_gallery().encodings
+    
+    def _configure_gallery(self, gallery):
+        if self.use_ann:
+            gallery.enable_ann()
+        if self.gallery_precision:
+            gallery.enable_quantization(self.gallery_precision)
+        self.gallery = gallery
+    
+    def get_gallery(self):
+        """Return the gallery; enrollments are appended to it instead of rebuilding it"""
+        if self.gallery is None:
+            self._configure_gallery(FaceGallery())
+        return self.gallery
+    
+    def get_matcher(self):
+        """Return the compacted prototype gallery when enabled, otherwise the full gallery"""
+        gallery = self.get_gallery()
+        if not self.use_prototypes:
+            return gallery
+        if self.prototypes is None or self.prototypes.gallery is not gallery:
+            from face_prototypes import PrototypeGallery
+            self.prototypes = PrototypeGallery(gallery)
+        elif self.prototypes.gallery_size != len(gallery):
+            self.prototypes.build()
+        return self.prototypes
+    
+    def match_faces(self, face_encodings):
+        """Match all face encodings of a frame against the gallery, returns (names, confidences)"""
+        if len(face_encodings) == 0:
+            return [], []
+        if len(self.known_face_encodings) == 0:
+            return ["Unknown"] * len(face_encodings), [0] * len(face_encodings)
+        
+        names, distances = self.get_matcher().match(face_encodings, self.recognition_threshold)
+        # Convert distance to a similarity score (0-1, higher is better match)
+        confidences = [1 - distance for distance in distances]
+        return names, confidences
+    
     def train_face(self, name):
         """Capture and train on a person's face"""
+        import face_recognition
+        
+        # New faces are appended to the loaded model
+        self.ensure_loaded()
+        
         if not os.path.exists("training_images"):
             os.makedirs("training_images")
             
@@ -70,7 +201,7 @@ class FaceRecognitionSystem:
                         
             # Find faces in current frame
             rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(rgb_frame)
+            face_locations = self.get_detector().detect(rgb_frame)
             
             # Draw rectangles around detected faces
             for (top, right, bottom, left) in face_locations:
@@ -101,8 +232,7 @@ class FaceRecognitionSystem:
                     # Convert to RGB explicitly before encoding
                     rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                     face_encoding = face_recognition.face_encodings(rgb_frame, face_locations)[0]
-                    self.known_face_encodings.append(face_encoding)
-                    self.known_face_names.append(name)
+                    self.add_face(face_encoding, name)
                     img_count += 1
                     time.sleep(1)  # Small delay to prepare for next pose
                 except Exception as e:
@@ -113,14 +243,18 @@ class FaceRecognitionSystem:
         cv2.destroyAllWindows()
         
         if img_count > 0:
-            self.save_model()
+            print(f"Model saved with {len(self.known_face_names)} faces")
             return True
         return False
     
     def start_recognition(self):
         """Start real-time face recognition using webcam"""
-        # Load existing model if available
-        self.load_model()
+        from face_pipeline import FrameProcessor, draw_results
+        
+        session_start = time.perf_counter()
+        if not self.ready.is_set():
+            print("Waiting for the models to finish loading...")
+        self.ensure_loaded()
         
         if len(self.known_face_encodings) == 0:
             print("No faces trained yet! Please train at least one face first.")
@@ -135,107 +269,62 @@ class FaceRecognitionSystem:
             print("Error: Could not open webcam")
             return
             
-        process_every_n_frames = 2
-        frame_count = 0
+        # Track faces across frames so only new or stale faces get re-encoded
+        roi = None
+        if self.use_roi:
+            from face_roi import ROIDetector
+            roi = ROIDetector()
+        processor = FrameProcessor(self, detection_model=self.get_detector(), tracker=FaceTracker(), roi=roi)
+        # Skips static frames and tunes frame skip and scale towards a latency target
+        scheduler = AdaptiveScheduler()
+        result = None
+        first_frame = True
+        metrics.set('face_gallery_size', len(self.known_face_encodings))
         
         while True:
+            start = time.perf_counter()
             ret, frame = cap.read()
             if not ret:
                 print("Failed to grab frame")
                 break
+            metrics.observe('capture', time.perf_counter() - start)
+            metrics.inc('face_frames_total')
                 
             # Mirror the image horizontally for more intuitive display
             frame = cv2.flip(frame, 1)
             
-            # Show current threshold on screen
+            if scheduler.should_process(frame):
+                # Detect, landmark, encode and match all faces in a single pass
+                processor.scale = scheduler.scale
+                start = time.perf_counter()
+                was_first = result is None
+                result = processor.process(frame)
+                scheduler.record(result, time.perf_counter() - start)
+                if was_first:
+                    print(f"First recognition after {(time.perf_counter() - session_start) * 1000:.0f} ms")
+            
+            # Keep showing the last result on frames that were skipped
+            if result is not None:
+                start = time.perf_counter()
+                draw_results(frame, result)
+                metrics.observe('draw', time.perf_counter() - start)
+            
+            # Show current threshold and scheduler decisions on screen
+            state = scheduler.state()
+            cv2.putText(frame, f"Scale {state['scale']:.2f} | every {state['every_n_frames']} | "
+                        f"{state['latency_ms']:.0f} ms | motion {state['motion'] * 100:.1f}%",
+                        (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
             cv2.putText(frame, f"Threshold: {self.recognition_threshold:.2f}", 
                       (10, frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 
                       0.6, (255, 255, 255), 1)
+            metrics.draw_overlay(frame)
             
-            # Process only every nth frame to improve performance
-            if frame_count % process_every_n_frames == 0:
-                # Resize frame for faster processing
-                small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-                
-                # Convert from BGR to RGB explicitly
-                rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                
-                # Find faces in current frame
-                face_locations = face_recognition.face_locations(rgb_small_frame)
-                
-                # FIXED: Use face_landmarks instead of direct encoding to avoid the type error
-                face_landmarks_list = []
-                for face_location in face_locations:
-                    landmarks = face_recognition.face_landmarks(rgb_small_frame, [face_location])
-                    if landmarks:  # Make sure landmarks were detected
-                        face_landmarks_list.extend(landmarks)
-                
-                # Now get encodings from the landmarks
-                face_encodings = []
-                for i, face_location in enumerate(face_locations):
-                    try:
-                        # Get face encodings directly from image
-                        encoding = face_recognition.face_encodings(rgb_small_frame, [face_location])
-                        if encoding:
-                            face_encodings.append(encoding[0])
-                    except Exception as e:
-                        print(f"Error encoding face {i}: {e}")
-                
-                face_names = []
-                face_confidence = []
-                
-                for face_encoding in face_encodings:
-                    # Compare face with known faces
-                    name = "Unknown"
-                    confidence = 0
-                    
-                    if len(self.known_face_encodings) > 0:
-                        # Calculate face distances
-                        face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                        
-                        if len(face_distances) > 0:
-                            # Get best match
-                            best_match_index = np.argmin(face_distances)
-                            best_match_distance = face_distances[best_match_index]
-                            
-                            # Convert distance to a similarity score (0-1, higher is better match)
-                            # face_distance returns values where lower means more similar
-                            similarity = 1 - best_match_distance
-                            confidence = similarity
-                            
-                            # Apply threshold for recognition
-                            if similarity > (1 - self.recognition_threshold):
-                                name = self.known_face_names[best_match_index]
-                    
-                    face_names.append(name)
-                    face_confidence.append(confidence)
-                    
-                # Display results
-                for (top, right, bottom, left), name, confidence in zip(face_locations, face_names, face_confidence):
-                    # Scale back face locations since we processed a resized frame
-                    top *= 4
-                    right *= 4
-                    bottom *= 4
-                    left *= 4
-                    
-                    # Draw rectangle around the face
-                    if name == "Unknown":
-                        color = (0, 0, 255)  # Red for unknown
-                    else:
-                        color = (0, 255, 0)  # Green for known
-                        
-                    cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-                    
-                    # Draw name label with confidence
-                    conf_text = f"{confidence:.2f}" if name != "Unknown" else ""
-                    label = f"{name} {conf_text}"
-                    cv2.rectangle(frame, (left, bottom - 35), (right, bottom), color, cv2.FILLED)
-                    cv2.putText(frame, label, (left + 6, bottom - 6), 
-                                cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
-            
+            start = time.perf_counter()
             cv2.imshow('Face Recognition', frame)
-            
-            frame_count += 1
+            metrics.observe('emit', time.perf_counter() - start)
+            if first_frame:
+                first_frame = False
+                print(f"First frame after {(time.perf_counter() - session_start) * 1000:.0f} ms")
             
             key = cv2.waitKey(1) & 0xFF
             if key == ord('q'):
@@ -272,7 +361,11 @@ class FaceRecognitionSystem:
             print("Invalid input, threshold not changed")
         
 def main():
+    # Metrics stay off unless FACE_METRICS_PORT / FACE_METRICS_FILE / FACE_METRICS_OVERLAY is set
+    metrics.configure_from_env()
     face_system = FaceRecognitionSystem()
+    # Load the models while the menu is shown
+    face_system.start_background_load()
     
     while True:
         print("\n===== Face Recognition System =====")
@@ -294,10 +387,7 @@ def main():
         elif choice == '4':
             confirm = input("Are you sure you want to clear all trained faces? (y/n): ")
             if confirm.lower() == 'y':
-                if os.path.exists(face_system.model_file):
-                    os.remove(face_system.model_file)
-                    face_system.known_face_encodings = []
-                    face_system.known_face_names = []
+                if face_system.clear_model():
                     print("All trained faces have been cleared.")
                 else:
                     print("No trained faces to clear.")
@@ -1,23 +1,33 @@
 import os
 import sys
+import time
+# Startup timings (window, first frame, models ready, first recognition) are measured from here
+STARTUP_TIME = time.perf_counter()
+import threading
 import cv2
-import face_recognition
-import pickle
 import numpy as np
-import time
 from datetime import datetime
+from face_gallery import FaceGallery
+from face_tracker import FaceTracker
+from face_scheduler import AdaptiveScheduler
+from face_store import FaceModelStore
+from video_pipeline import StagedPipeline
+from frame_renderer import FrameRenderer
+from recognition_events import EventStore
+from event_models import RecentRecognitionsModel, IdentityStatsModel
+from metrics import metrics
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QPushButton, QLabel, QComboBox, QListWidget, QListWidgetItem,
                             QInputDialog, QMessageBox, QSlider, QGroupBox, QSplitter,
-                            QFrame, QLineEdit, QProgressBar, QTableWidget, QTableWidgetItem,
+                            QFrame, QLineEdit, QProgressBar, QTableView,
                             QHeaderView)
 from PyQt5.QtGui import QImage, QPixmap, QFont, QIcon, QColor
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QThread, QDateTime, QSize
 
 class VideoThread(QThread):
-    change_pixmap_signal = pyqtSignal(np.ndarray)
-    recognized_faces_signal = pyqtSignal(list)
-    stats_signal = pyqtSignal(dict)
+    change_pixmap_signal = pyqtSignal(QImage)
+    pipeline_stats_signal = pyqtSignal(dict)
+    startup_signal = pyqtSignal(dict)
     
     def __init__(self, face_system, parent=None):
         super().__init__(parent)
@@ -26,8 +36,15 @@ class VideoThread(QThread):
         self.mode = "recognition"  # "recognition" or "training"
         self.training_name = ""
         self.capture_next = False
-        self.process_every_n_frames = 2
         self.current_faces = []
+        self.processor = None  # Created once the models are loaded
+        self.startup = {}      # Seconds since startup of each milestone
+        # Skips static frames and tunes frame skip and scale towards a latency target
+        self.scheduler = AdaptiveScheduler()
+        self.inference_workers = 2  # Reduced to 1 by StagedPipeline while a tracker or ROI detector is attached
+        # Scales and color-converts frames for the video label on this thread, at most at the display rate
+        self.renderer = FrameRenderer()
+        self.pipeline = None
         
     def run(self):
         cap = cv2.VideoCapture(0)
@@ -35,17 +52,48 @@ class VideoThread(QThread):
             QMessageBox.critical(None, "Error", "Could not open webcam")
             return
             
-        frame_count = 0
         training_count = 0
-        self.face_system.load_model()
         
-        while self.running:
+        # Show the camera right away while the models and the face model load in the background
+        self.face_system.start_background_load()
+        while self.running and not self.face_system.ready.is_set():
             ret, frame = cap.read()
             if not ret:
                 break
-                
-            # Mirror the image horizontally
             frame = cv2.flip(frame, 1)
+            cv2.putText(frame, "Warming up...", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+            self._emit_frame(frame)
+        if not self.face_system.ready.is_set():
+            cap.release()
+            return
+        
+        from face_pipeline import FrameProcessor, draw_results
+        roi = None
+        if self.face_system.use_roi:
+            from face_roi import ROIDetector
+            roi = ROIDetector()
+        # Track faces across frames so only new or stale faces get re-encoded
+        self.processor = FrameProcessor(self.face_system, detection_model=self.face_system.get_detector(),
+                                        tracker=FaceTracker(), roi=roi)
+        self._mark_startup('models_ready')
+        
+        # Capture and inference run on their own threads; this loop only annotates and emits.
+        # Frames are mirrored horizontally as they are captured.
+        self.pipeline = StagedPipeline(cap, self.processor, workers=self.inference_workers,
+                                       scheduler=self.scheduler,
+                                       transform=lambda f: cv2.flip(f, 1))
+        self.pipeline.start()
+        last_result_id = -1
+        last_stats_time = time.time()
+        
+        while self.running:
+            item = self.pipeline.next_frame()
+            if item is None:
+                if self.pipeline.capture_finished:
+                    break
+                continue
+            _, frame = item
+            self.pipeline.inference_enabled = self.mode == "recognition"
             
             if self.mode == "training":
                 # Add training overlay
@@ -55,8 +103,9 @@ class VideoThread(QThread):
                             cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
                 
                 # Find and highlight faces
+                import face_recognition
                 rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                face_locations = face_recognition.face_locations(rgb_frame)
+                face_locations = self.face_system.get_detector().detect(rgb_frame)
                 
                 for (top, right, bottom, left) in face_locations:
                     cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
@@ -78,10 +127,9 @@ class VideoThread(QThread):
                     # Process for face encoding
                     try:
                         face_encoding = face_recognition.face_encodings(rgb_frame, face_locations)[0]
-                        self.face_system.known_face_encodings.append(face_encoding)
-                        self.face_system.known_face_names.append(self.training_name)
+                        # O(1) append to the model store instead of rewriting the whole model
+                        self.face_system.add_face(face_encoding, self.training_name)
                         training_count += 1
-                        self.face_system.save_model()
                     except Exception as e:
                         print(f"Error processing face: {e}")
                     
@@ -93,115 +141,60 @@ class VideoThread(QThread):
                         QMessageBox.information(None, "Training Complete", 
                                             f"Training complete for {self.training_name}")
                 
-            elif self.mode == "recognition" and frame_count % self.process_every_n_frames == 0:
-                # Process for recognition
-                small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-                rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                
-                # Find faces
-                face_locations = face_recognition.face_locations(rgb_small_frame)
-                face_encodings = []
-                
-                for face_location in face_locations:
-                    try:
-                        encodings = face_recognition.face_encodings(rgb_small_frame, [face_location])
-                        if encodings:
-                            face_encodings.append(encodings[0])
-                    except Exception as e:
-                        print(f"Error encoding face: {e}")
-                
-                face_names = []
-                face_confidence = []
-                detected_faces = []
-                
-                for face_encoding in face_encodings:
-                    name = "Unknown"
-                    confidence = 0
-                    
-                    if len(self.face_system.known_face_encodings) > 0:
-                        face_distances = face_recognition.face_distance(
-                            self.face_system.known_face_encodings, face_encoding)
-                        
-                        if len(face_distances) > 0:
-                            best_match_index = np.argmin(face_distances)
-                            best_match_distance = face_distances[best_match_index]
-                            
-                            similarity = 1 - best_match_distance
-                            confidence = similarity
-                            
-                            if similarity > (1 - self.face_system.recognition_threshold):
-                                name = self.face_system.known_face_names[best_match_index]
-                    
-                    face_names.append(name)
-                    face_confidence.append(confidence)
-                    
-                    # Record detection with timestamp
-                    if name != "Unknown":
-                        detected_faces.append({
-                            'name': name,
-                            'confidence': confidence,
-                            'timestamp': datetime.now().strftime("%H:%M:%S")
-                        })
+            elif self.mode == "recognition":
+                # Overlay the newest available recognition result
+                result_id, result = self.pipeline.latest_result()
+                if result is not None:
+                    start = time.perf_counter()
+                    draw_results(frame, result)
+                    metrics.observe('draw', time.perf_counter() - start)
                 
-                # Update recognitions list via signal
-                self.recognized_faces_signal.emit(detected_faces)
-                    
-                # Calculate stats for people seen
-                stats = {}
-                for name, conf in zip(face_names, face_confidence):
-                    if name != "Unknown":
-                        if name not in stats:
-                            stats[name] = {'count': 1, 'avg_conf': conf}
-                        else:
-                            stats[name]['count'] += 1
-                            # Update running average
-                            stats[name]['avg_conf'] = (stats[name]['avg_conf'] * 
-                                                      (stats[name]['count'] - 1) + conf) / stats[name]['count']
-                
-                if stats:
-                    self.stats_signal.emit(stats)
-                
-                # Draw boxes and labels for faces
-                for (top, right, bottom, left), name, confidence in zip(face_locations, face_names, face_confidence):
-                    # Scale back face locations
-                    top *= 4
-                    right *= 4
-                    bottom *= 4
-                    left *= 4
-                    
-                    # Draw rectangle around the face
-                    if name == "Unknown":
-                        color = (0, 0, 255)  # Red for unknown
-                    else:
-                        color = (0, 255, 0)  # Green for known
-                        
-                    cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+                if result is not None and result_id != last_result_id:
+                    # Record each recognition result once, not once per displayed frame;
+                    # the window picks the batched updates up on its own timer
+                    last_result_id = result_id
+                    if 'first_recognition' not in self.startup:
+                        self._mark_startup('first_recognition')
+                    face_names, face_confidence = result.face_names, result.face_confidence
+                    self.face_system.events.add([{'name': name, 'confidence': confidence}
+                                                 for name, confidence in zip(face_names, face_confidence)])
                     
-                    # Draw name label with confidence
-                    conf_text = f"{confidence:.2f}" if name != "Unknown" else ""
-                    label = f"{name} {conf_text}"
-                    cv2.rectangle(frame, (left, bottom - 35), (right, bottom), color, cv2.FILLED)
-                    cv2.putText(frame, label, (left + 6, bottom - 6), 
-                                cv2.FONT_HERSHEY_DUPLEX, 0.8, (255, 255, 255), 1)
-                
-                # Store current faces for the UI
-                self.current_faces = list(zip(face_names, face_confidence))
+                    # Store current faces for the UI
+                    self.current_faces = list(zip(face_names, face_confidence))
             
             # Add threshold information
             cv2.putText(frame, f"Threshold: {self.face_system.recognition_threshold:.2f}", 
                       (10, frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 
                       0.6, (255, 255, 255), 1)
+            metrics.draw_overlay(frame)
             
-            frame_count += 1
-            
-            # Emit the frame for display
-            self.change_pixmap_signal.emit(frame)
+            self._emit_frame(frame)
             
-            # Control the update rate
-            time.sleep(0.03)
+            # Report queue depths, drop counts and rates about once per second
+            if time.time() - last_stats_time >= 1.0:
+                last_stats_time = time.time()
+                stats = self.pipeline.stats()
+                stats['render'] = self.renderer.stats()
+                metrics.set('face_gallery_size', len(self.face_system.known_face_encodings))
+                self.pipeline_stats_signal.emit(stats)
             
+        self.pipeline.stop()
         cap.release()
         
+    def _emit_frame(self, frame):
+        # Emit a display-ready image, unless the GUI is still busy with the previous one
+        if self.renderer.ready():
+            start = time.perf_counter()
+            self.change_pixmap_signal.emit(self.renderer.render(frame))
+            metrics.observe('emit', time.perf_counter() - start)
+            if 'first_frame' not in self.startup:
+                self._mark_startup('first_frame')
+    
+    def _mark_startup(self, milestone):
+        self.startup[milestone] = time.perf_counter() - STARTUP_TIME
+        print(f"Startup: {milestone.replace('_', ' ')} after {self.startup[milestone]:.2f} s")
+        self.startup_signal.emit(dict(self.startup))
+        
     def capture_training_image(self):
         self.capture_next = True
         
@@ -211,29 +204,151 @@ class VideoThread(QThread):
 
 class FaceRecognitionSystem:
     def __init__(self):
-        self.known_face_encodings = []
         self.known_face_names = []
-        self.model_file = "face_recognition_model.pkl"
+        self.model_file = "face_recognition_model.pkl"  # Legacy pickle, migrated on first load
+        self.model_dir = "face_model"
+        self.store = FaceModelStore(self.model_dir)
         self.recognition_threshold = 1 - 0.7
-        self.detection_history = []  # To store recognition history
+        self.events = EventStore()  # Bounded recognition history, also logged to recognition_events.db
+        self.gallery = None
+        # Approximate matching for very large galleries
+        self.use_ann = os.environ.get("FACE_ANN", "") not in ("", "0")
+        # Match against per-identity prototypes instead of every encoding
+        self.use_prototypes = os.environ.get("FACE_PROTOTYPES", "") not in ("", "0")
+        # "float16" or "int8": match on a compact copy of the gallery
+        self.gallery_precision = os.environ.get("FACE_GALLERY_PRECISION") or None
+        if self.gallery_precision not in (None, "float16", "int8"):
+            print(f"Error: unsupported FACE_GALLERY_PRECISION {self.gallery_precision}, using float32")
+            self.gallery_precision = None
+        # Detect only around known faces and motion, with periodic full sweeps
+        self.use_roi = os.environ.get("FACE_ROI", "") not in ("", "0")
+        # Face detector backend: hog, cnn, haar, lbp, dnn or cascade (Haar proposals confirmed by HOG)
+        self.detector_name = os.environ.get("FACE_DETECTOR", "hog")
+        self._detector = None
+        self.prototypes = None
+        self.ready = threading.Event()  # Set once the models and the gallery are loaded
+        self.load_time = None
+        self._loader = None
         
     def load_model(self):
         """Load the face recognition model if it exists"""
-        if os.path.exists(self.model_file):
-            with open(self.model_file, 'rb') as f:
-                data = pickle.load(f)
-                self.known_face_encodings = data["encodings"]
-                self.known_face_names = data["names"]
+        if not self.store.exists() and os.path.exists(self.model_file):
+            count = self.store.migrate_pickle(self.model_file)
+            print(f"Migrated {count} faces from {self.model_file} to {self.model_dir}/")
+        if self.store.exists():
+            # Encodings are memory-mapped, so loading doesn't read the whole file
+            encodings, names = self.store.load()
+            # The gallery wraps the memmap itself; rows are only copied on the first enrollment
+            self._configure_gallery(FaceGallery.from_matrix(encodings, names))
+            self.known_face_names = names
             print(f"Model loaded with {len(self.known_face_names)} faces")
+            # A threshold saved by calibrate_threshold.py --apply overrides the default
+            from calibrate_threshold import load_calibration
+            calibrated = load_calibration(self.model_dir)
+            if calibrated is not None:
+                self.recognition_threshold = calibrated
+                print(f"Using calibrated recognition threshold {calibrated:.3f}")
             return True
         return False
+
+    def start_background_load(self):
+        """Load the dlib models and the face model on a background thread"""
+        if self._loader is None:
+            self._loader = threading.Thread(target=self._load_everything, name="model-loader", daemon=True)
+            self._loader.start()
+    
+    def _load_everything(self):
+        start = time.perf_counter()
+        try:
+            # Importing the pipeline imports face_recognition, which loads the dlib models
+            import face_pipeline
+            self.get_detector()
+            self.load_model()
+            if len(self.known_face_names):
+                self.get_matcher()
+        except Exception as e:
+            print(f"Error loading models: {e}")
+        self.load_time = time.perf_counter() - start
+        self.ready.set()
+    
+    def get_detector(self):
+        """The configured face detector, built once and shared by training and recognition"""
+        if self._detector is None:
+            from face_detectors import create_detector
+            try:
+                self._detector = create_detector(self.detector_name)
+            except (FileNotFoundError, ValueError) as e:
+                print(f"Error loading the {self.detector_name} detector, falling back to hog: {e}")
+                self._detector = create_detector("hog")
+        return self._detector
+    
+    def ensure_loaded(self):
+        """Wait for the background load, starting it if nobody has yet; the model is loaded only once"""
+        self.start_background_load()
+        self.ready.wait()
             
     def save_model(self):
-        """Save the face recognition model"""
-        data = {"encodings": self.known_face_encodings, "names": self.known_face_names}
-        with open(self.model_file, 'wb') as f:
-            pickle.dump(data, f)
+        """Save the face recognition model, atomically replacing the stored one"""
+        self.store.write_all(self.known_face_encodings, self.known_face_names)
         print(f"Model saved with {len(self.known_face_names)} faces")
+    
+    def add_face(self, encoding, name):
+        """Enroll one face encoding, appended to the model store without rewriting it"""
+        self.get_gallery().add(encoding, name)
+        self.known_face_names.append(name)
+        self.store.append(encoding, name)
+    
+    def clear_model(self):
+        """Remove all trained faces, returns False if there was nothing to clear"""
+        had_model = self.store.exists() or os.path.exists(self.model_file)
+        if self.store.exists():
+            self.store.clear()
+        if os.path.exists(self.model_file):
+            os.remove(self.model_file)
+        self.known_face_names = []
+        self.gallery = None
+        return had_model
+    
+    @property
+    def known_face_encodings(self):
+        """Enrolled encodings, the rows of the gallery"""
+        return self.get_gallery().encodings
+    
+    def _configure_gallery(self, gallery):
+        if self.use_ann:
+            gallery.enable_ann()
+        if self.gallery_precision:
+            gallery.enable_quantization(self.gallery_precision)
+        self.gallery = gallery
+    
+    def get_gallery(self):
+        """Return the gallery; enrollments are appended to it instead of rebuilding it"""
+        if self.gallery is None:
+            self._configure_gallery(FaceGallery())
+        return self.gallery
+    
+    def get_matcher(self):
+        """Return the compacted prototype gallery when enabled, otherwise the full gallery"""
+        gallery = self.get_gallery()
+        if not self.use_prototypes:
+            return gallery
+        if self.prototypes is None or self.prototypes.gallery is not gallery:
+            from face_prototypes import PrototypeGallery
+            self.prototypes = PrototypeGallery(gallery)
+        elif self.prototypes.gallery_size != len(gallery):
+            self.prototypes.build()
+        return self.prototypes
+    
+    def match_faces(self, face_encodings):
+        """Match all face encodings of a frame against the gallery, returns (names, confidences)"""
+        if len(face_encodings) == 0:
+            return [], []
+        if len(self.known_face_encodings) == 0:
+            return ["Unknown"] * len(face_encodings), [0] * len(face_encodings)
+        
+        names, distances = self.get_matcher().match(face_encodings, self.recognition_threshold)
+        confidences = [1 - distance for distance in distances]
+        return names, confidences
         
     def get_unique_people(self):
         """Get list of unique people in the model"""
@@ -244,15 +359,24 @@ class MainWindow(QMainWindow):
         super().__init__()
         
         self.face_system = FaceRecognitionSystem()
-        self.face_system.load_model()
+        # Start loading the models before building the window; nothing waits for them
+        self.face_system.start_background_load()
         
         self.init_ui()
+        # Training needs the models, which load in the background
+        self.models_ready = False
+        self.train_btn.setEnabled(False)
+        self.detection_label.setText("Warming up...")
         
         # Start video thread
         self.video_thread = VideoThread(self.face_system)
+        refresh_rate = QApplication.primaryScreen().refreshRate()
+        self.video_thread.renderer.min_interval = 1.0 / refresh_rate if refresh_rate > 0 else 0.0
+        self.video_thread.renderer.set_target_size(self.video_label.contentsRect().width(),
+                                                     self.video_label.contentsRect().height())
         self.video_thread.change_pixmap_signal.connect(self.update_image)
-        self.video_thread.recognized_faces_signal.connect(self.update_recognitions)
-        self.video_thread.stats_signal.connect(self.update_stats)
+        self.video_thread.pipeline_stats_signal.connect(self.update_pipeline_stats)
+        self.video_thread.startup_signal.connect(self.update_startup)
         self.video_thread.start()
         
         # Start timer for updating time
@@ -260,7 +384,10 @@ class MainWindow(QMainWindow):
         self.time_timer.timeout.connect(self.update_time)
         self.time_timer.start(1000)
         
-        self.update_people_list()
+        # Apply recognition events to the tables in batches, a few times per second
+        self.events_timer = QTimer(self)
+        self.events_timer.timeout.connect(self.apply_event_updates)
+        self.events_timer.start(250)
         
     def init_ui(self):
         self.setWindowTitle('Face Recognition System')
@@ -324,10 +451,12 @@ class MainWindow(QMainWindow):
         # Recent recognitions group
         recognitions_group = QGroupBox("Recent Recognitions")
         recognitions_layout = QVBoxLayout()
-        self.recognitions_table = QTableWidget(0, 3)
-        self.recognitions_table.setHorizontalHeaderLabels(["Person", "Confidence", "Time"])
+        self.recognitions_model = RecentRecognitionsModel(parent=self)
+        self.recognitions_table = QTableView()
+        self.recognitions_table.setModel(self.recognitions_model)
         self.recognitions_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.recognitions_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.recognitions_table.verticalHeader().setVisible(False)
+        self.recognitions_table.setEditTriggers(QTableView.NoEditTriggers)
         self.recognitions_table.setAlternatingRowColors(True)
         recognitions_layout.addWidget(self.recognitions_table)
         recognitions_group.setLayout(recognitions_layout)
@@ -336,10 +465,12 @@ class MainWindow(QMainWindow):
         # Stats group
         stats_group = QGroupBox("Statistics")
         stats_layout = QVBoxLayout()
-        self.stats_table = QTableWidget(0, 2)
-        self.stats_table.setHorizontalHeaderLabels(["Person", "Confidence"])
+        self.stats_model = IdentityStatsModel(parent=self)
+        self.stats_table = QTableView()
+        self.stats_table.setModel(self.stats_model)
         self.stats_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.stats_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.stats_table.verticalHeader().setVisible(False)
+        self.stats_table.setEditTriggers(QTableView.NoEditTriggers)
         self.stats_table.setAlternatingRowColors(True)
         stats_layout.addWidget(self.stats_table)
         stats_group.setLayout(stats_layout)
@@ -426,7 +557,7 @@ class MainWindow(QMainWindow):
                 background-color: #002966;
             }
 
-            QTableWidget {
+            QTableView {
                 gridline-color: #cccccc;
                 selection-background-color: #000000; 
                 selection-color: white; 
@@ -440,65 +571,74 @@ class MainWindow(QMainWindow):
             }
             """)
         
-    def update_image(self, cv_img):
-        """Updates the image_label with a new opencv image"""
-        qt_img = self.convert_cv_qt(cv_img)
-        self.video_label.setPixmap(qt_img)
-        
-    def convert_cv_qt(self, cv_img):
-        """Convert from an opencv image to QPixmap"""
-        rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_image.shape
-        bytes_per_line = ch * w
-        convert_to_Qt_format = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        p = convert_to_Qt_format.scaled(self.video_label.width(), self.video_label.height(), Qt.KeepAspectRatio)
-        return QPixmap.fromImage(p)
+    def update_image(self, image):
+        """Show a frame already scaled and converted by the video thread"""
+        self.video_label.setPixmap(QPixmap.fromImage(image))
+        # The pixmap holds its own copy, so the renderer may reuse the image buffer
+        self.video_thread.renderer.displayed()
     
-    def update_recognitions(self, faces):
-        """Update the recognitions table with newly detected faces"""
-        if not faces:
-            return
-            
-        # Update detection label
-        if faces:
-            face_text = ", ".join([f"{face['name']} ({face['confidence']:.2f})" for face in faces])
-            self.detection_label.setText(f"Detected: {face_text}")
-        else:
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.video_thread.startup.setdefault('window_shown', time.perf_counter() - STARTUP_TIME)
+    
+    def update_startup(self, startup):
+        """React to startup milestones reported by the video thread"""
+        if 'models_ready' in startup and not self.models_ready:
+            self.models_ready = True
+            self.update_people_list()
+            self.train_btn.setEnabled(True)
             self.detection_label.setText("No faces detected")
-            
-        # Add new recognitions to the table (only known faces)
-        known_faces = [face for face in faces if face['name'] != "Unknown"]
-        if not known_faces:
-            return
-            
-        for face in known_faces:
-            # Add to history list (limit size)
-            self.face_system.detection_history.append(face)
-            if len(self.face_system.detection_history) > 100:
-                self.face_system.detection_history.pop(0)
-            
-            # Add row to table
-            row_position = self.recognitions_table.rowCount()
-            self.recognitions_table.insertRow(row_position)
-            
-            # Set values
-            self.recognitions_table.setItem(row_position, 0, QTableWidgetItem(face['name']))
-            self.recognitions_table.setItem(row_position, 1, QTableWidgetItem(f"{face['confidence']:.2f}"))
-            self.recognitions_table.setItem(row_position, 2, QTableWidgetItem(face['timestamp']))
-            
-            # Scroll to the new item
-            self.recognitions_table.scrollToItem(self.recognitions_table.item(row_position, 0))
+            # The loaded model may come with a calibrated threshold
+            threshold = self.face_system.recognition_threshold
+            self.threshold_slider.blockSignals(True)
+            self.threshold_slider.setValue(int(round(threshold * 10)))
+            self.threshold_slider.blockSignals(False)
+            self.threshold_value_label.setText(f"{threshold:.2f}")
+        if 'first_recognition' in startup:
+            summary = ", ".join(f"{name.replace('_', ' ')} {seconds:.2f} s" for name, seconds in startup.items())
+            self.statusBar().showMessage(f"Startup: {summary}", 5000)
+    
+    def resizeEvent(self, event):
+        """Render frames at the new size of the video label"""
+        super().resizeEvent(event)
+        if hasattr(self, 'video_thread'):
+            self.video_thread.renderer.set_target_size(self.video_label.contentsRect().width(),
+                                                     self.video_label.contentsRect().height())
     
-    def update_stats(self, stats):
-        """Update the statistics table"""
-        self.stats_table.setRowCount(0)
+    def apply_event_updates(self):
+        """Apply the recognition events gathered since the last tick as one batched diff"""
+        new_events, changed, current = self.face_system.events.take_updates()
         
-        for name, data in stats.items():
-            row_position = self.stats_table.rowCount()
-            self.stats_table.insertRow(row_position)
-            
-            self.stats_table.setItem(row_position, 0, QTableWidgetItem(name))
-            self.stats_table.setItem(row_position, 1, QTableWidgetItem(f"{data['avg_conf']:.2f}"))
+        # Update detection label
+        if current:
+            known = [(name, confidence) for name, confidence in current if name != "Unknown"]
+            if known:
+                face_text = ", ".join(f"{name} ({confidence:.2f})" for name, confidence in known)
+                self.detection_label.setText(f"Detected: {face_text}")
+        
+        if new_events:
+            at_top = self.recognitions_table.verticalScrollBar().value() == 0
+            self.recognitions_model.add_events(new_events)
+            # Newest rows are on top; keep following them unless the user scrolled away
+            if at_top:
+                self.recognitions_table.scrollToTop()
+        if changed:
+            self.stats_model.update_stats(changed)
+    
+    def update_pipeline_stats(self, stats):
+        """Show capture/inference rates, queue depths, drop counts and scheduler decisions in the status bar"""
+        message = (f"Camera: {stats['capture_fps']:.1f} fps | Recognition: {stats['inference_fps']:.1f} fps | "
+                   f"Queue: {stats['inference_queue_depth']} | Dropped: {stats['dropped_inference']} inference, "
+                   f"{stats['dropped_display']} display")
+        scheduler = stats.get('scheduler')
+        if scheduler:
+            message += (f" | Scale: {scheduler['scale']:.2f} | Every {scheduler['every_n_frames']} frames | "
+                        f"Latency: {scheduler['latency_ms']:.0f}/{scheduler['target_latency_ms']:.0f} ms | "
+                        f"Motion: {scheduler['motion'] * 100:.1f}% ({scheduler['reason']})")
+        render = stats.get('render')
+        if render:
+            message += f" | Render: {render['render_ms']:.1f} ms, {render['coalesced']} coalesced"
+        self.statusBar().showMessage(message)
     
     def update_time(self):
         """Update the time display"""
@@ -552,19 +692,19 @@ class MainWindow(QMainWindow):
                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         
         if reply == QMessageBox.Yes:
-            if os.path.exists(self.face_system.model_file):
-                os.remove(self.face_system.model_file)
-                self.face_system.known_face_encodings = []
-                self.face_system.known_face_names = []
+            if self.face_system.clear_model():
                 self.update_people_list()
                 QMessageBox.information(self, "Cleared", "All face data has been cleared")
     
     def closeEvent(self, event):
         """Clean up when window is closed"""
         self.video_thread.stop()
+        self.face_system.events.close()
         event.accept()
 
 if __name__ == "__main__":
+    # Metrics stay off unless FACE_METRICS_PORT / FACE_METRICS_FILE / FACE_METRICS_OVERLAY is set
+    metrics.configure_from_env()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
@@ -0,0 +1,137 @@
+import threading
+import cv2
+import numpy as np
+from face_scheduler import MotionDetector
+from face_tracker import iou_matrix
+
+
+class ROIDetector:
+    """Region-of-interest face detection on the full-resolution frame.
+
+    Instead of sweeping the whole downscaled frame every time, faces are searched in
+    expanded windows around the previous frame's boxes and around motion, at `roi_scale`
+    (higher than the global scale, so distant faces are still found). A full sweep at the
+    global scale runs every `full_sweep_every` frames, after a face was lost, and when
+    motion covers most of the frame.
+
+    Returned locations are (top, right, bottom, left) in full-frame pixels.
+    """
+
+    def __init__(self, roi_scale=0.5, expand=0.6, full_sweep_every=10, motion_threshold=0.005,
+                 max_motion_area=0.4, min_region=96, dedupe_iou=0.3):
+        self.roi_scale = roi_scale
+        self.expand = expand
+        self.full_sweep_every = full_sweep_every
+        self.motion_threshold = motion_threshold
+        self.max_motion_area = max_motion_area
+        self.min_region = min_region
+        self.dedupe_iou = dedupe_iou
+        self.motion = MotionDetector(rgb=True)
+        self.previous = []
+        self.frames = 0
+        self.sweeps = 0
+        self.roi_pixels = 0.0   # searched area relative to the frame, summed over frames
+        self._last_sweep = None
+        self._sweep_pending = True
+        # Inference workers may share one detector; its window state must stay consistent
+        self.lock = threading.Lock()
+
+    def _region(self, left, top, right, bottom, margin, width, height):
+        # Grow small windows to min_region so the detector has some context around the face
+        grow_x = max(margin, (self.min_region - (right - left)) / 2)
+        grow_y = max(margin, (self.min_region - (bottom - top)) / 2)
+        return (int(max(0, left - grow_x)), int(max(0, top - grow_y)),
+                int(min(width, right + grow_x)), int(min(height, bottom + grow_y)))
+
+    @staticmethod
+    def _merge(regions):
+        """Union overlapping (x0, y0, x1, y1) windows so no pixel is searched twice"""
+        regions = list(regions)
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(regions)):
+                for j in range(i + 1, len(regions)):
+                    a, b = regions[i], regions[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        regions[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                        del regions[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return regions
+
+    @staticmethod
+    def _detect_region(rgb_image, region, scale, detect):
+        x0, y0, x1, y1 = region
+        crop = rgb_image[y0:y1, x0:x1]
+        if scale != 1.0:
+            crop = cv2.resize(crop, (0, 0), fx=scale, fy=scale)
+        return [(int(top / scale) + y0, int(right / scale) + x0, int(bottom / scale) + y0, int(left / scale) + x0)
+                for top, right, bottom, left in detect(np.ascontiguousarray(crop))]
+
+    def _dedupe(self, boxes):
+        kept = []
+        for box in boxes:
+            if not kept or iou_matrix([box], kept).max() < self.dedupe_iou:
+                kept.append(box)
+        return kept
+
+    def locate(self, rgb_image, detect, sweep_scale):
+        """Face locations in full-frame pixels for this frame"""
+        with self.lock:
+            return self._locate(rgb_image, detect, sweep_scale)
+
+    def _locate(self, rgb_image, detect, sweep_scale):
+        height, width = rgb_image.shape[:2]
+        self.frames += 1
+
+        regions = []
+        for top, right, bottom, left in self.previous:
+            margin = self.expand * max(right - left, bottom - top)
+            regions.append(self._region(left, top, right, bottom, margin, width, height))
+
+        sweep = self._sweep_pending or self._last_sweep is None or \
+            self.frames - self._last_sweep >= self.full_sweep_every
+        motion, motion_box = self.motion.update(rgb_image)
+        if motion_box is not None and motion >= self.motion_threshold:
+            x0, y0, x1, y1 = (motion_box[0] * width, motion_box[1] * height,
+                              motion_box[2] * width, motion_box[3] * height)
+            if (x1 - x0) * (y1 - y0) > self.max_motion_area * width * height:
+                sweep = True
+            else:
+                regions.append(self._region(x0, y0, x1, y1, 0, width, height))
+
+        boxes = []
+        searched = 0.0
+        # Windows come first so their higher-resolution boxes win over the sweep's duplicates
+        roi_scale = min(1.0, self.roi_scale)
+        for region in self._merge(regions):
+            boxes.extend(self._detect_region(rgb_image, region, roi_scale, detect))
+            searched += (region[2] - region[0]) * (region[3] - region[1])
+        if sweep:
+            boxes.extend(self._detect_region(rgb_image, (0, 0, width, height), sweep_scale, detect))
+            self.sweeps += 1
+            self._last_sweep = self.frames
+            self._sweep_pending = False
+        boxes = self._dedupe(boxes)
+
+        # A face that vanished from its window may have moved out of it: look everywhere next frame
+        if not sweep and len(boxes) < len(self.previous):
+            self._sweep_pending = True
+        self.previous = boxes
+        self.roi_pixels += min(1.0, searched / (width * height))
+        return boxes
+
+    def reset(self):
+        with self.lock:
+            self.previous = []
+            self._sweep_pending = True
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'full_sweeps': self.sweeps,
+            'mean_roi_area': self.roi_pixels / self.frames if self.frames else 0.0,
+        }
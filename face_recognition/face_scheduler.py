@@ -0,0 +1,169 @@
+import time
+import threading
+import numpy as np
+
+
+class MotionDetector:
+    """Cheap frame-differencing motion detector working on a tiny grayscale thumbnail.
+
+    Frames are BGR as captured, or RGB with `rgb=True`.
+    """
+
+    def __init__(self, size=(80, 60), pixel_threshold=25, adaptation=0.1, rgb=False):
+        self.size = size
+        self.rgb = rgb
+        self.pixel_threshold = pixel_threshold
+        self.adaptation = adaptation
+        self.background = None
+
+    def update(self, frame):
+        """Fraction of thumbnail pixels that changed and their bounding box (x0, y0, x1, y1, relative)"""
+        import cv2
+
+        thumb = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(thumb, cv2.COLOR_RGB2GRAY if self.rgb else cv2.COLOR_BGR2GRAY).astype(np.float32)
+        if self.background is None:
+            self.background = gray
+            return 1.0, (0.0, 0.0, 1.0, 1.0)
+
+        changed = np.abs(gray - self.background) > self.pixel_threshold
+        # Slowly absorb lighting changes into the background
+        self.background += self.adaptation * (gray - self.background)
+
+        fraction = float(changed.mean())
+        if fraction == 0.0:
+            return 0.0, None
+        ys, xs = np.nonzero(changed)
+        w, h = self.size
+        return fraction, (xs.min() / w, ys.min() / h, (xs.max() + 1) / w, (ys.max() + 1) / h)
+
+
+class AdaptiveScheduler:
+    """Decides per frame whether to run inference, and at which detection scale.
+
+    - Static frames (no motion) are skipped, apart from one refresh every `idle_interval`
+      seconds, so an empty corridor costs almost nothing.
+    - The smoothed inference latency is steered towards `target_latency`: when over budget
+      the scale is lowered first (down to `min_scale`), then frames are skipped; when well
+      under budget, skipping is reduced first and the scale raised back.
+    - When the smallest detected face is below `min_face_pixels` at detection resolution,
+      the scale is raised (up to `max_scale`) so far away faces still get detected.
+
+    Every change is recorded in `state()` so the decisions can be observed.
+    """
+
+    def __init__(self, target_latency=0.08, scale=0.25, min_scale=0.15, max_scale=0.6, scale_step=0.05,
+                 max_skip=6, motion_threshold=0.005, idle_interval=1.0, min_face_pixels=60, smoothing=0.8):
+        self.target_latency = target_latency
+        self.base_scale = scale
+        self.scale = scale
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.scale_step = scale_step
+        self.every_n_frames = 1
+        self.max_skip = max_skip
+        self.motion_threshold = motion_threshold
+        self.idle_interval = idle_interval
+        self.min_face_pixels = min_face_pixels
+        self.smoothing = smoothing
+        self.motion = MotionDetector()
+
+        self.latency = None
+        self.last_motion = 0.0
+        self.motion_box = None
+        self.face_height = None
+        self.small_faces = False
+        self.last_reason = "start"
+        self.frames = 0
+        self.processed = 0
+        self.skipped_static = 0
+        self.skipped_budget = 0
+        self._frames_since_inference = 0
+        self._last_inference = 0.0
+        self._lock = threading.Lock()
+
+    def should_process(self, frame):
+        """Whether this frame goes to inference; call once per captured frame"""
+        with self._lock:
+            self.frames += 1
+            self._frames_since_inference += 1
+            self.last_motion, self.motion_box = self.motion.update(frame)
+            now = time.perf_counter()
+
+            if self.last_motion < self.motion_threshold and now - self._last_inference < self.idle_interval:
+                self.skipped_static += 1
+                return False
+            if self._frames_since_inference < self.every_n_frames:
+                self.skipped_budget += 1
+                return False
+
+            self._frames_since_inference = 0
+            self._last_inference = now
+            self.processed += 1
+            return True
+
+    def record(self, result, latency):
+        """Feed back the FrameResult and processing time of an inference frame"""
+        with self._lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency = self.smoothing * self.latency + (1 - self.smoothing) * latency
+
+            heights = [bottom - top for top, right, bottom, left in result.face_locations]
+            # Smallest face in full-frame pixels, independent of the scale the frame was processed at
+            self.face_height = min(heights) / result.scale if heights else None
+            self.small_faces = self.face_height is not None and self.face_height * self.scale < self.min_face_pixels
+            self._adapt()
+
+    def _set(self, scale=None, every_n_frames=None, reason=""):
+        if scale is not None:
+            self.scale = round(min(self.max_scale, max(self.min_scale, scale)), 3)
+        if every_n_frames is not None:
+            self.every_n_frames = min(self.max_skip, max(1, every_n_frames))
+        self.last_reason = reason
+
+    def _fits(self, scale):
+        """Whether the smallest face stays detectable at the given scale"""
+        return self.face_height is None or self.face_height * scale >= self.min_face_pixels
+
+    def _adapt(self):
+        over = self.latency > self.target_latency * 1.1
+        under = self.latency < self.target_latency * 0.6
+        lower = self.scale - self.scale_step
+
+        if self.small_faces and self.scale < self.max_scale and not over:
+            skip = self.every_n_frames - 1 if under else None
+            self._set(scale=self.scale + self.scale_step, every_n_frames=skip, reason="small faces")
+        elif self.face_height is None and self.scale > self.base_scale:
+            self._set(scale=lower, reason="no faces")
+        elif over:
+            # Keep the resolution small faces need and drop frames instead
+            if self.scale > self.min_scale and self._fits(lower):
+                self._set(scale=lower, reason="over budget")
+            elif self.every_n_frames < self.max_skip:
+                self._set(every_n_frames=self.every_n_frames + 1, reason="over budget")
+        elif under:
+            if self.every_n_frames > 1:
+                self._set(every_n_frames=self.every_n_frames - 1, reason="under budget")
+            elif self.scale < self.base_scale:
+                self._set(scale=self.scale + self.scale_step, reason="under budget")
+
+    def state(self):
+        """Current decisions and the inputs behind them"""
+        with self._lock:
+            return {
+                'scale': self.scale,
+                'every_n_frames': self.every_n_frames,
+                'latency_ms': (self.latency or 0.0) * 1000,
+                'target_latency_ms': self.target_latency * 1000,
+                'motion': self.last_motion,
+                'motion_box': self.motion_box,
+                'small_faces': self.small_faces,
+                'face_height': self.face_height,
+                'frames': self.frames,
+                'processed': self.processed,
+                'skipped_static': self.skipped_static,
+                'skipped_budget': self.skipped_budget,
+                'reason': self.last_reason,
+            }
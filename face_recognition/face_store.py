@@ -0,0 +1,246 @@
+import os
+import json
+import pickle
+import struct
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are not serialized across processes
+    fcntl = None
+
+MAGIC = b"FACEENC1"
+HEADER = struct.Struct("<8sII16x")  # magic, encoding size, format version, padding to 32 bytes
+FORMAT_VERSION = 1
+
+
+def _fsync_dir(path):
+    # Make renames durable; not supported on every platform
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class FaceModelStore:
+    """Append-only face model store with a memory-mappable encodings file.
+
+    A store directory holds one generation of files, selected by the CURRENT pointer:
+
+    - encodings-<gen>.f32: 32-byte header followed by raw float32 rows
+    - journal-<gen>.log: one JSON line per enrolled row (name and person ID)
+    - names-<gen>.json: optional snapshot of the names table for the first rows
+
+    Enrolling appends one row and one journal line, both fsynced, so it is O(1).
+    Full rewrites (migration, bulk enrollment, clearing) build a new generation and
+    switch CURRENT with an atomic rename, so a crash never leaves a half-written model.
+    On open, rows without a journal entry and torn journal lines are ignored; loading
+    never writes, so read-only consumers can open the store concurrently. The writer
+    trims them off under the LOCK file before its next append.
+    """
+
+    def __init__(self, path="face_model", dim=128):
+        self.path = path
+        self.dim = dim
+        self.row_size = dim * 4
+        self.generation = None
+        self.people = []        # person ID -> name
+        self.labels = []        # row -> person ID
+        self._person_ids = {}
+        self._journal_bytes = 0  # length of the committed journal prefix
+        self._journal_ends = {}
+
+    def _file(self, kind, generation=None):
+        generation = self.generation if generation is None else generation
+        ext = {"encodings": "f32", "journal": "log", "names": "json"}[kind]
+        return os.path.join(self.path, f"{kind}-{generation}.{ext}")
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, "CURRENT"))
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def names(self):
+        return [self.people[label] for label in self.labels]
+
+    def _person_id(self, name):
+        if name not in self._person_ids:
+            self._person_ids[name] = len(self.people)
+            self.people.append(name)
+        return self._person_ids[name]
+
+    @contextmanager
+    def _writer_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, "LOCK"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def _read_current(self):
+        with open(os.path.join(self.path, "CURRENT")) as f:
+            return int(f.read().strip())
+
+    def current_generation(self):
+        """Generation on disk, changed by every full rewrite (bulk enrollment, clear, migration); None if empty"""
+        return self._read_current() if self.exists() else None
+
+    def load(self):
+        """Open the current generation, returns (read-only memmap of encodings, names)"""
+        self.generation = self._read_current()
+        self.people, self.labels, self._person_ids = [], [], {}
+
+        names_file = self._file("names")
+        if os.path.exists(names_file):
+            with open(names_file) as f:
+                snapshot = json.load(f)
+            self.people = snapshot["people"]
+            self.labels = snapshot["labels"]
+            self._person_ids = {name: i for i, name in enumerate(self.people)}
+
+        self._replay_journal()
+
+        # Rows that were written but never committed to the journal are not mapped
+        rows = self._complete_rows()
+        if rows < len(self.labels):
+            self.labels = self.labels[:rows]
+            self._journal_bytes = self._journal_ends.get(rows - 1, self._journal_bytes)
+        self._journal_ends = {}
+
+        return self.encodings(), self.names
+
+    def _replay_journal(self):
+        journal = self._file("journal")
+        self._journal_bytes = 0
+        self._journal_ends = {}
+        if not os.path.exists(journal):
+            return
+        valid_bytes = 0
+        with open(journal, "rb") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn write at the tail
+                if not line.endswith(b"\n"):
+                    break
+                row = entry["row"]
+                if row > len(self.labels):
+                    break
+                valid_bytes += len(line)
+                if row < len(self.labels):
+                    continue  # already covered by the names snapshot
+                name = entry["name"]
+                self.labels.append(self._person_id(name))
+                self._journal_ends[row] = valid_bytes
+        self._journal_bytes = valid_bytes
+
+    def _complete_rows(self):
+        size = os.path.getsize(self._file("encodings"))
+        with open(self._file("encodings"), "rb") as f:
+            magic, dim, version = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{self._file('encodings')} is not a face encodings file")
+        if dim != self.dim:
+            raise ValueError(f"Store holds {dim}-d encodings, expected {self.dim}")
+        return (size - HEADER.size) // self.row_size
+
+    def encodings(self):
+        """Memory-mapped (rows, dim) float32 view of the committed encodings"""
+        if len(self.labels) == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(self._file("encodings"), dtype=np.float32, mode="r",
+                         offset=HEADER.size, shape=(len(self.labels), self.dim))
+
+    def append(self, encoding, name):
+        """Enroll one encoding: an fsynced row append followed by an fsynced journal line"""
+        if self.generation is None:
+            if self.exists():
+                self.load()
+            else:
+                self.write_all([], [])
+
+        row = np.asarray(encoding, dtype=np.float32).reshape(self.dim)
+        index = len(self.labels)
+        person_id = self._person_id(name)
+        line = json.dumps({"row": index, "name": name, "id": person_id}).encode() + b"\n"
+        with self._writer_lock():
+            # Uncommitted rows and torn journal lines left by a crash are cut off before appending
+            with open(self._file("encodings"), "r+b") as f:
+                f.truncate(HEADER.size + index * self.row_size)
+                f.seek(0, os.SEEK_END)
+                f.write(row.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            with open(self._file("journal"), "ab") as f:
+                f.truncate(self._journal_bytes)
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        self._journal_bytes += len(line)
+        self.labels.append(person_id)
+        return index
+
+    def checkpoint(self):
+        """Snapshot the names table so future loads don't replay the whole journal"""
+        tmp = self._file("names") + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"people": self.people, "labels": self.labels}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file("names"))
+
+    def write_all(self, encodings, names):
+        """Atomically replace the whole model with a new generation"""
+        with self._writer_lock():
+            os.makedirs(self.path, exist_ok=True)
+            old_generation = self._read_current() if self.exists() else None
+            generation = 0 if old_generation is None else old_generation + 1
+
+            block = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+            with open(self._file("encodings", generation), "wb") as f:
+                f.write(HEADER.pack(MAGIC, self.dim, FORMAT_VERSION))
+                f.write(block.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.generation = generation
+            self.people, self.labels, self._person_ids = [], [], {}
+            self.labels = [self._person_id(name) for name in names]
+            open(self._file("journal"), "wb").close()
+            self._journal_bytes = 0
+            self.checkpoint()
+
+            tmp = os.path.join(self.path, "CURRENT.tmp")
+            with open(tmp, "w") as f:
+                f.write(str(generation))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, os.path.join(self.path, "CURRENT"))
+            _fsync_dir(self.path)
+
+            if old_generation is not None:
+                for kind in ("encodings", "journal", "names"):
+                    old_file = self._file(kind, old_generation)
+                    if os.path.exists(old_file):
+                        os.remove(old_file)
+
+    def clear(self):
+        self.write_all([], [])
+
+    def migrate_pickle(self, pickle_path):
+        """One-time import of a legacy face_recognition_model.pkl, returns the number of faces"""
+        with open(pickle_path, "rb") as f:
+            data = pickle.load(f)
+        self.write_all(data["encodings"], data["names"])
+        return len(data["names"])
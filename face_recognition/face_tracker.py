@@ -0,0 +1,146 @@
+import time
+import threading
+from collections import deque
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU between every pair of (top, right, bottom, left) boxes"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def centroid_distance_matrix(boxes_a, boxes_b):
+    """Centroid distance between box pairs, relative to the size of the first box"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ca = np.stack([(a[:, 1] + a[:, 3]) / 2, (a[:, 0] + a[:, 2]) / 2], axis=1)
+    cb = np.stack([(b[:, 1] + b[:, 3]) / 2, (b[:, 0] + b[:, 2]) / 2], axis=1)
+    size = np.maximum(np.maximum(a[:, 1] - a[:, 3], a[:, 2] - a[:, 0]), 1.0)
+    return np.linalg.norm(ca[:, None, :] - cb[None, :, :], axis=2) / size[:, None]
+
+
+class Track:
+    """One face followed across frames, with a cached identity voted over its recent matches"""
+
+    def __init__(self, track_id, location, history):
+        self.track_id = track_id
+        self.location = location
+        self.misses = 0
+        self.last_encoded = None
+        self.votes = deque(maxlen=history)
+        self.identity = "Unknown"
+        self.confidence = 0
+
+    def vote(self, name, confidence, now):
+        """Record a fresh match and re-elect the identity by confidence-weighted majority"""
+        self.votes.append((name, confidence))
+        self.last_encoded = now
+
+        totals = {}
+        for voted_name, voted_conf in self.votes:
+            totals[voted_name] = totals.get(voted_name, 0) + max(voted_conf, 1e-3)
+        self.identity = max(totals, key=totals.get)
+        matching = [c for n, c in self.votes if n == self.identity]
+        self.confidence = sum(matching) / len(matching)
+
+
+class FaceTracker:
+    """Multi-face tracker using IoU (then centroid distance) association on the detector boxes.
+
+    Tracks cache their identity, so a face only needs a full encode when its track is new,
+    when its identity is still unsettled (Unknown or too few votes), or when the
+    refresh interval has elapsed.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_misses=5, history=10,
+                 refresh_interval=2.0, unsettled_refresh_interval=0.3, min_votes=3):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_misses = max_misses
+        self.history = history
+        self.refresh_interval = refresh_interval
+        self.unsettled_refresh_interval = unsettled_refresh_interval
+        self.min_votes = min_votes
+        self.tracks = []
+        self.encodes = 0
+        self.cache_hits = 0
+        self.lock = threading.Lock()
+        self._next_id = 0
+
+    def _associate(self, locations):
+        pairs = {}
+        if not self.tracks or not locations:
+            return pairs
+        track_boxes = [t.location for t in self.tracks]
+
+        # Greedy assignment: best IoU first, then nearest centroid for whatever is left
+        for scores, limit in ((iou_matrix(track_boxes, locations), self.iou_threshold),
+                              (-centroid_distance_matrix(track_boxes, locations), -self.max_centroid_distance)):
+            for flat in np.argsort(-scores, axis=None):
+                ti, di = np.unravel_index(flat, scores.shape)
+                if scores[ti, di] < limit:
+                    break
+                if ti in pairs.values() or di in pairs:
+                    continue
+                pairs[di] = ti
+        return pairs
+
+    def update(self, locations):
+        """Associate this frame's detections with tracks, returns one Track per location"""
+        with self.lock:
+            pairs = self._associate(locations)
+            assigned = []
+            for di, location in enumerate(locations):
+                if di in pairs:
+                    track = self.tracks[pairs[di]]
+                    track.location = location
+                    track.misses = 0
+                else:
+                    track = Track(self._next_id, location, self.history)
+                    self._next_id += 1
+                    self.tracks.append(track)
+                assigned.append(track)
+
+            matched = {id(t) for t in assigned}
+            for track in self.tracks:
+                if id(track) not in matched:
+                    track.misses += 1
+            self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+            return assigned
+
+    def needs_encoding(self, track, now=None):
+        """Whether the face on this track has to be re-encoded and re-matched"""
+        now = time.perf_counter() if now is None else now
+        if track.last_encoded is None:
+            return True
+        age = now - track.last_encoded
+        if track.identity == "Unknown" or len(track.votes) < self.min_votes:
+            return age >= self.unsettled_refresh_interval
+        return age >= self.refresh_interval
+
+    def invalidate(self):
+        """Force every track to re-encode, e.g. after the gallery or threshold changed"""
+        with self.lock:
+            for track in self.tracks:
+                track.votes.clear()
+                track.last_encoded = None
+
+    def rescale(self, factor):
+        """Map track boxes to a new detection scale so association survives a scale change"""
+        with self.lock:
+            for track in self.tracks:
+                track.location = tuple(int(round(v * factor)) for v in track.location)
+
+    def reset(self):
+        with self.lock:
+            self.tracks = []
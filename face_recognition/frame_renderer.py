@@ -0,0 +1,87 @@
+import time
+import threading
+import cv2
+import numpy as np
+from PyQt5.QtGui import QImage
+
+
+class FrameRenderer:
+    """Turns BGR frames into display-sized RGB QImages off the GUI thread.
+
+    Scaling and color conversion write into preallocated buffers, so no per-frame
+    allocations are made. Frames are coalesced: nothing is rendered while the GUI
+    hasn't shown the previous image yet, or faster than the display refresh rate.
+    The QImages wrap the buffers without copying, so a small ring of buffers is
+    rotated and the GUI must convert (QPixmap.fromImage) before calling displayed().
+    """
+
+    def __init__(self, width=640, height=480, refresh_rate=60.0, buffers=3):
+        self.min_interval = 1.0 / refresh_rate if refresh_rate > 0 else 0.0
+        self.rendered = 0
+        self.coalesced = 0
+        self.render_time = 0.0
+        self._size = (width, height)
+        self._buffers = [None] * buffers
+        self._next = 0
+        self._pending = threading.Event()
+        self._last_render = 0.0
+        self._lock = threading.Lock()
+
+    def set_target_size(self, width, height):
+        """Called from the GUI thread when the video label is resized"""
+        with self._lock:
+            self._size = (max(1, width), max(1, height))
+
+    def ready(self):
+        """Whether a new frame should be rendered now; counts the frames that are coalesced away"""
+        if self._pending.is_set() or time.perf_counter() - self._last_render < self.min_interval:
+            self.coalesced += 1
+            return False
+        return True
+
+    def displayed(self):
+        """Called from the GUI thread once the last image has been painted"""
+        self._pending.clear()
+
+    def _fit(self, frame_width, frame_height):
+        with self._lock:
+            target_width, target_height = self._size
+        factor = min(target_width / frame_width, target_height / frame_height)
+        return max(1, int(frame_width * factor)), max(1, int(frame_height * factor))
+
+    def _buffer(self, width, height):
+        index = self._next
+        self._next = (self._next + 1) % len(self._buffers)
+        buffers = self._buffers[index]
+        if buffers is None or buffers[0].shape[:2] != (height, width):
+            buffers = (np.empty((height, width, 3), dtype=np.uint8), np.empty((height, width, 3), dtype=np.uint8))
+            self._buffers[index] = buffers
+        return buffers
+
+    def render(self, frame):
+        """Scale and convert a BGR frame into a QImage for the label, keeping the aspect ratio"""
+        start = time.perf_counter()
+        frame_height, frame_width = frame.shape[:2]
+        width, height = self._fit(frame_width, frame_height)
+        scaled, rgb = self._buffer(width, height)
+
+        if (width, height) == (frame_width, frame_height):
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        else:
+            interpolation = cv2.INTER_AREA if width < frame_width else cv2.INTER_LINEAR
+            cv2.resize(frame, (width, height), dst=scaled, interpolation=interpolation)
+            cv2.cvtColor(scaled, cv2.COLOR_BGR2RGB, dst=rgb)
+
+        image = QImage(rgb.data, width, height, width * 3, QImage.Format_RGB888)
+        self._pending.set()
+        self._last_render = time.perf_counter()
+        self.render_time = self._last_render - start
+        self.rendered += 1
+        return image
+
+    def stats(self):
+        return {
+            'rendered': self.rendered,
+            'coalesced': self.coalesced,
+            'render_ms': self.render_time * 1000,
+        }
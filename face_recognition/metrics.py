@@ -0,0 +1,212 @@
+import os
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stage latency buckets in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HELP = {
+    'face_stage_seconds': "Time spent per recognition pipeline stage",
+    'face_frames_total': "Frames captured",
+    'face_frames_processed_total': "Frames that went through recognition",
+    'face_frames_dropped_total': "Frames dropped by a newest-wins queue",
+    'face_faces_seen_total': "Faces detected in processed frames",
+    'face_unknown_faces_total': "Detected faces that matched nobody",
+    'face_encode_errors_total': "Faces that failed to encode",
+    'face_gallery_size': "Encodings in the gallery",
+    'face_queue_depth': "Items waiting in a pipeline queue",
+}
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = None  # smoothed value for the overlay
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+        self.recent = value if self.recent is None else 0.9 * self.recent + 0.1 * value
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+class Metrics:
+    """Counters, gauges and stage histograms for the recognition loop, exported in Prometheus text format.
+
+    Disabled by default: every recording method returns after a single attribute check,
+    so instrumented code costs next to nothing until enable() is called.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.overlay = False
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._server = None
+        self._file_thread = None
+
+    def enable(self, overlay=False):
+        self.enabled = True
+        self.overlay = overlay
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_result(self, result):
+        """Record the stage timings and face counts of a FrameResult"""
+        if not self.enabled:
+            return
+        for stage, seconds in result.timings.items():
+            self.observe(stage, seconds)
+        unknown = sum(1 for name in result.face_names if name == "Unknown")
+        self.inc('face_frames_processed_total')
+        self.inc('face_faces_seen_total', len(result.face_locations))
+        self.inc('face_unknown_faces_total', unknown)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {stage: (list(h.counts), h.total, h.count) for stage, h in self._histograms.items()}
+
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in values}):
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        if histograms:
+            name = 'face_stage_seconds'
+            lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for stage, (counts, total, count) in sorted(histograms.items()):
+                stage_label = (("stage", stage),)
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS + ("+Inf",), counts):
+                    cumulative += bucket
+                    lines.append(f"{name}_bucket{_format_labels(stage_label, (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(stage_label)} {total}")
+                lines.append(f"{name}_count{_format_labels(stage_label)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def overlay_lines(self):
+        """Short per-stage summary for drawing on the video"""
+        with self._lock:
+            stages = [(stage, h.recent) for stage, h in self._histograms.items() if h.recent is not None]
+            counters = {name: value for (name, labels), value in self._counters.items() if not labels}
+        lines = [f"{stage}: {recent * 1000:.1f} ms" for stage, recent in stages]
+        lines.append(f"faces: {counters.get('face_faces_seen_total', 0)} "
+                     f"unknown: {counters.get('face_unknown_faces_total', 0)} "
+                     f"errors: {counters.get('face_encode_errors_total', 0)}")
+        return lines
+
+    def draw_overlay(self, frame):
+        if not (self.enabled and self.overlay):
+            return
+        import cv2
+
+        for i, line in enumerate(self.overlay_lines()):
+            cv2.putText(frame, line, (frame.shape[1] - 230, 20 + i * 18),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 255), 1)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve /metrics over HTTP from a daemon thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def write_file(self, path):
+        """Atomically write the metrics to a file (e.g. for node_exporter's textfile collector)"""
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def export_to_file(self, path, interval=5.0):
+        def loop():
+            while self.enabled:
+                try:
+                    self.write_file(path)
+                except OSError as e:
+                    print(f"Error writing metrics to {path}: {e}")
+                time.sleep(interval)
+
+        self._file_thread = threading.Thread(target=loop, name="metrics-file", daemon=True)
+        self._file_thread.start()
+
+    def configure_from_env(self):
+        """Enable from FACE_METRICS_PORT, FACE_METRICS_FILE and FACE_METRICS_OVERLAY"""
+        port = os.environ.get("FACE_METRICS_PORT")
+        path = os.environ.get("FACE_METRICS_FILE")
+        overlay = os.environ.get("FACE_METRICS_OVERLAY", "") not in ("", "0")
+        if not (port or path or overlay):
+            return
+        self.enable(overlay)
+        if port:
+            try:
+                self.serve(int(port))
+                print(f"Metrics available at http://127.0.0.1:{port}/metrics")
+            except (OSError, ValueError) as e:
+                print(f"Error starting metrics endpoint: {e}")
+        if path:
+            self.export_to_file(path)
+
+
+# Process-wide registry used by all instrumented modules
+metrics = Metrics()
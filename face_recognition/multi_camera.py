@@ -0,0 +1,204 @@
+import os
+import time
+import queue
+import argparse
+import multiprocessing as mp
+import numpy as np
+
+
+class SharedGallerySystem:
+    """Read-only stand-in for FaceRecognitionSystem backed by the memory-mapped model store.
+
+    Every worker maps the same encodings file, so the gallery pages are shared through
+    the OS page cache instead of being copied into each process.
+    """
+
+    def __init__(self, model_dir, recognition_threshold, precision=None):
+        from face_store import FaceModelStore
+        from face_gallery import FaceGallery
+
+        self.recognition_threshold = recognition_threshold
+        store = FaceModelStore(model_dir)
+        encodings, self.known_face_names = store.load()
+        self.gallery = FaceGallery.from_matrix(encodings, self.known_face_names)
+        if precision:
+            # Only the compact codes are scanned; float rows are paged in for re-checks
+            self.gallery.enable_quantization(precision)
+
+    def match_faces(self, face_encodings):
+        if len(face_encodings) == 0:
+            return [], []
+        if len(self.gallery) == 0:
+            return ["Unknown"] * len(face_encodings), [0] * len(face_encodings)
+        names, distances = self.gallery.match(face_encodings, self.recognition_threshold)
+        return names, [1 - distance for distance in distances]
+
+
+def parse_source(source):
+    """Device indices are given as integers, anything else is a video file or stream URL"""
+    return int(source) if source.isdigit() else source
+
+
+def run_stream(label, source, model_dir, threshold, every_n_frames, report_interval, stats_queue, stop_event,
+               use_roi=False, detector="hog", precision=None):
+    """Worker process: decode one stream and run recognition on it until it ends or is stopped"""
+    import cv2
+    from face_pipeline import FrameProcessor
+    from face_tracker import FaceTracker
+    from face_roi import ROIDetector
+
+    # One process per stream already uses a core each; extra OpenCV threads only oversubscribe
+    cv2.setNumThreads(1)
+
+    system = SharedGallerySystem(model_dir, threshold, precision)
+    processor = FrameProcessor(system, detection_model=detector, tracker=FaceTracker(),
+                               roi=ROIDetector() if use_roi else None)
+    cap = cv2.VideoCapture(parse_source(source))
+    if not cap.isOpened():
+        stats_queue.put({'source': label, 'error': "Could not open source"})
+        return
+
+    frames = 0
+    processed = 0
+    faces = 0
+    known = {}
+    latencies = []
+    started = time.perf_counter()
+    window_start = started
+    window_frames = 0
+
+    while not stop_event.is_set():
+        read_start = time.perf_counter()
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames += 1
+        window_frames += 1
+
+        if frames % every_n_frames == 0:
+            result = processor.process(frame)
+            # Latency from the start of the read (decode) until the match is available
+            latencies.append(time.perf_counter() - read_start)
+            processed += 1
+            faces += len(result.face_names)
+            for name in result.face_names:
+                if name != "Unknown":
+                    known[name] = known.get(name, 0) + 1
+
+        now = time.perf_counter()
+        if now - window_start >= report_interval:
+            stats_queue.put(_stream_stats(label, frames, processed, faces, known, latencies,
+                                          window_frames / (now - window_start), now - started))
+            window_start = now
+            window_frames = 0
+            latencies = latencies[-1000:]
+
+    elapsed = time.perf_counter() - started
+    stats_queue.put(_stream_stats(label, frames, processed, faces, known, latencies,
+                                  frames / elapsed if elapsed > 0 else 0.0, elapsed, final=True))
+    cap.release()
+
+
+def _stream_stats(source, frames, processed, faces, known, latencies, fps, elapsed, final=False):
+    lat = np.asarray(latencies) * 1000.0
+    return {
+        'source': source,
+        'frames': frames,
+        'processed': processed,
+        'fps': fps,
+        'elapsed': elapsed,
+        'faces': faces,
+        'known': dict(known),
+        'latency_p50_ms': float(np.percentile(lat, 50)) if len(lat) else 0.0,
+        'latency_p95_ms': float(np.percentile(lat, 95)) if len(lat) else 0.0,
+        'final': final,
+    }
+
+
+def print_stats(latest):
+    print(f"\n{'Source':<24}{'Frames':>8}{'FPS':>8}{'p50 ms':>9}{'p95 ms':>9}{'Faces':>7}  Known")
+    total_fps = 0.0
+    for source, s in sorted(latest.items()):
+        if 'error' in s:
+            print(f"{str(source):<24}  {s['error']}")
+            continue
+        total_fps += s['fps']
+        known = ", ".join(f"{name}:{count}" for name, count in sorted(s['known'].items()))
+        print(f"{str(source):<24}{s['frames']:>8}{s['fps']:>8.1f}{s['latency_p50_ms']:>9.1f}"
+              f"{s['latency_p95_ms']:>9.1f}{s['faces']:>7}  {known}")
+    print(f"{'Total':<24}{'':>8}{total_fps:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-camera face recognition, one worker process per stream")
+    parser.add_argument("sources", nargs="+", help="camera indices (0, 1, ...) or video files")
+    parser.add_argument("--model-dir", default="face_model")
+    parser.add_argument("--threshold", type=float, default=0.6)
+    parser.add_argument("--every-n-frames", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="size of the process pool (default: one per stream, capped at the CPU count)")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    parser.add_argument("--roi", action="store_true", help="detect around known faces and motion only")
+    parser.add_argument("--detector", default="hog", help="hog, cnn, haar, lbp, dnn or cascade")
+    parser.add_argument("--precision", choices=["float16", "int8"], default=None,
+                        help="match on a compact copy of the gallery")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args()
+
+    from face_store import FaceModelStore
+    if not FaceModelStore(args.model_dir).exists():
+        print(f"No face model found in {args.model_dir}/, train or enroll faces first")
+        return
+
+    workers = args.workers or min(len(args.sources), os.cpu_count() or 1)
+    if workers < len(args.sources):
+        print(f"Warning: {len(args.sources)} streams on {workers} workers, "
+              f"streams beyond the first {workers} wait for a free worker")
+
+    manager = mp.Manager()
+    stats_queue = manager.Queue()
+    stop_event = manager.Event()
+    latest = {}
+    started = time.time()
+
+    with mp.Pool(workers) as pool:
+        jobs = [pool.apply_async(run_stream, (f"{i}:{source}", source, args.model_dir, args.threshold,
+                                              max(1, args.every_n_frames), args.report_interval,
+                                              stats_queue, stop_event, args.roi, args.detector,
+                                              args.precision))
+                for i, source in enumerate(args.sources)]
+        last_print = time.time()
+        try:
+            while not all(job.ready() for job in jobs) or not stats_queue.empty():
+                if args.duration and time.time() - started > args.duration:
+                    stop_event.set()
+                try:
+                    stats = stats_queue.get(timeout=args.report_interval)
+                except queue.Empty:
+                    continue
+                latest[stats['source']] = stats
+                if time.time() - last_print >= args.report_interval:
+                    last_print = time.time()
+                    print_stats(latest)
+        except KeyboardInterrupt:
+            print("\nStopping streams...")
+            stop_event.set()
+            for job in jobs:
+                job.wait(10)
+            while not stats_queue.empty():
+                stats = stats_queue.get()
+                latest[stats['source']] = stats
+
+        for job in jobs:
+            if job.ready() and not job.successful():
+                try:
+                    job.get()
+                except Exception as e:
+                    print(f"Stream worker failed: {e}")
+
+    print("\nFinal statistics:")
+    print_stats(latest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+
+class EventRing:
+    """Fixed-capacity ring of events, O(1) append and indexed access (0 = oldest)"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._items[(self._start + index) % self.capacity]
+
+    def append(self, item):
+        end = (self._start + self._count) % self.capacity
+        self._items[end] = item
+        if self._count < self.capacity:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def latest(self, n):
+        """The newest n items, oldest first"""
+        n = min(n, self._count)
+        return [self[i] for i in range(self._count - n, self._count)]
+
+
+class IdentityCounter:
+    """Running aggregates for one identity since the store was opened"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.confidence_sum = 0.0
+        self.best_confidence = 0.0
+        self.first_seen = None
+        self.last_seen = None
+
+    @property
+    def avg_confidence(self):
+        return self.confidence_sum / self.count if self.count else 0.0
+
+    def add(self, timestamp, confidence):
+        self.count += 1
+        self.confidence_sum += confidence
+        self.best_confidence = max(self.best_confidence, confidence)
+        if self.first_seen is None:
+            self.first_seen = timestamp
+        self.last_seen = timestamp
+
+
+class EventLog:
+    """Append-only SQLite (WAL) log of recognition events, written in batches by a background thread"""
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY, ts REAL NOT NULL, name TEXT NOT NULL, "
+        "confidence REAL NOT NULL, source TEXT)",
+        "CREATE INDEX IF NOT EXISTS events_ts ON events (ts)",
+        "CREATE INDEX IF NOT EXISTS events_name_ts ON events (name, ts)",
+    ]
+
+    def __init__(self, path="recognition_events.db", flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._queue = queue.Queue()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._writer, name="event-log", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    @staticmethod
+    def connect(path):
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL with synchronous=NORMAL only risks the last batch on power loss, never corruption
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _writer(self):
+        conn = self.connect(self.path)
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        self._ready.set()
+
+        running = True
+        while running:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                deadline = time.perf_counter() + self.flush_interval
+                while item is not None:
+                    batch.append(item)
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    item = self._queue.get(timeout=remaining)
+                running = item is not None
+            except queue.Empty:
+                pass
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany("INSERT INTO events (ts, name, confidence, source) VALUES (?, ?, ?, ?)",
+                                         batch)
+                    self.written += len(batch)
+                except sqlite3.Error as e:
+                    print(f"Error writing recognition events: {e}")
+        conn.close()
+
+    def write(self, timestamp, name, confidence, source=None):
+        self._queue.put((timestamp, name, confidence, source))
+
+    def close(self):
+        """Flush pending events and stop the writer"""
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+
+    def query(self, name=None, since=None, until=None, limit=1000):
+        """Events as (ts, name, confidence, source) tuples, newest first, using the ts/name indexes"""
+        where, params = _where(name, since, until)
+        conn = self.connect(self.path)
+        try:
+            return conn.execute(f"SELECT ts, name, confidence, source FROM events {where} "
+                                f"ORDER BY ts DESC LIMIT ?", params + [limit]).fetchall()
+        finally:
+            conn.close()
+
+
+def _where(name=None, since=None, until=None):
+    clauses, params = [], []
+    if name is not None:
+        clauses.append("name = ?")
+        params.append(name)
+    if since is not None:
+        clauses.append("ts >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("ts < ?")
+        params.append(until)
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+
+class EventStore:
+    """Bounded in-memory store of recognition events with per-identity counters.
+
+    Producers (the video thread) call add() for every recognized face. The UI polls
+    take_updates() on a timer and receives only what changed since the last poll, so
+    it can apply one batched diff to fixed-size models instead of one update per frame.
+    Every event is also appended to the SQLite log when one is configured.
+    """
+
+    def __init__(self, capacity=1000, log_path="recognition_events.db"):
+        self.events = EventRing(capacity)
+        self.identities = {}
+        self.current = []
+        self.log = EventLog(log_path) if log_path else None
+        self._lock = threading.Lock()
+        self._new_events = []
+        self._changed = set()
+        self._current_changed = False
+
+    def add(self, faces, source=None):
+        """Record one frame's faces: list of {'name', 'confidence'}; only known faces become events"""
+        now = time.time()
+        with self._lock:
+            self.current = [(face['name'], face['confidence']) for face in faces]
+            self._current_changed = True
+            for face in faces:
+                name, confidence = face['name'], float(face['confidence'])
+                if name == "Unknown":
+                    continue
+                event = (now, name, confidence)
+                self.events.append(event)
+                self._new_events.append(event)
+                if name not in self.identities:
+                    self.identities[name] = IdentityCounter(name)
+                self.identities[name].add(now, confidence)
+                self._changed.add(name)
+                if self.log is not None:
+                    self.log.write(now, name, confidence, source)
+            # A slow consumer only ever needs the newest `capacity` events
+            if len(self._new_events) > self.events.capacity:
+                del self._new_events[:-self.events.capacity]
+
+    def take_updates(self):
+        """(new events oldest first, {name: (count, avg confidence, last seen)} that changed, current faces or None)"""
+        with self._lock:
+            new_events, self._new_events = self._new_events, []
+            changed = {name: (self.identities[name].count, self.identities[name].avg_confidence,
+                              self.identities[name].last_seen) for name in self._changed}
+            self._changed = set()
+            current = self.current if self._current_changed else None
+            self._current_changed = False
+            return new_events, changed, current
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+
+
+def parse_time(text):
+    return datetime.fromisoformat(text).timestamp() if text else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the recognition event log")
+    parser.add_argument("--db", default="recognition_events.db")
+    parser.add_argument("--name", default=None)
+    parser.add_argument("--since", default=None, help="ISO time, e.g. 2024-05-01T08:00")
+    parser.add_argument("--until", default=None, help="ISO time")
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    conn = EventLog.connect(args.db)
+    try:
+        where, params = _where(args.name, parse_time(args.since), parse_time(args.until))
+        summary = conn.execute(f"SELECT name, COUNT(*), AVG(confidence), MIN(ts), MAX(ts) FROM events {where} "
+                               f"GROUP BY name ORDER BY name", params).fetchall()
+        rows = conn.execute(f"SELECT ts, name, confidence FROM events {where} ORDER BY ts DESC LIMIT ?",
+                            params + [args.limit]).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error reading {args.db}: {e}")
+        return
+    finally:
+        conn.close()
+
+    print(f"{'Person':<20}{'Count':>8}{'Avg conf':>10}  First seen           Last seen")
+    for name, count, avg_conf, first, last in summary:
+        print(f"{name:<20}{count:>8}{avg_conf:>10.2f}  {datetime.fromtimestamp(first):%Y-%m-%d %H:%M:%S}  "
+              f"{datetime.fromtimestamp(last):%Y-%m-%d %H:%M:%S}")
+    print(f"\nLatest {len(rows)} events:")
+    for ts, name, confidence in rows:
+        print(f"{datetime.fromtimestamp(ts):%Y-%m-%d %H:%M:%S}  {name:<20}{confidence:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import os
+import csv
+import bisect
+import json
+import time
+import shutil
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+_systems = {}  # per worker process, so chunks of the same run share one gallery
+
+
+def probe_video(path):
+    """(frame count, fps) as reported by the container"""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open {path}")
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    return frames, fps
+
+
+def keyframe_indices(path, fps):
+    """Frame indices of the keyframes, read with ffprobe (None when ffprobe isn't installed)"""
+    if shutil.which("ffprobe") is None:
+        return None
+    # -skip_frame nokey only decodes keyframes, so this is fast even for long videos
+    command = ["ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+               "-show_entries", "frame=pts_time,best_effort_timestamp_time", "-of", "csv=p=0", path]
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, check=True, timeout=300).stdout
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"Error reading keyframes of {path}: {e}")
+        return None
+    indices = set()
+    for line in output.splitlines():
+        for value in line.split(","):
+            try:
+                indices.add(int(round(float(value) * fps)))
+                break
+            except ValueError:
+                continue
+    return sorted(indices) or None
+
+
+def plan_chunks(frame_count, chunks, keyframes=None):
+    """Split [0, frame_count) into about `chunks` ranges, starting each one on a keyframe when known.
+
+    Starting on a keyframe means a worker's seek lands exactly where decoding can begin,
+    instead of decoding from the previous keyframe up to an arbitrary frame.
+    """
+    target = max(1, frame_count // max(1, chunks))
+    starts = [0]
+    for boundary in range(target, frame_count, target):
+        if keyframes:
+            # The first keyframe at or after the even split point
+            position = bisect.bisect_left(keyframes, boundary)
+            boundary = keyframes[position] if position < len(keyframes) else frame_count
+        if starts[-1] < boundary < frame_count:
+            starts.append(boundary)
+    ends = starts[1:] + [frame_count]
+    return list(zip(starts, ends))
+
+
+def process_chunk(path, chunk_index, start, end, fps, model_dir, threshold, every_n_frames, scale, detector,
+                  precision=None):
+    """Worker process: recognize faces on frames [start, end) of one video.
+
+    Returns (chunk_index, frames decoded, detections).
+    """
+    import cv2
+    from face_pipeline import FrameProcessor
+    from face_tracker import FaceTracker
+    from multi_camera import SharedGallerySystem
+
+    # Chunks already use a core each; extra OpenCV threads only oversubscribe
+    cv2.setNumThreads(1)
+
+    key = (model_dir, threshold, precision)
+    if key not in _systems:
+        _systems[key] = SharedGallerySystem(model_dir, threshold, precision)
+    # A fresh tracker per chunk: tracks never span a seek
+    processor = FrameProcessor(_systems[key], scale=scale, detection_model=detector, tracker=FaceTracker())
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    detections = []
+    # Sample on the global frame grid so the result doesn't depend on the chunking
+    index = start
+    while index < end:
+        if index % every_n_frames != 0:
+            # grab() decodes without converting to a BGR image
+            if not cap.grab():
+                break
+            index += 1
+            continue
+        ret, frame = cap.read()
+        if not ret:
+            break
+        # Refresh intervals run on video time, so the tracks don't depend on how fast this machine is
+        result = processor.process(frame, now=index / fps)
+        for i, (location, name, confidence) in enumerate(zip(result.scaled_locations(), result.face_names,
+                                                            result.face_confidence)):
+            track_id = result.track_ids[i] if i < len(result.track_ids) else None
+            top, right, bottom, left = location
+            detections.append({
+                'time': round(index / fps, 3),
+                'frame': index,
+                'name': name,
+                'confidence': round(float(confidence), 4),
+                'track': f"{chunk_index}:{track_id}" if track_id is not None else None,
+                'top': top, 'right': right, 'bottom': bottom, 'left': left,
+            })
+        index += 1
+    cap.release()
+    return chunk_index, index - start, detections
+
+
+def build_segments(detections, max_gap):
+    """Merge detections of the same person less than max_gap seconds apart into (start, end) segments"""
+    segments = []
+    open_segments = {}
+    for detection in sorted(detections, key=lambda d: d['time']):
+        name = detection['name']
+        if name == "Unknown":
+            continue
+        segment = open_segments.get(name)
+        if segment is None or detection['time'] - segment['end'] > max_gap:
+            segment = {'name': name, 'start': detection['time'], 'end': detection['time'],
+                       'detections': 0, 'best_confidence': 0.0}
+            open_segments[name] = segment
+            segments.append(segment)
+        segment['end'] = detection['time']
+        segment['detections'] += 1
+        segment['best_confidence'] = max(segment['best_confidence'], detection['confidence'])
+    return sorted(segments, key=lambda s: (s['start'], s['name']))
+
+
+def process_video(path, output_dir, model_dir, threshold, workers, every_n_frames=5, scale=0.25, detector="hog",
+                  precision=None, chunks_per_worker=4, max_gap=2.0):
+    """Recognize faces in a whole video with chunks processed in parallel; writes the track files"""
+    started = time.perf_counter()
+    frame_count, fps = probe_video(path)
+    keyframes = keyframe_indices(path, fps)
+    if frame_count > 0:
+        chunks = plan_chunks(frame_count, workers * chunks_per_worker, keyframes)
+    else:
+        # Some containers don't store a frame count; decode the whole file in one chunk
+        chunks = [(0, 2 ** 62)]
+    print(f"{path}: {frame_count} frames at {fps:.1f} fps, {len(chunks)} chunks "
+          f"({'at keyframes' if keyframes else 'even split, ffprobe not found'}), {workers} workers")
+
+    detections = []
+    decoded = 0
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(process_chunk, path, i, start, end, fps, model_dir, threshold, every_n_frames,
+                               scale, detector, precision) for i, (start, end) in enumerate(chunks)]
+        for future in as_completed(futures):
+            try:
+                chunk_index, frames, chunk_detections = future.result()
+            except Exception as e:
+                print(f"Error processing a chunk of {path}: {e}")
+                continue
+            decoded += frames
+            detections.extend(chunk_detections)
+    detections.sort(key=lambda d: (d['frame'], d['left']))
+
+    elapsed = time.perf_counter() - started
+    frame_count = frame_count if frame_count > 0 else decoded
+    duration = frame_count / fps if fps else 0.0
+    summary = {
+        'video': os.path.abspath(path),
+        'fps': fps,
+        'frames': frame_count,
+        'frames_decoded': decoded,
+        'duration_seconds': duration,
+        'processing_seconds': elapsed,
+        'speed_vs_realtime': duration / elapsed if elapsed > 0 else 0.0,
+        'every_n_frames': every_n_frames,
+        'threshold': threshold,
+        'detector': detector,
+        'segments': build_segments(detections, max_gap),
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    with open(os.path.join(output_dir, f"{stem}_tracks.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    with open(os.path.join(output_dir, f"{stem}_detections.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=['time', 'frame', 'name', 'confidence', 'track',
+                                               'top', 'right', 'bottom', 'left'])
+        writer.writeheader()
+        writer.writerows(detections)
+
+    print(f"{path}: {duration:.1f} s of video in {elapsed:.1f} s ({summary['speed_vs_realtime']:.1f}x realtime), "
+          f"{len(detections)} detections, {len(summary['segments'])} identity segments")
+    for segment in summary['segments']:
+        print(f"  {segment['start']:>9.1f} - {segment['end']:>9.1f} s  {segment['name']:<20} "
+              f"({segment['detections']} detections, best {segment['best_confidence']:.2f})")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognize faces in recorded videos, faster than realtime")
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--model-dir", default="face_model")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="recognition threshold (default: calibrated one, else 0.6)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--every-n-frames", type=int, default=5, help="sample every n-th frame")
+    parser.add_argument("--scale", type=float, default=0.25, help="detection scale, as in the live pipeline")
+    parser.add_argument("--detector", default="hog", help="hog, cnn, haar, lbp, dnn or cascade")
+    parser.add_argument("--precision", choices=["float16", "int8"], default=None)
+    parser.add_argument("--max-gap", type=float, default=2.0,
+                        help="seconds without a sighting before a person's segment is closed")
+    parser.add_argument("--output-dir", default="video_tracks")
+    args = parser.parse_args()
+
+    from face_store import FaceModelStore
+    from calibrate_threshold import load_calibration
+    if not FaceModelStore(args.model_dir).exists():
+        print(f"No face model found in {args.model_dir}/, train or enroll faces first")
+        return
+    threshold = args.threshold
+    if threshold is None:
+        threshold = load_calibration(args.model_dir) or 0.6
+
+    for path in args.videos:
+        try:
+            process_video(path, args.output_dir, args.model_dir, threshold, max(1, args.workers),
+                          max(1, args.every_n_frames), args.scale, args.detector, args.precision,
+                          max_gap=args.max_gap)
+        except IOError as e:
+            print(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import time
+import threading
+from collections import deque
+from metrics import metrics
+
+
+class LatestQueue:
+    """Bounded queue with a newest-wins policy: putting into a full queue drops the oldest item"""
+
+    def __init__(self, maxsize=1, name="queue"):
+        self.maxsize = maxsize
+        self.name = name
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+                metrics.inc('face_frames_dropped_total', queue=self.name)
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest queued item, or None on timeout or once the queue is closed and empty"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class RateMeter:
+    """Events-per-second counter over an exponentially smoothed interval"""
+
+    def __init__(self, smoothing=0.9):
+        self.smoothing = smoothing
+        self.count = 0
+        self._interval = None
+        self._last = None
+
+    @property
+    def rate(self):
+        return 1.0 / self._interval if self._interval else 0.0
+
+    def tick(self):
+        now = time.perf_counter()
+        if self._last is not None:
+            interval = now - self._last
+            if self._interval is None:
+                self._interval = interval
+            else:
+                self._interval = self.smoothing * self._interval + (1 - self.smoothing) * interval
+        self._last = now
+        self.count += 1
+
+
+class StagedPipeline:
+    """Capture thread -> pool of inference workers -> annotator running in the caller's thread.
+
+    The capture thread reads at camera rate and feeds two newest-wins queues: one for
+    display and one (every `every_n_frames` frames) for inference. Workers publish their
+    results as "latest result", which the annotator overlays on whatever frame it shows
+    next, so a slow inference frame never stalls the preview.
+
+    With an AdaptiveScheduler attached, it decides which frames go to inference and at
+    which scale, instead of the fixed `every_n_frames`.
+
+    A processor with a FaceTracker or ROIDetector attached keeps per-stream state that
+    must see frames in order, so it always gets a single inference worker.
+    """
+
+    def __init__(self, capture, processor, workers=2, every_n_frames=1, queue_size=1,
+                 transform=None, max_result_age=1.0, scheduler=None):
+        self.capture = capture
+        self.processor = processor
+        if getattr(processor, 'tracker', None) is not None or getattr(processor, 'roi', None) is not None:
+            workers = 1
+        self.workers = workers
+        self.every_n_frames = max(1, every_n_frames)
+        self.transform = transform
+        self.max_result_age = max_result_age
+        self.scheduler = scheduler
+        self.inference_enabled = True
+
+        self.inference_queue = LatestQueue(queue_size, "inference")
+        self.display_queue = LatestQueue(2, "display")
+        self.capture_rate = RateMeter()
+        self.inference_rate = RateMeter()
+        self.inference_errors = 0
+
+        self._running = False
+        self._threads = []
+        self._result_lock = threading.Lock()
+        self._result_id = -1
+        self._result = None
+        self._result_time = 0.0
+
+    def start(self):
+        self._running = True
+        self._threads = [threading.Thread(target=self._capture_loop, name="capture", daemon=True)]
+        self._threads += [threading.Thread(target=self._inference_loop, name=f"inference-{i}", daemon=True)
+                          for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._running = False
+        self.inference_queue.close()
+        self.display_queue.close()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+
+    @property
+    def capture_finished(self):
+        return self.display_queue.closed and len(self.display_queue) == 0
+
+    def _capture_loop(self):
+        frame_id = 0
+        while self._running:
+            start = time.perf_counter()
+            ret, frame = self.capture.read()
+            if not ret:
+                break
+            metrics.observe('capture', time.perf_counter() - start)
+            metrics.inc('face_frames_total')
+            if self.transform is not None:
+                frame = self.transform(frame)
+            self.capture_rate.tick()
+
+            if self.inference_enabled and self._wants_inference(frame_id, frame):
+                # The annotator draws on the display frame, so inference gets its own copy
+                self.inference_queue.put((frame_id, frame.copy()))
+            self.display_queue.put((frame_id, frame))
+            metrics.set('face_queue_depth', len(self.inference_queue), queue="inference")
+            metrics.set('face_queue_depth', len(self.display_queue), queue="display")
+            frame_id += 1
+
+        self.inference_queue.close()
+        self.display_queue.close()
+
+    def _wants_inference(self, frame_id, frame):
+        if self.scheduler is not None:
+            return self.scheduler.should_process(frame)
+        return frame_id % self.every_n_frames == 0
+
+    def _inference_loop(self):
+        while self._running:
+            item = self.inference_queue.get(timeout=0.5)
+            if item is None:
+                if self.inference_queue.closed:
+                    break
+                continue
+
+            frame_id, frame = item
+            try:
+                start = time.perf_counter()
+                if self.scheduler is not None:
+                    self.processor.scale = self.scheduler.scale
+                result = self.processor.process(frame)
+                if self.scheduler is not None:
+                    self.scheduler.record(result, time.perf_counter() - start)
+            except Exception as e:
+                self.inference_errors += 1
+                print(f"Error processing frame {frame_id}: {e}")
+                continue
+
+            with self._result_lock:
+                # Workers can finish out of order; never replace a newer result with an older one
+                if frame_id > self._result_id:
+                    self._result_id = frame_id
+                    self._result = result
+                    self._result_time = time.perf_counter()
+            self.inference_rate.tick()
+
+    def next_frame(self, timeout=1.0):
+        """Next (frame_id, frame) to display, or None if nothing arrived in time"""
+        return self.display_queue.get(timeout)
+
+    def latest_result(self):
+        """(frame_id, FrameResult) of the newest finished inference; result is None when too old"""
+        with self._result_lock:
+            if self._result is None or time.perf_counter() - self._result_time > self.max_result_age:
+                return self._result_id, None
+            return self._result_id, self._result
+
+    def stats(self):
+        stats = {
+            'capture_fps': self.capture_rate.rate,
+            'inference_fps': self.inference_rate.rate,
+            'frames_captured': self.capture_rate.count,
+            'frames_processed': self.inference_rate.count,
+            'inference_queue_depth': len(self.inference_queue),
+            'display_queue_depth': len(self.display_queue),
+            'dropped_inference': self.inference_queue.dropped,
+            'dropped_display': self.display_queue.dropped,
+            'inference_errors': self.inference_errors,
+        }
+        if self.scheduler is not None:
+            stats['scheduler'] = self.scheduler.state()
+        return stats
@@ -0,0 +1,190 @@
+import os
+import time
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from features import FEATURE_COLUMNS, add_features, latest_per_device, readings_to_frame
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+
+
+def load_models(model_dir=MODEL_DIR):
+    """(classifier, regressor or None, scaler) saved by the training notebook"""
+    import joblib
+
+    clf = joblib.load(os.path.join(model_dir, "warning_classifier.pkl"))
+    scaler = joblib.load(os.path.join(model_dir, "feature_scaler.pkl"))
+    reg_path = os.path.join(model_dir, "days_regressor.pkl")
+    reg = joblib.load(reg_path) if os.path.exists(reg_path) else None
+    if reg is None:
+        print(f"Warning: {reg_path} not found, days to failure will not be predicted")
+    return clf, reg, scaler
+
+
+class BatchScorer:
+    """Scores the latest reading of every sensor with one scaler, classifier and regressor call.
+
+    Features are computed per device with the vectorized kernels in features.py, so the
+    histories of different sensors never mix, and the cost per sensor is a few array
+    operations instead of a DataFrame round trip.
+    """
+
+    def __init__(self, clf, reg, scaler):
+        self.clf = clf
+        self.reg = reg
+        self.scaler = scaler
+        self.timings = {}
+
+    def score_latest(self, history, device_column='Device_ID'):
+        """Prediction table with one row per device, for its most recent reading"""
+        start = time.perf_counter()
+        features = add_features(history, device_column)
+        latest = latest_per_device(features, device_column)
+        featured = time.perf_counter()
+
+        predictions = self.score_rows(latest)
+        self.timings = {'features': featured - start, 'scoring': time.perf_counter() - featured,
+                        'devices': len(latest), 'rows': len(history)}
+        return predictions
+
+    def score_rows(self, rows):
+        """Warning probability/status and days to failure for already featurized rows, in one model call each"""
+        table = rows[['Device_ID', 'Date'] + [c for c in ('temperature', 'humidity', 'voltage', 'fan_status',
+                                                           'created_at') if c in rows.columns]].copy()
+        if len(rows) == 0:
+            return table.assign(warning_probability=[], warning_status=[], days_to_failure=[])
+        X = self.scaler.transform(rows[FEATURE_COLUMNS])
+        if hasattr(self.clf, "predict_proba"):
+            probability = self.clf.predict_proba(X)[:, list(self.clf.classes_).index(1)]
+            table['warning_probability'] = probability
+            table['warning_status'] = probability >= 0.5
+        else:
+            table['warning_probability'] = np.nan
+            table['warning_status'] = self.clf.predict(X).astype(bool)
+        table['days_to_failure'] = self.reg.predict(X).astype(int) if self.reg is not None else -1
+        return table
+
+
+def _nullable(value, cast):
+    """Missing readings (mqtt-bridge only sends some fields per message) are stored as null"""
+    return None if value is None or pd.isna(value) else cast(value)
+
+
+def prediction_records(table):
+    """Rows for temperature_readings, in the shape make_prediction/save_prediction_to_supabase used"""
+    now = datetime.now().isoformat()
+    records = []
+    for row in table.itertuples(index=False):
+        records.append({
+            "sensor_id": int(row.Device_ID),
+            "temperature": _nullable(row.temperature, float),
+            "humidity": _nullable(row.humidity, float),
+            "voltage": _nullable(row.voltage, int),
+            "fan_status": _nullable(getattr(row, "fan_status", None), str) or "unknown",
+            "days_to_failure": int(row.days_to_failure),
+            "warning_status": bool(row.warning_status),
+            "created_at": now,
+        })
+    return records
+
+
+def fetch_history(supabase, days=30, since=None):
+    """All sensors' readings of the last `days` days (or from `since` on), paged"""
+    from datetime import timedelta
+
+    if since is None:
+        since = datetime.now().date() - timedelta(days=days)
+    since = since.isoformat()
+    rows, page = [], 1000
+    while True:
+        response = supabase.table("temperature_readings").select("*").gte("created_at", since) \
+            .order("created_at").range(len(rows), len(rows) + page - 1).execute()
+        rows.extend(response.data)
+        if len(response.data) < page:
+            return rows
+
+
+def synthetic_fleet(base, sensors, seed=0):
+    """`sensors` devices made by re-labelling and jittering the devices of a dataset"""
+    rng = np.random.default_rng(seed)
+    groups = list(base.groupby('Device_ID', sort=False).indices.values())
+    picks = [groups[i % len(groups)] for i in range(sensors)]
+    fleet = base.iloc[np.concatenate(picks)].reset_index(drop=True)
+    fleet['Device_ID'] = np.repeat([f"Sensor_{i}" for i in range(sensors)], [len(p) for p in picks])
+    for column in ('Temperature', 'Humidity', 'Voltage'):
+        fleet[column] = fleet[column] + rng.normal(0.0, 0.1, len(fleet))
+    return fleet
+
+
+def benchmark(scorer, base, sizes, history_days=30):
+    """Time features + scoring for fleets of different sizes, reported per 1k sensors"""
+    base = base.copy()
+    base['Date'] = pd.to_datetime(base['Date'])
+    base = base[base['Date'] > base['Date'].max() - pd.Timedelta(days=history_days)]
+    for sensors in sizes:
+        fleet = synthetic_fleet(base, sensors)
+        start = time.perf_counter()
+        table = scorer.score_latest(fleet)
+        elapsed = time.perf_counter() - start
+        per_1k = elapsed / sensors * 1000
+        timings = scorer.timings
+        print(f"{sensors:>7} sensors x {history_days} days: {elapsed * 1000:8.1f} ms "
+              f"(features {timings['features'] * 1000:.1f} ms, scoring {timings['scoring'] * 1000:.1f} ms)  "
+              f"{per_1k * 1000:7.1f} ms per 1k sensors, {int(table['warning_status'].sum())} warnings")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score the latest reading of every sensor in one batch")
+    parser.add_argument("--csv", default=None, help="score a dataset in the training CSV format instead of Supabase")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--days", type=int, default=30, help="history fetched from Supabase")
+    parser.add_argument("--save", action="store_true", help="insert the predictions into temperature_readings")
+    parser.add_argument("--benchmark", default=None, help="fleet sizes to time, e.g. 100,1000,10000")
+    parser.add_argument("--output", default=None, help="write the prediction table as CSV")
+    args = parser.parse_args()
+
+    scorer = BatchScorer(*load_models(args.model_dir))
+
+    if args.benchmark:
+        base = pd.read_csv(args.csv or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                    "full_server_degradation_dataset.csv"))
+        benchmark(scorer, base, [int(n) for n in args.benchmark.split(",")])
+        return
+
+    supabase = None
+    if args.csv:
+        history = pd.read_csv(args.csv)
+    else:
+        from dotenv import load_dotenv
+        from supabase import create_client
+
+        load_dotenv()
+        supabase = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_ANON_KEY"))
+        rows = fetch_history(supabase, args.days)
+        history = readings_to_frame(rows) if rows else pd.DataFrame()
+    if len(history) == 0:
+        print("No data available for prediction")
+        return
+
+    table = scorer.score_latest(history)
+    timings = scorer.timings
+    total = timings['features'] + timings['scoring']
+    columns = ['Device_ID', 'Date', 'warning_probability', 'warning_status', 'days_to_failure']
+    print(table[columns].to_string(index=False))
+    print(f"\n{timings['devices']} devices ({timings['rows']} readings) scored in {total * 1000:.1f} ms "
+          f"({total / max(1, timings['devices']) * 1e6:.1f} ms per 1k sensors)")
+
+    if args.output:
+        table.to_csv(args.output, index=False)
+    if args.save and supabase is not None:
+        try:
+            # One bulk insert for the whole fleet instead of one request per sensor
+            supabase.table("temperature_readings").insert(prediction_records(table)).execute()
+            print(f"Saved {len(table)} predictions")
+        except Exception as e:
+            print(f"Error saving predictions: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import argparse
+import importlib.util
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['Date', 'Device_ID', 'Temperature', 'Humidity', 'Voltage', 'Failure', 'Days_to_Failure']
+FORMATS = {'parquet': '.parquet', 'feather': '.feather', 'csv': '.csv'}
+# Parquet and Feather are written by pyarrow, which is optional
+DEFAULT_FORMAT = 'parquet' if importlib.util.find_spec('pyarrow') else 'csv'
+
+
+def device_profile(rng):
+    """Base temperature, humidity, voltage and risk score of one device, as in degraradation2.ipynb"""
+    temperature = [rng.uniform(18, 22), rng.uniform(22, 27), rng.uniform(27, 35)][rng.choice(3, p=[0.5, 0.3, 0.2])]
+    humidity = [rng.uniform(45, 55), rng.uniform(35, 45), rng.uniform(55, 65)][rng.choice(3, p=[0.5, 0.25, 0.25])]
+    voltage = [rng.uniform(220, 230), rng.uniform(210, 220), rng.uniform(230, 245)][rng.choice(3, p=[0.6, 0.2, 0.2])]
+
+    if temperature < 22:
+        risk_score = 0.1
+    elif temperature < 27:
+        risk_score = 0.3
+    else:
+        risk_score = 0.5 + ((temperature - 27) / 8) ** 2
+    risk_score += abs(voltage - 225) / 15 * 0.3
+    risk_score += abs(humidity - 50) / 15 * 0.2
+    return {'Temperature': temperature, 'Humidity': humidity, 'Voltage': voltage,
+            'risk_score': max(0.1, min(1.0, risk_score))}
+
+
+def failure_day(rng, risk_score, num_days):
+    """Day the device fails: earlier for riskier devices, never before day 50"""
+    adjusted_risk = max(0.3, risk_score)
+    max_fail_day = max(int(num_days * (1 - adjusted_risk * 0.8)), 51)
+    min_fail_day = max(max_fail_day - 60, 50)
+    if min_fail_day >= max_fail_day:
+        min_fail_day = max_fail_day - 1
+    return int(rng.integers(min_fail_day, max_fail_day))
+
+
+def generate_series(rng, base_value, t, std_dev, has_weekly_pattern, deterioration_start, fail_day, risk_score):
+    """generate_time_series from the notebook, for all time steps at once.
+
+    `t` is the time of every reading in days, so readings_per_day > 1 samples the daily
+    cycle the notebook describes; with one reading per day it is the notebook's series.
+    """
+    series = base_value + np.sin(t * (2 * np.pi / 1)) * std_dev * 0.5
+    if has_weekly_pattern:
+        series += np.sin(t * (2 * np.pi / 7)) * std_dev * 0.3
+
+    day = np.floor(t)
+    progress = (day - deterioration_start) / max(1, fail_day - deterioration_start)
+    deteriorating = (day >= deterioration_start) & (day < fail_day)
+    multiplier = 0.15 + risk_score * 0.2
+    series += np.where(deteriorating, (np.exp(progress * (1 + risk_score)) - 1) * base_value * multiplier, 0.0)
+
+    # Spikes become more likely as failure approaches
+    spike_probability = np.where(deteriorating & (progress > 0.6), progress * (0.3 + risk_score * 0.3), 0.0)
+    spikes = rng.random(len(t)) < spike_probability
+    series += np.where(spikes, rng.uniform(0, base_value * (0.2 + risk_score * 0.1), len(t)), 0.0)
+
+    # Noise grows with progress towards failure
+    noise_std = std_dev * np.where(day >= deterioration_start, 1 + np.clip(progress, 0, 1) * (1 + risk_score), 1.0)
+    return series + rng.normal(0, 1, len(t)) * noise_std
+
+
+def generate_device(device_id, seed, num_days, readings_per_day=1, start_date=None):
+    """All readings of one device as a DataFrame.
+
+    The device draws from its own SeedSequence(seed, spawn_key=(device_id,)), so its data
+    depends only on the seed and its id, not on which worker generates it or in what order.
+    The distributions are the notebook's, the exact random numbers are not.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(device_id,)))
+    profile = device_profile(rng)
+    risk_score = profile['risk_score']
+    fail_day = failure_day(rng, risk_score, num_days)
+    deterioration_start = max(0, fail_day - int(30 + (1 - risk_score) * 50))
+
+    t = np.arange(num_days * readings_per_day) / readings_per_day
+    temperature = generate_series(rng, profile['Temperature'], t, 1.0, False, deterioration_start, fail_day, risk_score)
+    humidity = generate_series(rng, profile['Humidity'], t, 2.0, True, deterioration_start, fail_day, risk_score)
+    voltage = generate_series(rng, profile['Voltage'], t, 1.5, False, deterioration_start, fail_day, risk_score)
+
+    # High temperature dries the air, and humidity far from 50% makes the voltage unstable
+    humidity -= np.where(temperature > profile['Temperature'] + 4, (temperature - profile['Temperature']) * 0.3, 0.0)
+    fluctuation = np.maximum(np.abs(humidity - 50) - 12, 0.0) * 0.15
+    voltage += rng.normal(0, 1, len(t)) * fluctuation
+
+    day = np.floor(t).astype(np.int64)
+    start_date = pd.Timestamp(start_date if start_date is not None else
+                              (datetime.now() - timedelta(days=num_days)).date())
+    return pd.DataFrame({
+        'Date': start_date + pd.to_timedelta(t, unit='D'),
+        'Device_ID': f'Device_{device_id}',
+        'Temperature': np.round(np.maximum(0, temperature), 2),
+        'Humidity': np.round(np.maximum(0, humidity), 2),
+        'Voltage': np.round(np.maximum(0, voltage), 2),
+        'Failure': (day == fail_day).astype(np.int8),
+        'Days_to_Failure': np.where(day <= fail_day, fail_day - day, -1).astype(np.int32),
+    }, columns=COLUMNS)
+
+
+def write_frame(df, path, file_format):
+    if file_format == 'parquet':
+        df.to_parquet(path, index=False)
+    elif file_format == 'feather':
+        df.to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+
+
+def generate_partition(partition, device_ids, seed, num_days, readings_per_day, start_date, output_dir, file_format):
+    """Worker process: generate a block of devices and write it as one partition file.
+
+    Only the file name and row count go back to the parent, so its memory does not grow
+    with the dataset.
+    """
+    df = pd.concat([generate_device(device_id, seed, num_days, readings_per_day, start_date)
+                    for device_id in device_ids], ignore_index=True)
+    name = f"part-{partition:05d}{FORMATS[file_format]}"
+    write_frame(df, os.path.join(output_dir, name), file_format)
+    return name, len(df), int(df['Failure'].sum())
+
+
+def generate_dataset(output_dir, num_devices=40, num_days=180, readings_per_day=1, seed=42, workers=None,
+                     partition_rows=1_000_000, file_format=DEFAULT_FORMAT, start_date=None):
+    """Generate devices 1..num_devices into partition files under output_dir; returns the manifest.
+
+    Devices are split into partitions of about `partition_rows` rows, independently of the
+    number of workers, so the same seed gives the same files with any pool size.
+    """
+    # Checked up front, not in the first worker after the pool has started
+    if file_format != 'csv' and importlib.util.find_spec('pyarrow') is None:
+        raise ImportError(f"the {file_format} format needs pyarrow (pip install pyarrow), or use csv")
+    os.makedirs(output_dir, exist_ok=True)
+    start_date = pd.Timestamp(start_date if start_date is not None else
+                              (datetime.now() - timedelta(days=num_days)).date())
+    rows_per_device = num_days * readings_per_day
+    devices_per_partition = max(1, partition_rows // rows_per_device)
+    blocks = [list(range(first, min(first + devices_per_partition, num_devices + 1)))
+              for first in range(1, num_devices + 1, devices_per_partition)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(blocks)))
+    print(f"Generating {num_devices} devices x {num_days} days x {readings_per_day} readings/day "
+          f"= {num_devices * rows_per_device:,} rows in {len(blocks)} {file_format} partitions on {workers} workers")
+
+    started = time.perf_counter()
+    partitions = []
+    with ProcessPoolExecutor(workers) as pool:
+        results = pool.map(generate_partition, range(len(blocks)), blocks, [seed] * len(blocks),
+                           [num_days] * len(blocks), [readings_per_day] * len(blocks), [start_date] * len(blocks),
+                           [output_dir] * len(blocks), [file_format] * len(blocks))
+        for name, rows, failures in results:
+            partitions.append({'file': name, 'rows': rows, 'failures': failures})
+            done = sum(p['rows'] for p in partitions)
+            elapsed = time.perf_counter() - started
+            print(f"  {name}: {rows:,} rows ({done:,} total, {done / elapsed:,.0f} rows/s)")
+
+    elapsed = time.perf_counter() - started
+    manifest = {
+        'seed': seed,
+        'num_devices': num_devices,
+        'num_days': num_days,
+        'readings_per_day': readings_per_day,
+        'start_date': start_date.strftime('%Y-%m-%d'),
+        'format': file_format,
+        'columns': COLUMNS,
+        'rows': sum(p['rows'] for p in partitions),
+        'partitions': partitions,
+        'seconds': elapsed,
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"{manifest['rows']:,} rows in {elapsed:.1f} s ({manifest['rows'] / elapsed:,.0f} rows/s), "
+          f"written to {output_dir}/")
+    return manifest
+
+
+def read_partitions(output_dir):
+    """Yield the partitions of a generated dataset one DataFrame at a time"""
+    with open(os.path.join(output_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    for partition in manifest['partitions']:
+        path = os.path.join(output_dir, partition['file'])
+        if manifest['format'] == 'parquet':
+            yield pd.read_parquet(path)
+        elif manifest['format'] == 'feather':
+            yield pd.read_feather(path)
+        else:
+            yield pd.read_csv(path, parse_dates=['Date'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic server degradation data in parallel")
+    parser.add_argument("--devices", type=int, default=40)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--readings-per-day", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--partition-rows", type=int, default=1_000_000, help="approximate rows per partition file")
+    parser.add_argument("--format", choices=list(FORMATS), default=DEFAULT_FORMAT,
+                        help="partition file format (default: parquet if pyarrow is installed, otherwise csv)")
+    parser.add_argument("--start-date", default=None, help="first day (default: --days before today)")
+    parser.add_argument("--output-dir", default="generated_data")
+    args = parser.parse_args()
+
+    try:
+        generate_dataset(args.output_dir, args.devices, args.days, max(1, args.readings_per_day), args.seed,
+                         args.workers, args.partition_rows, args.format, args.start_date)
+    except ImportError as e:
+        print(f"Error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+
+SENSOR_COLUMNS = ['Temperature', 'Humidity', 'Voltage']
+
+FEATURE_COLUMNS = [
+    'Temperature', 'Humidity', 'Voltage',
+    'Day_of_Week', 'Month',
+    'Temp_Humidity_Ratio', 'Temp_Voltage_Ratio', 'Humidity_Voltage_Ratio',
+    'Temperature_7d_mean', 'Temperature_7d_std',
+    'Humidity_7d_mean', 'Humidity_7d_std',
+    'Voltage_7d_mean', 'Voltage_7d_std',
+    'Temperature_trend', 'Humidity_trend', 'Voltage_trend'
+]
+
+STATS_WINDOW = 7
+TREND_WINDOW = 3
+
+# Bump whenever a feature's definition changes, so cached feature matrices are recomputed
+FEATURE_SPEC_VERSION = 1
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "feature_cache")
+
+
+def group_starts(device_ids):
+    """For rows sorted by device, the index of the first row of each row's device"""
+    device_ids = np.asarray(device_ids)
+    n = len(device_ids)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    new_group = np.empty(n, dtype=bool)
+    new_group[0] = True
+    new_group[1:] = device_ids[1:] != device_ids[:-1]
+    return np.maximum.accumulate(np.where(new_group, np.arange(n), 0))
+
+
+def _lagged(values, starts, lag):
+    """values[i - lag] within the same device, NaN where that crosses into another device"""
+    out = np.full(len(values), np.nan)
+    if lag < len(values):
+        out[lag:] = values[:len(values) - lag]
+        out[np.arange(len(values)) - lag < starts] = np.nan
+    return out
+
+
+def grouped_rolling(values, starts, window):
+    """Per-device rolling(window, min_periods=1) mean and std (ddof=1), NaN-aware like pandas.
+
+    Works on whole columns: each of the `window` lags is one vectorized pass, so there is
+    no Python call per device. The std uses a second pass around the mean, which is
+    better conditioned than running sums of squares.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    lags = [values] + [_lagged(values, starts, k) for k in range(1, window)]
+    count = np.zeros(len(values))
+    total = np.zeros(len(values))
+    for lagged in lags:
+        valid = ~np.isnan(lagged)
+        count += valid
+        total += np.where(valid, lagged, 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+        squares = np.zeros(len(values))
+        for lagged in lags:
+            squares += np.where(np.isnan(lagged), 0.0, (lagged - mean) ** 2)
+        std = np.where(count > 1, np.sqrt(squares / (count - 1)), np.nan)
+    return mean, std
+
+
+def grouped_trend(values, starts, window=TREND_WINDOW):
+    """Per-device diff().rolling(window, min_periods=1).mean()"""
+    values = np.asarray(values, dtype=np.float64)
+    diffs = values - _lagged(values, starts, 1)
+    mean, _ = grouped_rolling(diffs, starts, window)
+    return mean
+
+
+def add_features(df, device_column='Device_ID', date_column='Date'):
+    """The 17 model features, computed per device; returns a copy sorted by device and date.
+
+    Matches the training notebook's groupby(...).transform(lambda x: x.rolling(...)) features
+    followed by fillna(0).
+    """
+    df = df.copy()
+    df[date_column] = pd.to_datetime(df[date_column])
+    df = df.sort_values([device_column, date_column], kind='mergesort').reset_index(drop=True)
+    starts = group_starts(df[device_column].to_numpy())
+
+    df['Day_of_Week'] = df[date_column].dt.dayofweek
+    df['Month'] = df[date_column].dt.month
+
+    df['Temp_Humidity_Ratio'] = df['Temperature'] / df['Humidity']
+    df['Temp_Voltage_Ratio'] = df['Temperature'] / df['Voltage']
+    df['Humidity_Voltage_Ratio'] = df['Humidity'] / df['Voltage']
+
+    for column in SENSOR_COLUMNS:
+        values = df[column].to_numpy(dtype=np.float64)
+        df[f'{column}_7d_mean'], df[f'{column}_7d_std'] = grouped_rolling(values, starts, STATS_WINDOW)
+        df[f'{column}_trend'] = grouped_trend(values, starts)
+
+    return df.fillna(0)
+
+
+def latest_per_device(df, device_column='Device_ID'):
+    """Last row of every device in a frame sorted by device and date"""
+    device_ids = df[device_column].to_numpy()
+    last = np.ones(len(df), dtype=bool)
+    last[:-1] = device_ids[:-1] != device_ids[1:]
+    return df[last].reset_index(drop=True)
+
+
+def readings_to_frame(readings):
+    """Map temperature_readings rows (Supabase records or a DataFrame) to the training column names.
+
+    Predictions are written back to the same table with `days_to_failure` set; those rows are
+    dropped so they are never read back as sensor readings.
+    """
+    df = pd.DataFrame(readings).copy()
+    if 'days_to_failure' in df.columns:
+        df = df[df['days_to_failure'].isna()].reset_index(drop=True)
+    # Supabase and mqtt-bridge timestamps differ in fractional seconds, which a single inferred format rejects
+    df['Date'] = pd.to_datetime(df['created_at'], format='ISO8601')
+    df['Temperature'] = df['temperature']
+    df['Humidity'] = df['humidity']
+    df['Voltage'] = df['voltage']
+    df['Device_ID'] = df['sensor_id']
+    return df
+
+
+def notebook_features(df):
+    """The training notebook's groupby/lambda implementation, kept as the reference for validation and timing"""
+    df_model = df.copy()
+    df_model['Date'] = pd.to_datetime(df_model['Date'])
+    df_model = df_model.sort_values(by=['Device_ID', 'Date'])
+
+    df_model['Day_of_Week'] = df_model['Date'].dt.dayofweek
+    df_model['Month'] = df_model['Date'].dt.month
+
+    df_model['Temp_Humidity_Ratio'] = df_model['Temperature'] / df_model['Humidity']
+    df_model['Temp_Voltage_Ratio'] = df_model['Temperature'] / df_model['Voltage']
+    df_model['Humidity_Voltage_Ratio'] = df_model['Humidity'] / df_model['Voltage']
+
+    grouped = df_model.groupby('Device_ID')
+    for column in SENSOR_COLUMNS:
+        df_model[f'{column}_7d_mean'] = grouped[column].transform(lambda x: x.rolling(window=7, min_periods=1).mean())
+        df_model[f'{column}_7d_std'] = grouped[column].transform(lambda x: x.rolling(window=7, min_periods=1).std())
+        df_model[f'{column}_trend'] = grouped[column].transform(
+            lambda x: x.diff().rolling(window=3, min_periods=1).mean())
+
+    return df_model.fillna(0)
+
+
+def feature_spec():
+    """Everything that determines the feature values besides the input data"""
+    return {'version': FEATURE_SPEC_VERSION, 'columns': FEATURE_COLUMNS,
+            'stats_window': STATS_WINDOW, 'trend_window': TREND_WINDOW}
+
+
+def data_fingerprint(df):
+    """Hash of a frame's columns, dtypes and values (not its index)"""
+    digest = hashlib.sha1(json.dumps([list(map(str, df.columns)), [str(t) for t in df.dtypes], len(df)]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def cached_features(df, cache_dir=CACHE_DIR, device_column='Device_ID', date_column='Date'):
+    """add_features, stored on disk under a key of the input fingerprint and the feature spec.
+
+    Re-running a notebook or a grid search on the same data loads the feature matrix
+    instead of recomputing it; changing the data or FEATURE_SPEC_VERSION misses the cache.
+    """
+    key = hashlib.sha1(json.dumps([data_fingerprint(df), feature_spec(), device_column, date_column])
+                       .encode()).hexdigest()[:20]
+    path = os.path.join(cache_dir, f"features_{key}.pkl")
+    if os.path.exists(path):
+        try:
+            return pd.read_pickle(path)
+        except Exception as e:
+            print(f"Error reading cached features {path}: {e}")
+
+    features = add_features(df, device_column, date_column)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    features.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+    return features
+
+
+def _timed(function, *args, repeat=3):
+    """Best of `repeat` runs, in seconds, and the last result"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark(path, scale=100, cache_dir=None):
+    """Time the notebook's lambda features against add_features and the cache, on a dataset and its enlargement"""
+    import tempfile
+    from batch_scoring import synthetic_fleet
+
+    base = pd.read_csv(path)
+    datasets = [(os.path.basename(path), base)]
+    if scale > 1:
+        datasets.append((f"{scale}x enlargement", synthetic_fleet(base, base['Device_ID'].nunique() * scale)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = cache_dir or tmp
+        print(f"{'Dataset':<40}{'Rows':>10}{'lambda':>11}{'vectorized':>12}{'cache miss':>12}{'cache hit':>11}"
+              f"{'speedup':>9}{'max diff':>10}")
+        for name, df in datasets:
+            repeat = 3 if len(df) < 100000 else 1
+            reference_time, reference = _timed(notebook_features, df, repeat=repeat)
+            vectorized_time, vectorized = _timed(add_features, df, repeat=repeat)
+            start = time.perf_counter()
+            cached_features(df, cache_dir)
+            miss_time = time.perf_counter() - start
+            hit_time, cached = _timed(cached_features, df, cache_dir, repeat=repeat)
+
+            reference = reference.sort_values(['Device_ID', 'Date'], kind='mergesort')
+            difference = max(float(np.max(np.abs(reference[c].to_numpy(np.float64) - vectorized[c].to_numpy(np.float64))))
+                             for c in FEATURE_COLUMNS)
+            if not cached[FEATURE_COLUMNS].equals(vectorized[FEATURE_COLUMNS]):
+                print(f"Warning: cached features of {name} differ from a fresh computation")
+            print(f"{name:<40}{len(df):>10,}{reference_time:>10.3f}s{vectorized_time:>11.3f}s{miss_time:>11.3f}s"
+                  f"{hit_time:>10.3f}s{reference_time / vectorized_time:>8.1f}x{difference:>10.1e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared feature engineering for training and inference")
+    parser.add_argument("--benchmark", default=None, metavar="CSV", nargs="?",
+                        const=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                           "full_server_degradation_dataset.csv"),
+                        help="time against the notebook's lambda-based features (default: the full dataset)")
+    parser.add_argument("--scale", type=int, default=100, help="also time an enlargement with this many times the devices")
+    parser.add_argument("--clear-cache", action="store_true", help=f"delete the cached feature matrices in {CACHE_DIR}")
+    args = parser.parse_args()
+
+    if args.clear_cache and os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            if name.startswith("features_"):
+                os.remove(os.path.join(CACHE_DIR, name))
+        print(f"Cleared {CACHE_DIR}")
+    if args.benchmark:
+        benchmark(args.benchmark, args.scale)
+
+
+if __name__ == "__main__":
+    main()
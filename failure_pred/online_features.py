@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from features import (SENSOR_COLUMNS, FEATURE_COLUMNS, STATS_WINDOW, TREND_WINDOW, group_starts,
+                      notebook_features, readings_to_frame)
+
+STATE_VERSION = 1
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "feature_state.npz")
+
+
+def _window_stats(block):
+    """NaN-aware mean and std (ddof=1) over the last axis, the way pandas rolling(min_periods=1) treats a window"""
+    valid = ~np.isnan(block)
+    count = valid.sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(valid, block, 0.0).sum(axis=-1) / count
+        squares = np.where(valid, (block - mean[..., None]) ** 2, 0.0).sum(axis=-1)
+        std = np.where(count > 1, np.sqrt(squares / (count - 1)), np.nan)
+    return np.where(count > 0, mean, np.nan), std
+
+
+class OnlineFeatureState:
+    """Per-device rolling state for the 17 model features, so a run only needs the new readings.
+
+    Every device keeps a ring buffer of its last 7 sensor values, its last 3 diffs and its
+    last value. A reading overwrites one slot of each buffer and the window statistics are
+    taken over the buffer: with windows this small that costs the same as maintaining
+    running sums, and unlike running sums (or pandas' own add/remove updates) it never
+    accumulates rounding drift over months of readings. Empty slots are NaN, so the first
+    readings of a device get the min_periods=1 values the training notebook computed.
+    """
+
+    def __init__(self, capacity=64):
+        self.devices = []
+        self.slots = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        def grow(array, fill):
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        if not hasattr(self, 'window'):
+            self.window = np.full((0, len(SENSOR_COLUMNS), STATS_WINDOW), np.nan)
+            self.diffs = np.full((0, len(SENSOR_COLUMNS), TREND_WINDOW), np.nan)
+            self.last = np.full((0, len(SENSOR_COLUMNS)), np.nan)
+            self.readings = np.zeros(0, dtype=np.int64)
+            self.last_date = np.zeros(0, dtype='datetime64[ns]')
+        self.window = grow(self.window, np.nan)
+        self.diffs = grow(self.diffs, np.nan)
+        self.last = grow(self.last, np.nan)
+        self.readings = grow(self.readings, 0)
+        self.last_date = grow(self.last_date, np.datetime64('NaT'))
+
+    def __len__(self):
+        return len(self.devices)
+
+    def _slots_for(self, device_ids):
+        slots = np.empty(len(device_ids), dtype=np.int64)
+        for i, device in enumerate(device_ids):
+            slot = self.slots.get(device)
+            if slot is None:
+                slot = len(self.devices)
+                self.slots[device] = slot
+                self.devices.append(device)
+            slots[i] = slot
+        if len(self.devices) > len(self.readings):
+            self._allocate(max(len(self.devices), 2 * len(self.readings)))
+        return slots
+
+    def watermark(self):
+        """Timestamp of the newest reading folded into the state, None when it is empty"""
+        dates = self.last_date[:len(self.devices)]
+        dates = dates[~np.isnat(dates)]
+        return pd.Timestamp(dates.max()) if len(dates) else None
+
+    def update(self, readings, device_column='Device_ID', date_column='Date'):
+        """Fold new readings (training column names) into the state; returns their feature rows.
+
+        Readings at or before a device's last processed timestamp are skipped, so
+        overlapping fetches are harmless. The result is sorted by device and date like
+        add_features, and each row carries the features as of that reading.
+        """
+        df = readings.copy()
+        df[date_column] = pd.to_datetime(df[date_column])
+        df = df.sort_values([device_column, date_column], kind='mergesort')
+        df = df.drop_duplicates([device_column, date_column]).reset_index(drop=True)
+
+        slots = self._slots_for(df[device_column].tolist())
+        dates = df[date_column].to_numpy(dtype='datetime64[ns]')
+        previous = self.last_date[slots]
+        fresh = np.isnat(previous) | (dates > previous)
+        df, slots, dates = df[fresh].reset_index(drop=True), slots[fresh], dates[fresh]
+
+        values = df[SENSOR_COLUMNS].to_numpy(dtype=np.float64)
+        means = np.empty_like(values)
+        stds = np.empty_like(values)
+        trends = np.empty_like(values)
+
+        # Rows of one round belong to different devices, so a round is a single vectorized update;
+        # there are as many rounds as readings per device in the batch, usually one
+        rounds = np.arange(len(df)) - group_starts(df[device_column].to_numpy())
+        for r in range(int(rounds.max()) + 1 if len(df) else 0):
+            rows = np.flatnonzero(rounds == r)
+            s, v = slots[rows], values[rows]
+            n = self.readings[s]
+            self.diffs[s, :, n % TREND_WINDOW] = v - self.last[s]
+            self.window[s, :, n % STATS_WINDOW] = v
+            self.last[s] = v
+            self.readings[s] = n + 1
+            self.last_date[s] = dates[rows]
+            means[rows], stds[rows] = _window_stats(self.window[s])
+            trends[rows], _ = _window_stats(self.diffs[s])
+
+        df['Day_of_Week'] = df[date_column].dt.dayofweek
+        df['Month'] = df[date_column].dt.month
+        df['Temp_Humidity_Ratio'] = df['Temperature'] / df['Humidity']
+        df['Temp_Voltage_Ratio'] = df['Temperature'] / df['Voltage']
+        df['Humidity_Voltage_Ratio'] = df['Humidity'] / df['Voltage']
+        for i, column in enumerate(SENSOR_COLUMNS):
+            df[f'{column}_7d_mean'] = means[:, i]
+            df[f'{column}_7d_std'] = stds[:, i]
+            df[f'{column}_trend'] = trends[:, i]
+        # Only the model inputs; raw fields such as fan_status keep their missing values
+        df[FEATURE_COLUMNS] = df[FEATURE_COLUMNS].fillna(0)
+        return df
+
+    def save(self, path=STATE_FILE):
+        """Write the state atomically, so a crash mid-save leaves the previous state intact"""
+        n = len(self.devices)
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, version=STATE_VERSION, devices=json.dumps(self.devices),
+                         windows=np.array([STATS_WINDOW, TREND_WINDOW]), window=self.window[:n],
+                         diffs=self.diffs[:n], last=self.last[:n], readings=self.readings[:n],
+                         last_date=self.last_date[:n].astype(np.int64))
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path=STATE_FILE):
+        """The saved state, or an empty one when there is none or it was written for other windows"""
+        state = cls()
+        if not os.path.exists(path):
+            return state
+        with np.load(path) as data:
+            if int(data['version']) != STATE_VERSION or list(data['windows']) != [STATS_WINDOW, TREND_WINDOW]:
+                print(f"Warning: {path} was written for a different feature spec, starting from an empty state")
+                return state
+            state.devices = json.loads(str(data['devices']))
+            state.slots = {device: i for i, device in enumerate(state.devices)}
+            state.window = data['window']
+            state.diffs = data['diffs']
+            state.last = data['last']
+            state.readings = data['readings']
+            state.last_date = data['last_date'].astype('datetime64[ns]')
+        state._allocate(max(64, len(state.devices)))
+        return state
+
+
+def validate(csv_path, runs=5, tolerance=1e-9):
+    """Replay a dataset through the online state in `runs` date slices, saving and reloading between slices,
+    and compare every feature with the training notebook's pandas computation.
+
+    Returns the largest absolute difference.
+    """
+    df = pd.read_csv(csv_path)
+    df['Date'] = pd.to_datetime(df['Date'])
+    reference = notebook_features(df).sort_values(['Device_ID', 'Date'], kind='mergesort').reset_index(drop=True)
+
+    dates = np.sort(df['Date'].unique())
+    boundaries = [dates[int(i)] for i in np.linspace(0, len(dates), runs + 1)[1:-1]]
+    state = OnlineFeatureState()
+    parts = []
+    elapsed = 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state.npz")
+        lower = None
+        for upper in boundaries + [None]:
+            mask = np.ones(len(df), dtype=bool)
+            if lower is not None:
+                mask &= (df['Date'] >= lower).to_numpy()
+            if upper is not None:
+                mask &= (df['Date'] < upper).to_numpy()
+            start = time.perf_counter()
+            parts.append(state.update(df[mask]))
+            elapsed += time.perf_counter() - start
+            state.save(path)
+            state = OnlineFeatureState.load(path)
+            lower = upper
+        # Replaying an overlapping slice must not change anything
+        replayed = len(state.update(df[df['Date'] >= boundaries[-1]] if boundaries else df))
+
+    online = pd.concat(parts).sort_values(['Device_ID', 'Date'], kind='mergesort').reset_index(drop=True)
+    if len(online) != len(reference):
+        print(f"{csv_path}: {len(online)} online rows but {len(reference)} reference rows")
+        return np.inf
+    differences = {column: float(np.max(np.abs(online[column].to_numpy(dtype=np.float64) -
+                                               reference[column].to_numpy(dtype=np.float64))))
+                   for column in FEATURE_COLUMNS}
+    worst = max(differences.values()) if replayed == 0 else np.inf
+    print(f"{os.path.basename(csv_path)}: {len(df)} readings, {df['Device_ID'].nunique()} devices, "
+          f"{runs} runs with state saved in between, {elapsed / len(df) * 1e6:.1f} us per reading")
+    for column, difference in differences.items():
+        if difference > 0:
+            print(f"  {column:<24} max abs diff {difference:.2e}")
+    if replayed:
+        print(f"  {replayed} already processed readings were folded in again")
+    print(f"  {'OK' if worst <= tolerance else 'MISMATCH'}: max abs diff {worst:.2e} (tolerance {tolerance:g})")
+    return worst
+
+
+def fetch_new_readings(supabase, state, bootstrap_days=30):
+    """Readings since the state's watermark; the last `bootstrap_days` days when the state is empty"""
+    from batch_scoring import fetch_history
+
+    since = state.watermark()
+    rows = fetch_history(supabase, bootstrap_days) if since is None else fetch_history(supabase, since=since)
+    return readings_to_frame(rows) if rows else pd.DataFrame()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental feature state: score only the readings since the last run")
+    parser.add_argument("--validate", nargs="*", default=None, metavar="CSV",
+                        help="check the online features against the notebook's pandas features on these datasets")
+    parser.add_argument("--runs", type=int, default=5, help="date slices per dataset when validating")
+    parser.add_argument("--state", default=STATE_FILE)
+    parser.add_argument("--model-dir", default=None)
+    parser.add_argument("--bootstrap-days", type=int, default=30, help="history fetched when there is no state yet")
+    parser.add_argument("--save", action="store_true", help="insert the predictions into temperature_readings")
+    args = parser.parse_args()
+
+    if args.validate is not None:
+        here = os.path.dirname(os.path.abspath(__file__))
+        paths = args.validate or [os.path.join(here, "full_server_degradation_dataset.csv"),
+                                  os.path.join(here, "server_degradation_sample_400.csv")]
+        worst = max(validate(path, max(1, args.runs)) for path in paths)
+        raise SystemExit(0 if worst <= 1e-9 else 1)
+
+    from dotenv import load_dotenv
+    from supabase import create_client
+    from batch_scoring import MODEL_DIR, BatchScorer, load_models, prediction_records
+
+    load_dotenv()
+    supabase = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_ANON_KEY"))
+    state = OnlineFeatureState.load(args.state)
+    readings = fetch_new_readings(supabase, state, args.bootstrap_days)
+    if len(readings) == 0:
+        print("No new readings since the last run")
+        return
+
+    start = time.perf_counter()
+    features = state.update(readings)
+    featured = time.perf_counter()
+    if len(features) == 0:
+        print("No new readings since the last run")
+        return
+    latest = features.groupby('Device_ID', sort=False).tail(1).reset_index(drop=True)
+    table = BatchScorer(*load_models(args.model_dir or MODEL_DIR)).score_rows(latest)
+    print(table[['Device_ID', 'Date', 'warning_probability', 'warning_status', 'days_to_failure']]
+          .to_string(index=False))
+    print(f"\n{len(features)} new readings from {len(latest)} devices: features {(featured - start) * 1000:.1f} ms, "
+          f"scoring {(time.perf_counter() - featured) * 1000:.1f} ms")
+
+    if args.save:
+        try:
+            supabase.table("temperature_readings").insert(prediction_records(table)).execute()
+            print(f"Saved {len(table)} predictions")
+        except Exception as e:
+            print(f"Error saving predictions: {e}")
+            print("Feature state not saved, the next run scores these readings again")
+            return
+    # Saved only once scoring (and the insert) succeeded, so a failed run re-reads the same readings next time
+    state.save(args.state)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+import os
+import json
+import math
+import time
+import queue
+import argparse
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from features import readings_to_frame
+from online_features import OnlineFeatureState
+
+TOPICS = ['temperature', 'humidity', 'fan']  # as subscribed by mqtt-bridge
+# Kept apart from online_features' feature_state.npz: both advance their own watermark
+DAEMON_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daemon_feature_state.npz")
+
+
+class LocalBroker:
+    """In-process stand-in for the MQTT broker: fans topics out into the subscribers' bounded queues.
+
+    publish() blocks while a subscriber's queue is full, which is how backpressure reaches
+    the producer in tests and replays.
+    """
+
+    def __init__(self):
+        self.subscribers = {}
+
+    def subscribe(self, topics, inbox):
+        for topic in topics:
+            self.subscribers.setdefault(topic, []).append(inbox)
+
+    def publish(self, topic, payload):
+        for inbox in self.subscribers.get(topic, []):
+            inbox.put((topic, payload, time.perf_counter()))
+
+
+class MQTTSource:
+    """Subscribes to the sensor topics on the MQTT broker mqtt-bridge uses and feeds the inbox.
+
+    While the inbox is full, the network thread waits in on_message, so the broker holds the
+    backlog. Once `stop_event` is set it stops waiting and drops messages, so stop() can
+    join the network thread even when nobody drains the inbox any more.
+    """
+
+    def __init__(self, inbox, topics=TOPICS, stop_event=None):
+        self.inbox = inbox
+        self.topics = topics
+        self.stop_event = stop_event or threading.Event()
+        self.dropped = 0
+        self.client = None
+
+    def start(self):
+        import paho.mqtt.client as mqtt
+
+        # paho-mqtt 2.x requires the callback API version; the callbacks below use the 1.x signatures
+        if hasattr(mqtt, "CallbackAPIVersion"):
+            self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+        else:
+            self.client = mqtt.Client()
+        if os.environ.get("MQTT_USERNAME"):
+            self.client.username_pw_set(os.environ.get("MQTT_USERNAME"), os.environ.get("MQTT_PASSWORD"))
+        port = int(os.environ.get("MQTT_PORT") or 8883)
+        if port == 8883:
+            self.client.tls_set()
+        self.client.on_connect = lambda client, userdata, flags, rc: [client.subscribe(t) for t in self.topics]
+        self.client.on_message = self.on_message
+        self.client.connect(os.environ.get("MQTT_HOST"), port)
+        self.client.loop_start()
+
+    def on_message(self, client, userdata, message):
+        item = (message.topic, message.payload.decode(), time.perf_counter())
+        while not self.stop_event.is_set():
+            try:
+                self.inbox.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        self.dropped += 1
+
+    def stop(self):
+        self.stop_event.set()
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
+
+
+class ReadingAssembler:
+    """Turns topic messages into full readings.
+
+    A payload is either a bare value, as mqtt-bridge receives it (sensor 1, the field is
+    the topic), or a JSON object with sensor_id and any of temperature/humidity/voltage/
+    fan_status/created_at. Every temperature or humidity message produces a reading with
+    the sensor's latest known values of the other fields; fan messages only update the
+    fan status.
+    """
+
+    def __init__(self):
+        self.latest = {}
+
+    def add(self, topic, payload, received):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            message = payload
+        if not isinstance(message, dict):
+            message = {'fan_status' if topic == 'fan' else topic: message}
+        sensor = self.latest.setdefault(message.get('sensor_id', 1), {
+            'temperature': math.nan, 'humidity': math.nan, 'voltage': math.nan, 'fan_status': None})
+        for field in ('temperature', 'humidity', 'voltage'):
+            if message.get(field) is not None:
+                try:
+                    sensor[field] = float(message[field])
+                except (TypeError, ValueError):
+                    print(f"Error parsing {field} message: {message[field]!r}")
+        if message.get('fan_status') is not None:
+            sensor['fan_status'] = str(message['fan_status'])
+        if topic == 'fan':
+            return None
+        return dict(sensor, sensor_id=message.get('sensor_id', 1), received=received,
+                    created_at=message.get('created_at') or datetime.now().isoformat())
+
+
+class BulkWriter(threading.Thread):
+    """Writes prediction batches in bulk inserts from its own thread.
+
+    Pending batches queue up to `max_pending`; beyond that the scoring loop blocks in
+    submit(), which fills the inbox and in turn blocks the producer. Whatever is pending
+    when the thread gets to it is merged into one insert of up to `max_rows` rows, failed
+    inserts are retried with exponential backoff, and batches that still fail are appended
+    to `failed_path` instead of being dropped.
+    """
+
+    def __init__(self, sink, max_pending=8, max_rows=5000, retries=5, backoff=0.5,
+                 failed_path="failed_predictions.jsonl"):
+        super().__init__(daemon=True)
+        self.sink = sink
+        self.pending = queue.Queue(max_pending)
+        self.max_rows = max_rows
+        self.retries = retries
+        self.backoff = backoff
+        self.failed_path = failed_path
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.written = 0
+        self.inserts = 0
+        self.retried = 0
+        self.failed = 0
+        self.acknowledged = 0  # batches inserted or spilled to failed_path
+
+    def submit(self, records, received):
+        self.pending.put((records, received))
+
+    def close(self):
+        self.pending.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            records, received = list(item[0]), [item[1]]
+            closing = False
+            while len(records) < self.max_rows:
+                try:
+                    more = self.pending.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    closing = True
+                    break
+                records.extend(more[0])
+                received.append(more[1])
+            self._write(records, np.concatenate(received))
+            with self.lock:
+                self.acknowledged += len(received)
+            if closing:
+                return
+
+    def _write(self, records, received):
+        for attempt in range(self.retries + 1):
+            try:
+                self.sink(records)
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    print(f"Error saving {len(records)} predictions, keeping them in {self.failed_path}: {e}")
+                    with open(self.failed_path, "a") as f:
+                        for record in records:
+                            f.write(json.dumps(record) + "\n")
+                    with self.lock:
+                        self.failed += len(records)
+                    return
+                with self.lock:
+                    self.retried += 1
+                time.sleep(self.backoff * 2 ** attempt)
+        done = time.perf_counter()
+        with self.lock:
+            self.latencies.extend(done - received)
+            self.written += len(records)
+            self.inserts += 1
+
+    def take_latencies(self):
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+        return latencies
+
+
+def supabase_sink():
+    from dotenv import load_dotenv
+    from supabase import create_client
+
+    load_dotenv()
+    supabase = create_client(os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_ANON_KEY"))
+    return lambda records: supabase.table("temperature_readings").insert(records).execute()
+
+
+def jsonl_sink(path):
+    """Local sink for tests and replays: one JSON line per prediction"""
+    def write(records):
+        with open(path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+    return write
+
+
+class PredictionDaemon:
+    """Consumes sensor messages, scores them in micro-batches and hands the predictions to a BulkWriter.
+
+    A batch closes when it holds `batch_size` readings or `max_wait` seconds after its
+    first reading arrived, whichever comes first. Its readings go through the incremental
+    feature state and one scaler/classifier/regressor call.
+
+    With a `state_path`, the state is saved from the scoring thread once the writer has
+    acknowledged new batches, at most every `save_interval` seconds, and again on exit,
+    so a crash only loses the state of the last interval.
+    """
+
+    def __init__(self, scorer, writer, state, inbox, batch_size=500, max_wait=0.2, state_path=None,
+                 save_interval=10.0):
+        self.scorer = scorer
+        self.writer = writer
+        self.state = state
+        self.inbox = inbox
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.state_path = state_path
+        self.save_interval = save_interval
+        self.assembler = ReadingAssembler()
+        self.stop_event = threading.Event()
+        self.readings = 0
+        self.batches = 0
+        self.saved_batches = 0
+        self.last_save = time.perf_counter()
+
+    def next_batch(self):
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            timeout = 0.1 if deadline is None else deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                topic, payload, received = self.inbox.get(timeout=timeout)
+            except queue.Empty:
+                if deadline is None and self.stop_event.is_set():
+                    break
+                continue
+            reading = self.assembler.add(topic, payload, received)
+            if reading is not None:
+                batch.append(reading)
+                if deadline is None:
+                    # From when the batch started collecting, not from the publish time: with a
+                    # backlog those are already old and every batch would close after one reading
+                    deadline = time.perf_counter() + self.max_wait
+        return batch
+
+    def score(self, batch):
+        from batch_scoring import prediction_records
+
+        features = self.state.update(readings_to_frame(batch))
+        if len(features) == 0:
+            return
+        table = self.scorer.score_rows(features)
+        self.writer.submit(prediction_records(table), features['received'].to_numpy())
+        self.readings += len(batch)
+        self.batches += 1
+
+    def save_state(self, force=False):
+        """Save the feature state if the writer acknowledged batches since the last save and the interval passed"""
+        if self.state_path is None:
+            return
+        acknowledged = self.writer.acknowledged
+        if not force and (acknowledged == self.saved_batches or
+                          time.perf_counter() - self.last_save < self.save_interval):
+            return
+        try:
+            self.state.save(self.state_path)
+        except OSError as e:
+            print(f"Error saving the feature state to {self.state_path}: {e}")
+            return
+        self.saved_batches = acknowledged
+        self.last_save = time.perf_counter()
+
+    def run(self, report_interval=5.0):
+        """Score until stop() is called and the inbox is drained"""
+        started = time.perf_counter()
+        last_report, last_readings = started, 0
+        while True:
+            batch = self.next_batch()
+            if batch:
+                try:
+                    self.score(batch)
+                except Exception as e:
+                    print(f"Error scoring a batch of {len(batch)} readings: {e}")
+            elif self.stop_event.is_set() and self.inbox.empty():
+                break
+            self.save_state()
+            now = time.perf_counter()
+            if now - last_report >= report_interval:
+                self.report((self.readings - last_readings) / (now - last_report))
+                last_report, last_readings = now, self.readings
+        self.writer.close()
+        self.save_state(force=True)
+        elapsed = time.perf_counter() - started
+        print("\nFinal statistics:")
+        self.report(self.readings / elapsed if elapsed > 0 else 0.0)
+        return elapsed
+
+    def stop(self):
+        self.stop_event.set()
+
+    def report(self, rate):
+        latencies = np.asarray(self.writer.take_latencies()) * 1000.0
+        percentiles = np.percentile(latencies, [50, 95, 99]) if len(latencies) else [0.0, 0.0, 0.0]
+        print(f"{rate:10.0f} readings/s  batches {self.batches} (avg {self.readings / max(1, self.batches):.0f})  "
+              f"latency p50 {percentiles[0]:.1f} ms p95 {percentiles[1]:.1f} ms p99 {percentiles[2]:.1f} ms  "
+              f"inbox {self.inbox.qsize()}  pending inserts {self.writer.pending.qsize()}  "
+              f"written {self.writer.written} in {self.writer.inserts} inserts, "
+              f"{self.writer.retried} retries, {self.writer.failed} failed")
+
+
+def replay_csv(broker, path, rate=None, stop_event=None):
+    """Publish a dataset in the training CSV format as sensor messages, in date order, at `rate` readings/s"""
+    df = pd.read_csv(path)
+    df['Date'] = pd.to_datetime(df['Date'])
+    df = df.sort_values(['Date', 'Device_ID'], kind='mergesort')
+    sensor_ids = df['Device_ID'].astype(str).str.extract(r'(\d+)$')[0].astype(int)
+    started = time.perf_counter()
+    for i, (sensor_id, row) in enumerate(zip(sensor_ids, df.itertuples(index=False))):
+        if stop_event is not None and stop_event.is_set():
+            return
+        if rate:
+            delay = started + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        broker.publish('temperature', json.dumps({
+            'sensor_id': int(sensor_id), 'temperature': row.Temperature, 'humidity': row.Humidity,
+            'voltage': row.Voltage, 'created_at': row.Date.isoformat()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming failure prediction: micro-batched scoring, bulk inserts")
+    parser.add_argument("--replay", default=None, metavar="CSV",
+                        help="publish a dataset through an in-process broker instead of subscribing to MQTT")
+    parser.add_argument("--rate", type=float, default=None, help="replay rate in readings/s (default: as fast as possible)")
+    parser.add_argument("--sink", default="supabase", help="'supabase' or a .jsonl file to append predictions to")
+    parser.add_argument("--model-dir", default=None)
+    parser.add_argument("--state", default=None,
+                        help=f"incremental feature state, loaded at start and saved while running "
+                             f"(default: {DAEMON_STATE_FILE}, none for replays)")
+    parser.add_argument("--save-interval", type=float, default=10.0,
+                        help="seconds between state saves (0: after every acknowledged insert)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--max-wait", type=float, default=0.2, help="seconds a batch waits for more readings")
+    parser.add_argument("--max-inbox", type=int, default=10000, help="readings buffered before the source is slowed down")
+    parser.add_argument("--max-pending", type=int, default=8, help="prediction batches buffered before scoring waits")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    from batch_scoring import MODEL_DIR, BatchScorer, load_models
+
+    scorer = BatchScorer(*load_models(args.model_dir or MODEL_DIR))
+    sink = supabase_sink() if args.sink == "supabase" else jsonl_sink(args.sink)
+    writer = BulkWriter(sink, max_pending=args.max_pending, retries=args.retries)
+    writer.start()
+    inbox = queue.Queue(args.max_inbox)
+    # A replay starts from an empty state unless asked otherwise, so it never touches the live one
+    state_path = args.state or (None if args.replay else DAEMON_STATE_FILE)
+    state = OnlineFeatureState.load(state_path) if state_path else OnlineFeatureState()
+    daemon = PredictionDaemon(scorer, writer, state, inbox, args.batch_size, args.max_wait, state_path,
+                              args.save_interval)
+
+    source = None
+    if args.replay:
+        broker = LocalBroker()
+        broker.subscribe(TOPICS, inbox)
+
+        def produce():
+            replay_csv(broker, args.replay, args.rate, daemon.stop_event)
+            daemon.stop()
+        threading.Thread(target=produce, daemon=True).start()
+    else:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        source = MQTTSource(inbox, stop_event=daemon.stop_event)
+        source.start()
+
+    try:
+        daemon.run(args.report_interval)
+    except KeyboardInterrupt:
+        print("\nStopping, scoring the readings already received...")
+        # Stopping first releases the network thread if it is waiting on a full inbox
+        daemon.stop()
+        if source is not None:
+            source.stop()
+            if source.dropped:
+                print(f"{source.dropped} readings arrived after the inbox was closed and were not scored")
+        daemon.run(args.report_interval)
+    print(f"{daemon.readings} readings scored in {daemon.batches} batches")
+
+
+if __name__ == "__main__":
+    main()
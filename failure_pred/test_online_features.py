@@ -0,0 +1,98 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from features import FEATURE_COLUMNS, SENSOR_COLUMNS, notebook_features
+from online_features import OnlineFeatureState, validate
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATASETS = ["full_server_degradation_dataset.csv", "server_degradation_sample_400.csv"]
+TOLERANCE = 1e-9
+
+
+def load(name):
+    df = pd.read_csv(os.path.join(HERE, name))
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+
+def sorted_rows(df):
+    return df.sort_values(['Device_ID', 'Date'], kind='mergesort').reset_index(drop=True)
+
+
+def max_difference(online, reference):
+    online, reference = sorted_rows(online), sorted_rows(reference)
+    assert len(online) == len(reference)
+    return max(float(np.max(np.abs(online[column].to_numpy(dtype=np.float64) -
+                                   reference[column].to_numpy(dtype=np.float64))))
+               for column in FEATURE_COLUMNS)
+
+
+def date_slices(df, runs):
+    dates = np.sort(df['Date'].unique())
+    boundaries = [dates[int(i)] for i in np.linspace(0, len(dates), runs + 1)[1:-1]]
+    lower = None
+    for upper in boundaries + [None]:
+        mask = np.ones(len(df), dtype=bool)
+        if lower is not None:
+            mask &= (df['Date'] >= lower).to_numpy()
+        if upper is not None:
+            mask &= (df['Date'] < upper).to_numpy()
+        yield df[mask]
+        lower = upper
+
+
+def state_arrays(state):
+    n = len(state)
+    return [state.window[:n].copy(), state.diffs[:n].copy(), state.last[:n].copy(),
+            state.readings[:n].copy(), state.last_date[:n].copy()]
+
+
+@pytest.mark.parametrize("name", DATASETS)
+def test_matches_notebook_features(name):
+    assert validate(os.path.join(HERE, name), runs=5, tolerance=TOLERANCE) <= TOLERANCE
+
+
+@pytest.mark.parametrize("name", DATASETS)
+def test_nan_readings(name):
+    df = load(name)
+    rng = np.random.default_rng(0)
+    for column in SENSOR_COLUMNS:
+        df.loc[rng.random(len(df)) < 0.05, column] = np.nan
+    # A run of missing values longer than the windows
+    first_device = df['Device_ID'] == df['Device_ID'].iloc[0]
+    df.loc[df.index[first_device][10:20], 'Temperature'] = np.nan
+
+    state = OnlineFeatureState()
+    online = pd.concat([state.update(part) for part in date_slices(df, 5)])
+    assert max_difference(online, notebook_features(df)) <= TOLERANCE
+
+
+@pytest.mark.parametrize("name", DATASETS)
+def test_replaying_a_processed_slice_changes_nothing(name, tmp_path):
+    df = load(name)
+    state = OnlineFeatureState()
+    for part in date_slices(df, 3):
+        state.update(part)
+    path = str(tmp_path / "state.npz")
+    state.save(path)
+    state = OnlineFeatureState.load(path)
+    before = state_arrays(state)
+
+    assert len(state.update(df[df['Date'] >= df['Date'].median()])) == 0
+    for old, new in zip(before, state_arrays(state)):
+        np.testing.assert_array_equal(old, new)
+
+
+@pytest.mark.parametrize("name", DATASETS)
+def test_overlapping_slices(name):
+    df = load(name)
+    dates = np.sort(df['Date'].unique())
+    cut, overlap = dates[len(dates) // 2], dates[len(dates) // 3]
+
+    state = OnlineFeatureState()
+    first = state.update(df[df['Date'] < cut])
+    # The second fetch starts before the end of the first one; only the new readings come back
+    second = state.update(df[df['Date'] >= overlap])
+    assert (second['Date'] >= cut).all()
+    assert max_difference(pd.concat([first, second]), notebook_features(df)) <= TOLERANCE
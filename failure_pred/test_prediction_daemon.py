@@ -0,0 +1,252 @@
+import sys
+import json
+import queue
+import types
+import threading
+import numpy as np
+import pytest
+from online_features import OnlineFeatureState
+from prediction_daemon import TOPICS, BulkWriter, LocalBroker, MQTTSource, PredictionDaemon
+
+
+def blocks(target, timeout=0.2):
+    """Start `target` in a thread; the thread if it is still blocked after `timeout` seconds"""
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return thread if thread.is_alive() else None
+
+
+class FlakySink:
+    def __init__(self, failures):
+        self.failures = failures
+        self.inserts = []
+
+    def __call__(self, records):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("insert failed")
+        self.inserts.append(list(records))
+
+
+class GatedSink:
+    """Holds every insert until `release` is set"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.inserts = []
+
+    def __call__(self, records):
+        self.started.set()
+        self.release.wait(5.0)
+        self.inserts.append(list(records))
+
+
+def batch(*values):
+    return [{'value': v} for v in values], np.zeros(len(values))
+
+
+def test_broker_fans_out_to_subscribers():
+    broker = LocalBroker()
+    first, second = queue.Queue(), queue.Queue()
+    broker.subscribe(['temperature', 'humidity'], first)
+    broker.subscribe(['temperature'], second)
+
+    broker.publish('temperature', '21.5')
+    broker.publish('humidity', '40')
+    broker.publish('fan', 'on')
+
+    assert [first.get_nowait()[:2] for _ in range(first.qsize())] == [('temperature', '21.5'), ('humidity', '40')]
+    assert [second.get_nowait()[:2] for _ in range(second.qsize())] == [('temperature', '21.5')]
+
+
+def test_broker_blocks_on_a_full_inbox():
+    broker = LocalBroker()
+    inbox = queue.Queue(1)
+    broker.subscribe(['temperature'], inbox)
+    broker.publish('temperature', '1')
+
+    blocked = blocks(lambda: broker.publish('temperature', '2'))
+    assert blocked is not None
+    assert inbox.get_nowait()[1] == '1'
+    blocked.join(1.0)
+    assert not blocked.is_alive()
+    assert inbox.get_nowait()[1] == '2'
+
+
+class StubClient:
+    """Records what MQTTSource does with a paho client"""
+
+    def __init__(self, *args):
+        self.args = args
+        self.subscribed = []
+        self.stopped = False
+
+    def username_pw_set(self, username, password):
+        self.credentials = (username, password)
+
+    def tls_set(self):
+        self.tls = True
+
+    def connect(self, host, port):
+        self.address = (host, port)
+
+    def loop_start(self):
+        self.on_connect(self, None, {}, 0)
+
+    def loop_stop(self):
+        self.stopped = True
+
+    def disconnect(self):
+        pass
+
+    def subscribe(self, topic):
+        self.subscribed.append(topic)
+
+
+@pytest.fixture(params=[True, False], ids=["paho-2", "paho-1"])
+def paho(request, monkeypatch):
+    client = types.ModuleType("paho.mqtt.client")
+    client.Client = StubClient
+    if request.param:
+        client.CallbackAPIVersion = types.SimpleNamespace(VERSION1="VERSION1", VERSION2="VERSION2")
+    mqtt = types.ModuleType("paho.mqtt")
+    mqtt.client = client
+    package = types.ModuleType("paho")
+    package.mqtt = mqtt
+    monkeypatch.setitem(sys.modules, "paho", package)
+    monkeypatch.setitem(sys.modules, "paho.mqtt", mqtt)
+    monkeypatch.setitem(sys.modules, "paho.mqtt.client", client)
+    monkeypatch.setenv("MQTT_HOST", "broker.example")
+    monkeypatch.setenv("MQTT_PORT", "1883")
+    return request.param
+
+
+def message(topic, payload):
+    return types.SimpleNamespace(topic=topic, payload=payload.encode())
+
+
+def test_mqtt_source_with_a_stubbed_client(paho):
+    inbox = queue.Queue()
+    source = MQTTSource(inbox)
+    source.start()
+
+    assert source.client.args == (("VERSION1",) if paho else ())
+    assert source.client.address == ("broker.example", 1883)
+    assert source.client.subscribed == TOPICS
+    source.client.on_message(source.client, None, message('temperature', '21.5'))
+    assert inbox.get_nowait()[:2] == ('temperature', '21.5')
+
+    source.stop()
+    assert source.client.stopped
+
+
+def test_mqtt_source_stops_waiting_on_a_full_inbox(paho):
+    inbox = queue.Queue(1)
+    source = MQTTSource(inbox)
+    source.start()
+    source.client.on_message(source.client, None, message('temperature', '1'))
+
+    blocked = blocks(lambda: source.client.on_message(source.client, None, message('temperature', '2')))
+    assert blocked is not None
+    source.stop()
+    blocked.join(1.0)
+    assert not blocked.is_alive()
+    assert source.dropped == 1
+    assert inbox.qsize() == 1
+
+
+def test_writer_retries_failed_inserts(tmp_path):
+    sink = FlakySink(failures=2)
+    writer = BulkWriter(sink, retries=3, backoff=0.0, failed_path=str(tmp_path / "failed.jsonl"))
+    writer.start()
+    writer.submit(*batch(1, 2))
+    writer.close()
+
+    assert sink.inserts == [[{'value': 1}, {'value': 2}]]
+    assert (writer.retried, writer.written, writer.failed, writer.acknowledged) == (2, 2, 0, 1)
+    assert not (tmp_path / "failed.jsonl").exists()
+
+
+def test_writer_keeps_batches_that_keep_failing(tmp_path):
+    failed_path = tmp_path / "failed.jsonl"
+    writer = BulkWriter(FlakySink(failures=10), retries=2, backoff=0.0, failed_path=str(failed_path))
+    writer.start()
+    writer.submit(*batch(1, 2, 3))
+    writer.close()
+
+    assert [json.loads(line) for line in failed_path.read_text().splitlines()] == batch(1, 2, 3)[0]
+    assert (writer.retried, writer.written, writer.failed, writer.acknowledged) == (2, 0, 3, 1)
+
+
+def test_writer_backpressure_and_merged_inserts(tmp_path):
+    sink = GatedSink()
+    writer = BulkWriter(sink, max_pending=2, backoff=0.0, failed_path=str(tmp_path / "failed.jsonl"))
+    writer.start()
+    writer.submit(*batch(1))
+    assert sink.started.wait(1.0)
+    # The first insert is in flight, two more batches fit in the queue, the next submit waits
+    writer.submit(*batch(2))
+    writer.submit(*batch(3))
+    blocked = blocks(lambda: writer.submit(*batch(4)))
+    assert blocked is not None
+
+    sink.release.set()
+    blocked.join(1.0)
+    assert not blocked.is_alive()
+    writer.close()
+
+    assert [record['value'] for insert in sink.inserts for record in insert] == [1, 2, 3, 4]
+    assert len(sink.inserts) < 4
+    assert writer.acknowledged == 4
+
+
+class ConstantModel:
+    classes_ = [0, 1]
+
+    def transform(self, X):
+        return np.asarray(X, dtype=np.float64)
+
+    def predict_proba(self, X):
+        return np.tile([0.9, 0.1], (len(X), 1))
+
+    def predict(self, X):
+        return np.full(len(X), 30.0)
+
+
+@pytest.fixture
+def scorer():
+    from batch_scoring import BatchScorer
+
+    model = ConstantModel()
+    return BatchScorer(model, model, model)
+
+
+def test_daemon_saves_the_state_after_acknowledged_inserts(scorer, tmp_path):
+    state_path = str(tmp_path / "state.npz")
+    sink = FlakySink(failures=0)
+    writer = BulkWriter(sink, backoff=0.0, failed_path=str(tmp_path / "failed.jsonl"))
+    writer.start()
+    inbox = queue.Queue()
+    daemon = PredictionDaemon(scorer, writer, OnlineFeatureState(), inbox, batch_size=2, max_wait=0.01,
+                              state_path=state_path, save_interval=0.0)
+    broker = LocalBroker()
+    broker.subscribe(['temperature'], inbox)
+    for day in range(1, 5):
+        broker.publish('temperature', json.dumps({'sensor_id': 7, 'temperature': 20.0 + day, 'humidity': 40.0,
+                                                  'voltage': 220.0, 'created_at': f"2025-01-0{day}T00:00:00"}))
+
+    runner = threading.Thread(target=daemon.run, kwargs={'report_interval': 60.0}, daemon=True)
+    runner.start()
+    while daemon.saved_batches < 1 and runner.is_alive():
+        runner.join(0.01)
+    saved = OnlineFeatureState.load(state_path)
+    assert saved.devices == [7] and saved.readings[0] >= 2
+
+    daemon.stop()
+    runner.join(5.0)
+    saved = OnlineFeatureState.load(state_path)
+    assert saved.readings[0] == 4
+    assert str(saved.watermark().date()) == "2025-01-04"
+    assert sum(len(insert) for insert in sink.inserts) == 4